@@ -7,6 +7,7 @@ import cmdint.common.argparse_types as atypes
 import cmdint.common.args as cargs
 import cmdint.common.dataset_args as dargs
 import dataset.constants as cons
+import dataset.tck.scheduling as sched
 
 
 _TARGET_ARG_HELP = textwrap.dedent(f'''\
@@ -34,11 +35,47 @@ class CmdInterface:
                                  '%(default)s))')
         parser.add_argument('--max_cache_size', default=40,
                             type=atypes.int_range(1),
-                            help=('maximum size of parsed files cache'))
-        parser.add_argument('--num_evicted', default=10,
+                            help=('maximum number of files in parsed files '
+                                  'cache'))
+        parser.add_argument('--max_cache_bytes', default=None,
+                            type=atypes.byte_size(1),
+                            help=('maximum size of packets in parsed files '
+                                  'cache in bytes, with an optional K, M, G '
+                                  'or T suffix (default: unlimited)'))
+        parser.add_argument('--num_evicted', default=None,
                             type=atypes.int_range(1),
-                            help=('number of cache entires to evict when the '
-                                  'cache gets full'))
+                            help=('deprecated and ignored, files are evicted '
+                                  'from the cache only as needed'))
+        parser.add_argument('--packet_cache_dir', default=None,
+                            help=('directory to store packets decoded from '
+                                  'ROOT files in, to be reused by later runs '
+                                  'instead of decoding the files again'))
+        parser.add_argument('--prefetch_depth', default=0,
+                            type=atypes.int_range(0),
+                            help=('number of following source files to '
+                                  'extract packets of on a background thread '
+                                  'while processing the current one, ignored '
+                                  'with --read_gtu_windows (default: '
+                                  '%(default)s, i.e. no prefetching)'))
+        parser.add_argument('--prefetch_max_bytes', default=None,
+                            type=atypes.byte_size(1),
+                            help=('maximum size of prefetched packets not yet '
+                                  'in use in bytes, with an optional K, M, G '
+                                  'or T suffix (default: unlimited)'))
+        parser.add_argument('--group_by_srcfile', action='store_true',
+                            help=('process filelist rows grouped by their '
+                                  'source file, so that every file is loaded '
+                                  'only once. Items are put back into '
+                                  'filelist order, or when writing a sharded '
+                                  'dataset, their filelist row is recorded in '
+                                  'the "{}" metadata field'.format(
+                                    sched.FILELIST_ROW_KEY)))
+        parser.add_argument('--num_workers', default=1,
+                            type=atypes.int_range(1),
+                            help=('number of processes extracting packets and '
+                                  'creating items in parallel, each handling '
+                                  'different source files (default: '
+                                  '%(default)s)'))
 
         # input settings
         group = parser.add_argument_group(title='Input settings')
@@ -54,6 +91,16 @@ class CmdInterface:
         dset_args.add_dataset_arg_double(group, dargs.arg_type.OUTPUT,
                                          dir_short_alias='d', dir_default='.',
                                          name_short_alias='n')
+        group.add_argument('--shard_size', default=None,
+                           type=atypes.int_range(1),
+                           help=('if set, write the dataset as shards of at '
+                                 'most this many items while they are being '
+                                 'extracted, instead of holding the whole '
+                                 'dataset in memory until it is saved'))
+        group.add_argument('--resume', action='store_true',
+                           help=('continue an interrupted run writing a '
+                                 'sharded dataset from its last checkpoint '
+                                 '(requires --shard_size)'))
 
         # output (dataset) data item settings
         group = parser.add_argument_group(title='Data item settings')
@@ -107,6 +154,11 @@ class CmdInterface:
                            help=('do not shift the frames window if part of '
                                  'it is out of packet bounds. An exception '
                                  'will be raised instead '))
+        gpack.add_argument('--read_gtu_windows', action='store_true',
+                           help=('read only the frames of event windows from '
+                                 'ROOT source files, using an index of their '
+                                 'entries cached next to them, instead of '
+                                 'extracting all of their packets'))
 
         self.parser = parser
         self.packet_args = packet_args
@@ -124,22 +176,40 @@ class CmdInterface:
             raise ValueError("Invalid filelist {}".format(args.filelist))
         if not os.path.isdir(args.outdir):
             raise ValueError("Invalid output directory {}".format(args.outdir))
+        if (args.packet_cache_dir is not None and
+                not os.path.isdir(args.packet_cache_dir)):
+            raise ValueError("Invalid packet cache directory {}".format(
+                             args.packet_cache_dir))
+        if args.resume and args.shard_size is None:
+            raise ValueError("Only runs writing a sharded dataset can be "
+                             "resumed")
+        logger = self._get_logger(args)
+        if args.num_evicted is not None:
+            logger.warning("--num_evicted is deprecated and ignored, as files "
+                           "are evicted from the cache only as needed")
 
         args_dict = {
             "filelist": filelist,
             "packet_template": self.packet_args.packet_arg_to_template(args),
             "output_dataset": {
                 "name": name, "outdir": outdir, "dtype": args.dtype,
-                "item_types": self.item_args.get_item_types(args, atype)
+                "item_types": self.item_args.get_item_types(args, atype),
+                "shard_size": args.shard_size
             },
             "event_transformer": self._parse_converter_arg(args),
             "target_handler": self._parse_target_arg(args),
             "extra_metafields": args.extra_metafields,
+            "resume": args.resume,
+            "num_workers": args.num_workers,
+            "group_by_srcfile": args.group_by_srcfile,
             "cache": {
                 "max_size": args.max_cache_size,
-                "num_evict_on_full": args.num_evicted
+                "max_bytes": args.max_cache_bytes,
+                "cache_dir": args.packet_cache_dir,
+                "prefetch_depth": args.prefetch_depth,
+                "prefetch_max_bytes": args.prefetch_max_bytes
             },
-            "logger": self._get_logger(args)
+            "logger": logger
         }
         return args_dict
 
@@ -167,6 +237,7 @@ class CmdInterface:
             transformer_args = {
                 "num_gtu_before": _before, "num_gtu_after": _after,
                 "adjust_if_out_of_bounds": not args.no_bounds_adjust,
+                "read_gtu_windows": args.read_gtu_windows,
             }
         elif converter == 'allpack':
             _start, _stop = args.gtu_range[0:2]
@@ -28,4 +28,20 @@ def float_range(minval, maxval=None):
             raise argparse.ArgumentTypeError(
                 'must be at least {} or more'.format(minval))
         return val
-    return FloatRange
\ No newline at end of file
+    return FloatRange
+
+def byte_size(minval=None):
+    # integer number of bytes, optionally with a binary unit suffix
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    def ByteSize(value):
+        multiplier = units.get(value[-1:].upper(), None)
+        number = value if multiplier is None else value[:-1]
+        try:
+            val = int(number) * (multiplier or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError('not a size: {}'.format(value))
+        if minval is not None and val < minval:
+            raise argparse.ArgumentTypeError(
+                'must be at least {} or more'.format(minval))
+        return val
+    return ByteSize
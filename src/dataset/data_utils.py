@@ -1,4 +1,4 @@
-import collections
+import collections.abc
 import operator
 import functools
 
@@ -258,6 +258,150 @@ def convert_packet(packet, item_types, start_idx=0, end_idx=None,
                     packet, dtype=dtype, start_idx=start_idx, end_idx=end_idx))
             for k in cons.ALL_ITEM_TYPES}
 
+# batch data item creation
+
+
+def create_subpackets(packets, start_idx=0, end_idx=None, dtype=np.uint8,
+                      out=None):
+    """
+        Convert a stack of packets to (sub)packets made up of frames from
+        start_idx to end_idx (minus the latter).
+
+        Parameters
+        ----------
+        packets :       4-dimensional numpy.ndarray
+            stack of packets from which to create (sub)packets
+        start_idx :     int
+            index of first frame in the packets to inculde
+        end_idx :       int or None
+            index of first frame in the packets to exclude
+        dtype :         str or np.number
+            data type of created subpackets
+        out :           4-dimensional numpy.ndarray or None
+            preallocated array to write the result to
+    """
+    subpackets = packets[:, start_idx:end_idx]
+    if out is None:
+        return subpackets.astype(dtype)
+    np.copyto(out, subpackets, casting='unsafe')
+    return out
+
+
+def create_y_x_projections(packets, start_idx=0, end_idx=None,
+                           dtype=np.uint8, out=None):
+    """
+        Convert a stack of packets to projections by extracting the maximum
+        of values along the GTU axis of every packet made up of frames from
+        start_idx to end_idx (minus the latter).
+
+        Parameters
+        ----------
+        packets :       4-dimensional numpy.ndarray
+            stack of packets from which to create the projections
+        start_idx :     int
+            index of first packet frame to use in creating the projections
+        end_idx :       int or None
+            index of first packet frame to not use in creating the projections
+        dtype :         str or np.number
+            data type of created yx projections
+        out :           3-dimensional numpy.ndarray or None
+            preallocated array to write the result to
+    """
+    if out is None:
+        return np.max(packets[:, start_idx:end_idx], axis=1).astype(dtype)
+    return np.max(packets[:, start_idx:end_idx], axis=1, out=out)
+
+
+def create_gtu_x_projections(packets, start_idx=0, end_idx=None,
+                             dtype=np.uint8, out=None):
+    """
+        Convert a stack of packets to projections by extracting the maximum
+        of values along the Y axis of every packet made up of frames from
+        start_idx to end_idx (minus the latter).
+
+        Parameters
+        ----------
+        packets :       4-dimensional numpy.ndarray
+            stack of packets from which to create the projections
+        start_idx :     int
+            index of first packet frame to use in creating the projections
+        end_idx :       int or None
+            index of first packet frame to not use in creating the projections
+        dtype :         str or np.number
+            data type of created gtux projections
+        out :           3-dimensional numpy.ndarray or None
+            preallocated array to write the result to
+    """
+    if out is None:
+        return np.max(packets[:, start_idx:end_idx], axis=2).astype(dtype)
+    return np.max(packets[:, start_idx:end_idx], axis=2, out=out)
+
+
+def create_gtu_y_projections(packets, start_idx=0, end_idx=None,
+                             dtype=np.uint8, out=None):
+    """
+        Convert a stack of packets to projections by extracting the maximum
+        of values along the X axis of every packet made up of frames from
+        start_idx to end_idx (minus the latter).
+
+        Parameters
+        ----------
+        packets :       4-dimensional numpy.ndarray
+            stack of packets from which to create the projections
+        start_idx :     int
+            index of first packet frame to use in creating the projections
+        end_idx :       int or None
+            index of first packet frame to not use in creating the projections
+        dtype :         str or np.number
+            data type of created gtuy projections
+        out :           3-dimensional numpy.ndarray or None
+            preallocated array to write the result to
+    """
+    if out is None:
+        return np.max(packets[:, start_idx:end_idx], axis=3).astype(dtype)
+    return np.max(packets[:, start_idx:end_idx], axis=3, out=out)
+
+
+_packets_converters = {
+    'raw': create_subpackets,
+    'yx': create_y_x_projections,
+    'gtux': create_gtu_x_projections,
+    'gtuy': create_gtu_y_projections
+}
+
+
+def convert_packets(packets, item_types, start_idx=0, end_idx=None,
+                    dtype=np.uint8, out=None):
+    """
+        Convert a stack of packets to sets of data items as specified by the
+        keys in the parameter item_types. Unlike convert_packet, every item
+        type is created for all packets at once by a single vectorized call
+        and the result is returned as a dict of str to ndarray, where the
+        first axis of each array indexes the packets. Where the item type is
+        set to False, the value for the same key in the returned dict is None.
+
+        Parameters
+        ----------
+        packets :       4-dimensional numpy.ndarray
+            stack of packets from which to create the data items
+        item_types :    dict of str to bool
+            the item types requested to be created from the original packets
+        start_idx :     int
+            index of first packet frame to use in creating the data items
+        end_idx :       int or None
+            index of first packet frame to not use in creating the data itmes
+        dtype :         str or np.number
+            data type of created items
+        out :           dict of str to numpy.ndarray or None
+            preallocated arrays to write the items of the respective types to
+    """
+    check_item_types(item_types)
+    out = out or {}
+    return {k: (None if item_types[k] is False else _packets_converters[k](
+                    packets, dtype=dtype, start_idx=start_idx,
+                    end_idx=end_idx, out=out.get(k, None)))
+            for k in cons.ALL_ITEM_TYPES}
+
 # get data item shape
 
 
@@ -333,34 +477,204 @@ def get_data_item_shapes(packet_shape, item_types):
             for k in cons.ALL_ITEM_TYPES}
 
 
+# dtype conversion
+
+# size (in bytes of source items) of chunks of items converted at once when
+# changing the dtype of items
+DTYPE_CONVERSION_CHUNK_SIZE = 64 * 2**20
+
+
+def _get_chunk_len(items, chunk_size):
+    # number of items in a chunk of at most chunk_size bytes (at least 1)
+    item_size = items.itemsize * int(np.prod(items.shape[1:], dtype=np.int64))
+    return max(1, chunk_size // max(item_size, 1))
+
+
+def check_dtype_range(items, dtype, chunk_size=DTYPE_CONVERSION_CHUNK_SIZE):
+    """
+        Check that all values of items can be represented in another dtype,
+        raising a ValueError if they can not (e.g. values over 255 converted
+        to uint8). Non-finite values can not be converted to integer types.
+
+        The check is done in chunks of items of bounded size, so that no
+        temporary arrays of the size of all items are created.
+
+        Parameters
+        ----------
+        items :         numpy.ndarray
+            the items to check, indexed by the first axis
+        dtype :         str or numpy.dtype
+            the dtype the items are to be converted to
+        chunk_size :    int
+            maximal size of checked chunks in bytes
+    """
+    dtype = np.dtype(dtype)
+    if np.can_cast(items.dtype, dtype, casting='safe'):
+        return
+    to_int = np.issubdtype(dtype, np.integer)
+    if to_int:
+        info = np.iinfo(dtype)
+    elif np.issubdtype(dtype, np.floating):
+        info = np.finfo(dtype)
+    else:
+        return
+    from_float = np.issubdtype(items.dtype, np.inexact)
+    chunk_len = _get_chunk_len(items, chunk_size)
+    for start in range(0, len(items), chunk_len):
+        chunk = items[start:start + chunk_len]
+        if from_float:
+            finite = np.isfinite(chunk)
+            if to_int and not np.all(finite):
+                raise ValueError('Non-finite values can not be converted to '
+                                 'dtype {}'.format(dtype.name))
+            # infinities and NaNs stay the same when converted to floats
+            chunk = chunk[finite]
+        if chunk.size == 0:
+            continue
+        min_val, max_val = chunk.min(), chunk.max()
+        if min_val < info.min or max_val > info.max:
+            raise ValueError('Values in range [{}, {}] do not fit into dtype '
+                             '{}'.format(min_val, max_val, dtype.name))
+
+
+def convert_items_dtype(items, dtype, num_items=None, in_place=True,
+                        check_range=True,
+                        chunk_size=DTYPE_CONVERSION_CHUNK_SIZE):
+    """
+        Convert the first num_items items of an array to another dtype, one
+        chunk of items of bounded size at a time.
+
+        If in_place is set, the array is writable and C-contiguous and the
+        new dtype is not larger than the current one, the items are
+        converted within the memory of the array, with the returned array
+        being a view of it. Otherwise, a new array is allocated and filled
+        with converted items chunk by chunk. In neither case is a temporary
+        copy of all items created. Items after num_items are not converted
+        and their values in the returned array are undefined.
+
+        Parameters
+        ----------
+        items :         numpy.ndarray
+            the items to convert, indexed by the first axis
+        dtype :         str or numpy.dtype
+            the dtype to convert the items to
+        num_items :     int
+            number of items to convert, by default all of them
+        in_place :      bool
+            allow converting the items in the memory of the passed array
+        check_range :   bool
+            check that all values fit into dtype before converting them
+            (see check_dtype_range)
+        chunk_size :    int
+            maximal size of converted chunks in bytes
+    """
+    dtype = np.dtype(dtype)
+    if items.dtype == dtype:
+        return items
+    num_items = len(items) if num_items is None else num_items
+    if check_range:
+        check_dtype_range(items[:num_items], dtype, chunk_size=chunk_size)
+    if (in_place and dtype.itemsize <= items.dtype.itemsize and
+            items.flags.writeable and items.flags.c_contiguous):
+        # the converted items of a chunk always end before the unconverted
+        # items of the next chunk start
+        buffer = items.reshape(-1).view(np.uint8)
+        converted = buffer[:items.size * dtype.itemsize].view(dtype)
+        converted = converted.reshape(items.shape)
+    else:
+        converted = np.empty(items.shape, dtype=dtype)
+    chunk_len = _get_chunk_len(items, chunk_size)
+    for start in range(0, num_items, chunk_len):
+        stop = min(start + chunk_len, num_items)
+        converted[start:stop] = items[start:stop]
+    return converted
+
+
 # classes
 
 class DataHolder():
+    """
+        Container of dataset data items of multiple types, all derived from
+        packets with the same shape.
+
+        Items of every used type are kept in a single contiguous ndarray
+        whose first axis indexes the items. The arrays are preallocated with
+        spare capacity which is grown geometrically as items are added, so
+        adding items one by one takes amortized constant time. Items are
+        returned as ndarray views into this storage wherever possible.
+    """
+
+    # minimal capacity (in items) allocated once the holder needs to grow
+    MIN_CAPACITY = 16
+    # multiplicative factor of capacity growth
+    GROWTH_FACTOR = 2
 
     def __init__(self, packet_shape, dtype=np.uint8, item_types={'raw': True,
-                 'yx': False, 'gtux': False, 'gtuy': False}):
+                 'yx': False, 'gtux': False, 'gtuy': False}, capacity=0):
         check_item_types(item_types)
         self._num_items = 0
+        self._capacity = capacity
         self._item_types = item_types
         self._used_types = tuple(k for k in cons.ALL_ITEM_TYPES
                                  if item_types[k] is True)
         self._item_shapes = get_data_item_shapes(packet_shape, item_types)
         self._packet_shape = tuple(packet_shape)
+        self._dtype = np.dtype(dtype).name
         self._data = create_data_holders(packet_shape, dtype=dtype,
-                                         item_types=item_types)
+                                         item_types=item_types,
+                                         num_items=capacity)
+        # whether the storage arrays were allocated by the holder (instead of
+        # being passed in through assign) and can be modified in place
+        self._owns_storage = True
         self.dtype = dtype
 
     def __len__(self):
         return self._num_items
 
-    def _get_indexes_sequence(self, indexing_obj):
+    def _get_index(self, indexing_obj):
         if indexing_obj is None:
-            return range(self._num_items)
-        elif isinstance(indexing_obj, slice):
-            return range(self._num_items)[indexing_obj]
-        elif isinstance(indexing_obj, collections.Sequence):
-            # range, list, tuple, etc
+            return slice(None)
+        elif isinstance(indexing_obj, (slice, int, np.integer)):
             return indexing_obj
+        elif isinstance(indexing_obj, range):
+            # ranges going forward can be converted to slices to get views
+            if indexing_obj.start >= 0 and indexing_obj.step > 0:
+                return slice(indexing_obj.start, indexing_obj.stop,
+                             indexing_obj.step)
+            return np.asarray(indexing_obj, dtype=np.intp)
+        elif isinstance(indexing_obj, (collections.abc.Sequence,
+                                       np.ndarray)):
+            # list, tuple, index array, etc
+            return np.asarray(indexing_obj, dtype=np.intp)
+        else:
+            raise Exception('Unsupported index type: {}'.format(
+                            type(indexing_obj)))
+
+    def _get_items(self, item_type, data_slice_or_idx=None):
+        items = self._data[item_type][:self._num_items]
+        return items[self._get_index(data_slice_or_idx)]
+
+    def _reserve(self, num_items):
+        # make sure the holder storage has room for num_items more items
+        # and return the index of the first unused item slot
+        start, required = self._num_items, self._num_items + num_items
+        if required > self._capacity:
+            capacity = max(required, self.MIN_CAPACITY,
+                           self.GROWTH_FACTOR * self._capacity)
+            for itype in self._used_types:
+                old_items = self._data[itype]
+                new_items = np.empty((capacity, *old_items.shape[1:]),
+                                     dtype=self._dtype)
+                new_items[:start] = old_items[:start]
+                self._data[itype] = new_items
+            self._capacity = capacity
+            self._owns_storage = True
+        return start
+
+    @property
+    def capacity(self):
+        """Number of items the holder can store before it has to grow."""
+        return self._capacity
 
     @property
     def dtype(self):
@@ -375,8 +689,10 @@ class DataHolder():
             raise Exception('Illegal data type: {}'.format(value))
         for item_type in self._used_types:
             data = self._data[item_type]
-            data = [datum.astype(dtype) for datum in data]
-            self._data[item_type] = data
+            if data.dtype != dtype:
+                self._data[item_type] = convert_items_dtype(
+                    data, dtype, num_items=self._num_items,
+                    in_place=self._owns_storage)
         self._dtype = dtype.name
 
     @property
@@ -413,8 +729,13 @@ class DataHolder():
                       if items_dict.get(itype, None) is None)
         if missing:
             raise Exception('Missing item types detected: {}'.format(missing))
-        for itype in self._used_types:
-            self._data[itype].append(items_dict[itype].astype(self.dtype))
+        items = {itype: np.asarray(items_dict[itype]) for itype in used_types}
+        for itype in used_types:
+            # items are converted to the holder dtype when copied to storage
+            check_dtype_range(items[itype][np.newaxis], self._dtype)
+        idx = self._reserve(1)
+        for itype in used_types:
+            self._data[itype][idx] = items[itype]
         self._num_items += 1
 
     def extend(self, items_iter_dict):
@@ -423,34 +744,130 @@ class DataHolder():
                       if items_iter_dict.get(itype, None) is None)
         if missing:
             raise Exception('Missing item types detected: {}'.format(missing))
+        items = {}
+        for itype in used_types:
+            type_items = items_iter_dict[itype]
+            if not isinstance(type_items, np.ndarray):
+                type_items = list(type_items)
+                if len(type_items) == 0:
+                    # no shape of items can be inferred from an empty list
+                    type_items = np.empty((0, *self._item_shapes[itype]),
+                                          dtype=self._dtype)
+                else:
+                    # the dtype is inferred, so that values out of range of
+                    # the holder dtype are detected below
+                    type_items = np.asarray(type_items)
+            if type_items.shape[1:] != tuple(self._item_shapes[itype]):
+                raise ValueError('Wrong shape of items of type {}. Expected: '
+                                 '{}, actual: {}'.format(
+                                    itype, self._item_shapes[itype],
+                                    type_items.shape[1:]))
+            items[itype] = type_items
+        num_items = set(len(items[itype]) for itype in used_types)
+        if len(num_items) > 1:
+            raise ValueError('Different number of items passed for different '
+                             'item types: {}'.format(num_items))
+        for itype in used_types:
+            # items are converted to the holder dtype when copied to storage
+            check_dtype_range(items[itype], self._dtype)
+        num_items = num_items.pop()
+        start = self._reserve(num_items)
+        for itype in used_types:
+            self._data[itype][start:start + num_items] = items[itype]
+        self._num_items += num_items
+
+    def assign(self, items_dict):
+        """
+            Replace all items in the holder with the passed item arrays.
+
+            Unlike extend, the arrays are not copied into new storage if
+            they already have the dtype of the holder, instead they are used
+            as the storage directly. This makes it possible to back the holder
+            with memory-mapped arrays, with only the items actually accessed
+            being read into memory. Adding new items to the holder afterwards
+            moves its contents into newly allocated in-memory storage.
+
+            Parameters
+            ----------
+            :param items_dict:  arrays of items of all used item types.
+            :type items_dict:   typing.Mapping[str, numpy.ndarray]
+        """
+        used_types = self._used_types
+        missing = set(itype for itype in used_types
+                      if items_dict.get(itype, None) is None)
+        if missing:
+            raise Exception('Missing item types detected: {}'.format(missing))
+        items = {itype: convert_items_dtype(np.asarray(items_dict[itype]),
+                                            self._dtype, in_place=False)
+                 for itype in used_types}
+        for itype in used_types:
+            if items[itype].shape[1:] != tuple(self._item_shapes[itype]):
+                raise ValueError('Wrong shape of items of type {}. Expected: '
+                                 '{}, actual: {}'.format(
+                                    itype, self._item_shapes[itype],
+                                    items[itype].shape[1:]))
+        num_items = set(len(items[itype]) for itype in used_types)
+        if len(num_items) > 1:
+            raise ValueError('Different number of items passed for different '
+                             'item types: {}'.format(num_items))
         for itype in used_types:
-            self._data[itype].extend(
-                item.astype(self.dtype) for item in items_iter_dict[itype])
-        self._num_items = len(self._data[used_types[0]])
+            self._data[itype] = items[itype]
+        self._num_items = self._capacity = num_items.pop()
+        self._owns_storage = False
 
     def append_packet(self, packet):
+        packet = np.asarray(packet)
         s = packet.shape
         if s != self.accepted_packet_shape:
             raise ValueError('Wrong packet shape passed. Expected. {}, '
                              'actual: {}'.format(self._packet_shape, s))
+        check_dtype_range(packet[np.newaxis], self._dtype)
         self.append(convert_packet(packet, self.item_types, dtype=self.dtype))
 
     def extend_packets(self, packets_iter):
-        for packet in packets_iter:
-            self.append_packet(packet)
+        if isinstance(packets_iter, np.ndarray):
+            packets = packets_iter
+        else:
+            packets = list(packets_iter)
+            if len(packets) == 0:
+                return
+            packets = np.stack(packets)
+        s = packets.shape[1:]
+        if s != self.accepted_packet_shape:
+            raise ValueError('Wrong packet shape passed. Expected. {}, '
+                             'actual: {}'.format(self._packet_shape, s))
+        # projections are maxima of packet values and so have the same range
+        check_dtype_range(packets, self._dtype)
+        num_items = len(packets)
+        start = self._reserve(num_items)
+        stop = start + num_items
+        # convert packets directly into the (already allocated) storage
+        out = {itype: self._data[itype][start:stop]
+               for itype in self._used_types}
+        convert_packets(packets, self.item_types, dtype=self.dtype, out=out)
+        self._num_items += num_items
 
     def get_data_as_arraylike(self, data_slice_or_idx=None):
-        idxs = self._get_indexes_sequence(data_slice_or_idx)
-        data = self._data
-        return tuple([data[k][idx] for idx in idxs] for k in self._used_types)
+        return tuple(self._get_items(k, data_slice_or_idx)
+                     for k in self._used_types)
 
     def get_data_as_dict(self, data_slice_or_idx=None):
-        idxs = self._get_indexes_sequence(data_slice_or_idx)
-        data = self._data
-        return {k: [data[k][idx] for idx in idxs] for k in self._used_types}
+        return {k: self._get_items(k, data_slice_or_idx)
+                for k in self._used_types}
 
-    def shuffle(self, shuffler, shuffler_state_resetter):
+    def permute(self, permutation):
+        """
+            Reorder held items, so that the item at position idx is the item
+            formerly at position permutation[idx].
+
+            Parameters
+            ----------
+            :param permutation:    permutation of indexes of all held items.
+            :type permutation:     numpy.ndarray
+        """
         for item_type in self._used_types:
-            items = self._data[item_type]
-            shuffler(items)
-            shuffler_state_resetter()
+            # gathers into a new array, the current storage might not be
+            # writable (e.g. if it is a read-only memory map)
+            self._data[item_type] = self._get_items(item_type, permutation)
+        self._capacity = self._num_items
+        self._owns_storage = True
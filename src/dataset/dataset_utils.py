@@ -1,3 +1,4 @@
+import collections.abc
 import operator
 import functools
 
@@ -8,6 +9,19 @@ import dataset.metadata_utils as meta
 import dataset.target_utils as targ
 
 
+def _check_permutation(permutation, num_items):
+    # convert to an array of indexes, raising an error unless it contains
+    # every index of num_items items exactly once
+    permutation = np.asarray(permutation, dtype=np.intp)
+    if len(permutation) != num_items:
+        raise ValueError('Permutation length {} does not match number of '
+                         'items {}'.format(len(permutation), num_items))
+    if not np.array_equal(np.sort(permutation), np.arange(num_items)):
+        raise ValueError('Not a permutation of {} items: {}'.format(
+                         num_items, permutation))
+    return permutation
+
+
 class NumpyDataset:
     """
         Class representing a dataset composed of data items of multiple types,
@@ -150,24 +164,93 @@ class NumpyDataset:
         self._meta.append(metadata)
         self._num_data += 1
 
+    def add_data_items(self, packets, targets, metadata=None):
+        """
+            Add a batch of items to the dataset, converting all packets into
+            items of the dataset item types at once.
+
+            Parameters
+            ----------
+            :param packets:     packets of the new items.
+            :type packets:      numpy.ndarray or typing.Sequence[
+                                    numpy.ndarray]
+            :param targets:     one-hot classification targets of the new
+                                items or their class indexes.
+            :type targets:      numpy.ndarray or typing.Sequence[
+                                    typing.Sequence[int]] or
+                                typing.Sequence[int]
+            :param metadata:    (optional) metadata of the new items, either
+                                one dict per item or a mapping of field names
+                                to values of all items.
+            :type metadata:     typing.Sequence[typing.Mapping[str, any]] or
+                                typing.Mapping[str, typing.Sequence[any]]
+        """
+        if not self._resizable:
+            raise Exception('Cannot add items to dataset')
+        num_items = len(packets)
+        # check targets and metadata before adding any items
+        targets = np.asarray(targets)
+        if targets.ndim == 1:
+            class_indices = targ.check_class_indices(targets)
+        else:
+            class_indices = targ.get_class_indices(targets)
+        if len(class_indices) != num_items:
+            raise ValueError('Expected {} targets, got {}'.format(
+                             num_items, len(class_indices)))
+        if not metadata:
+            metadata = [{}] * num_items
+        if isinstance(metadata, collections.abc.Mapping):
+            num_meta = set(len(values) for values in metadata.values())
+            extend_meta = self._meta.extend_columns
+        else:
+            num_meta = {len(metadata)}
+            extend_meta = self._meta.extend
+        if num_meta != {num_items}:
+            raise ValueError('Expected metadata of {} items, got {}'.format(
+                             num_items, num_meta))
+        self._data.extend_packets(packets)
+        self._targ.extend_class_indices({'classification': class_indices})
+        extend_meta(metadata)
+        self._num_data += num_items
+
     # dataset manipulation
 
-    def shuffle_dataset(self, num_shuffles):
+    def shuffle_dataset(self, num_shuffles=1, rng=None):
         """
-            Shuffle dataset data, their targets and metadata in unison
-            for a given number of times.
+            Randomly shuffle dataset data, their targets and metadata in
+            unison.
+
+            A single random permutation of items is computed and applied to
+            all item types, targets and metadata. As a composition of random
+            permutations is itself a random permutation, the items are only
+            reordered once regardless of num_shuffles (unless it is 0).
 
             Parameters
             ----------
-            :param int num_shuffles:   number of times to shuffle the dataset
+            :param num_shuffles:    number of times to shuffle the dataset.
+            :type num_shuffles:     int
+            :param rng:     (optional) random generator or seed to create it.
+            :type rng:      numpy.random.Generator or int
         """
-        shuffler = np.random.shuffle
-        for idx in range(num_shuffles):
-            rng_state = np.random.get_state()
-            state_resetter = lambda: np.random.set_state(rng_state)
-            self._data.shuffle(shuffler, state_resetter)
-            self._targ.shuffle(shuffler, state_resetter)
-            self._meta.shuffle(shuffler)
+        if num_shuffles > 0:
+            rng = np.random.default_rng(rng)
+            self.permute(rng.permutation(self._num_data))
+
+    def permute(self, permutation):
+        """
+            Reorder dataset data, their targets and metadata in unison, so that
+            the item at position idx is the item formerly at position
+            permutation[idx].
+
+            Parameters
+            ----------
+            :param permutation:    permutation of indexes of all items.
+            :type permutation:     numpy.ndarray
+        """
+        permutation = _check_permutation(permutation, self._num_data)
+        self._data.permute(permutation)
+        self._targ.permute(permutation)
+        self._meta.permute(permutation)
 
     def is_compatible_with(self, other_dataset, check_dtype=False):
         """
@@ -193,8 +276,10 @@ class NumpyDataset:
 
             Parameters
             ----------
-            :param other_dataset:   the dataset to merge into the current one.
-            :type other_dataset:    utils.dataset_utils.NumpyDataset
+            :param other_dataset:   the dataset or dataset view to merge into
+                                    the current one.
+            :type other_dataset:    utils.dataset_utils.NumpyDataset or
+                                    utils.dataset_utils.DatasetView
             :param items_slice_or_idx:  the slice of items from the dataset tp
                                         merge into the current dataset. Can be
                                         a simple numeric index or a slice.
@@ -206,11 +291,15 @@ class NumpyDataset:
             raise ValueError('Incompatible dataset to merge: {}',
                              other_dataset.name)
         s = self._get_items_slice(items_slice_or_idx)
+        if isinstance(other_dataset, DatasetView):
+            # merge directly from the dataset underlying the view
+            s = other_dataset.get_dataset_index(s)
+            other_dataset = other_dataset.dataset
         self._data.extend(other_dataset.get_data_as_dict(s))
         self._targ.extend({'classification': other_dataset.get_targets(s)})
-        metadata = other_dataset.get_metadata(s)
-        self._meta.extend(other_dataset.get_metadata(s))
-        self._num_data += len(metadata)
+        num_meta = len(self._meta)
+        self._meta.extend_from(other_dataset._meta, s)
+        self._num_data += len(self._meta) - num_meta
 
     def add_metafield(self, name, default_value=None):
         """
@@ -224,3 +313,163 @@ class NumpyDataset:
             :type default_value:   any
         """
         self._meta.add_metafield(name, default_value=default_value)
+
+
+class DatasetView:
+    """
+        Read-only view of a subset of dataset items, selected by a slice or a
+        sequence of item indexes.
+
+        The view only holds the selection of items, which are retrieved from
+        the underlying dataset when they are accessed. Views selected by a
+        slice return numpy views of the dataset data without copying them.
+        Creating a view of a view results in a view of the original dataset.
+    """
+
+    def __init__(self, dataset, items_slice_or_idx=None):
+        if isinstance(dataset, DatasetView):
+            items_slice_or_idx = dataset.get_dataset_index(items_slice_or_idx)
+            dataset = dataset.dataset
+        self._dataset = dataset
+        self._index = self._create_index(items_slice_or_idx)
+
+    # helper methods
+
+    def _create_index(self, items_slice_or_idx):
+        # store slices as ranges to be able to compose them without creating
+        # arrays of indexes
+        all_items = range(self._dataset.num_data)
+        if items_slice_or_idx is None:
+            return all_items
+        elif isinstance(items_slice_or_idx, slice):
+            return all_items[items_slice_or_idx]
+        elif isinstance(items_slice_or_idx, range):
+            return all_items[slice(items_slice_or_idx.start,
+                                   items_slice_or_idx.stop,
+                                   items_slice_or_idx.step)]
+        index = np.asarray(items_slice_or_idx, dtype=np.intp).reshape(-1)
+        return np.arange(self._dataset.num_data)[index]
+
+    def get_dataset_index(self, items_slice_or_idx=None):
+        """
+            Get the indexes of selected view items in the underlying dataset,
+            as a slice if possible or as an array of indexes otherwise.
+
+            Parameters
+            ----------
+            :param items_slice_or_idx:  (optional) slice or indexes of items.
+            :type items_slice_or_idx:   slice or typing.Sequence[int]
+        """
+        index = self._index
+        if items_slice_or_idx is not None:
+            if (isinstance(items_slice_or_idx, (int, np.integer)) or
+                    isinstance(items_slice_or_idx, slice)):
+                index = index[items_slice_or_idx]
+            else:
+                idx = np.asarray(items_slice_or_idx, dtype=np.intp)
+                index = np.asarray(index)[idx]
+        if isinstance(index, range):
+            stop = index.stop
+            if index.step < 0 and stop < 0:
+                # a negative stop would be counted from the end
+                stop = None
+            return slice(index.start, stop, index.step)
+        return index
+
+    # properties
+
+    @property
+    def dataset(self):
+        """The underlying dataset."""
+        return self._dataset
+
+    @property
+    def name(self):
+        return self._dataset.name
+
+    @property
+    def dtype(self):
+        return self._dataset.dtype
+
+    @property
+    def num_data(self):
+        return len(self._index)
+
+    @property
+    def item_types(self):
+        return self._dataset.item_types
+
+    @property
+    def accepted_packet_shape(self):
+        return self._dataset.accepted_packet_shape
+
+    @property
+    def item_shapes(self):
+        return self._dataset.item_shapes
+
+    @property
+    def metadata_fields(self):
+        return self._dataset.metadata_fields
+
+    # get items
+
+    def get_data_as_arraylike(self, data_slice_or_idx=None):
+        index = self.get_dataset_index(data_slice_or_idx)
+        return self._dataset.get_data_as_arraylike(index)
+
+    def get_data_as_dict(self, data_slice_or_idx=None):
+        index = self.get_dataset_index(data_slice_or_idx)
+        return self._dataset.get_data_as_dict(index)
+
+    def get_targets(self, targets_slice_or_idx=None):
+        index = self.get_dataset_index(targets_slice_or_idx)
+        return self._dataset.get_targets(index)
+
+    def get_metadata(self, metadata_slice_or_idx=None):
+        index = self.get_dataset_index(metadata_slice_or_idx)
+        return self._dataset.get_metadata(index)
+
+
+class PermutedView(DatasetView):
+    """
+        Read-only view of a dataset with its items in a permuted order.
+
+        The view only holds the permutation of item indexes, with items being
+        gathered from the underlying dataset when they are accessed. Getting
+        a new order of items (e.g. for every training epoch) therefore does
+        not move any items in memory.
+    """
+
+    def __init__(self, dataset, permutation=None, rng=None):
+        super(PermutedView, self).__init__(dataset)
+        # indexes of the permuted items in the underlying dataset
+        self._items = np.asarray(self._index)
+        self._rng = np.random.default_rng(rng)
+        if permutation is None:
+            self.reshuffle()
+        else:
+            self.permutation = permutation
+
+    # properties
+
+    @property
+    def permutation(self):
+        """
+            Indexes of items of the dataset (or view) passed to this view in
+            the order they are presented by this view.
+        """
+        return self._permutation
+
+    @permutation.setter
+    def permutation(self, value):
+        permutation = _check_permutation(value, len(self._items))
+        self._permutation = permutation
+        self._index = self._items[permutation]
+
+    # view manipulation
+
+    def reshuffle(self):
+        """
+            Draw a new random order of items from the view random generator.
+        """
+        self.permutation = self._rng.permutation(len(self._items))
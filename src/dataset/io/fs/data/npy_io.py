@@ -5,6 +5,7 @@ import numpy as np
 import dataset.constants as cons
 import dataset.data_utils as dat
 import dataset.io.fs.base as fs_io_base
+import utils.io_utils as io_utils
 
 
 class NumpyDataPersistencyHandler(fs_io_base.FsPersistencyHandler):
@@ -21,7 +22,7 @@ class NumpyDataPersistencyHandler(fs_io_base.FsPersistencyHandler):
             self._data[k] = data_files_suffixes.get(
                 k, self.DEFAULT_DATA_FILES_SUFFIXES[k])
 
-    def load_data(self, name, item_types):
+    def load_data(self, name, item_types, mmap_mode=None, items_slice=None):
         """
             Load dataset data from secondary storage as a dictionary of string
             to numpy.ndarray.
@@ -29,12 +30,23 @@ class NumpyDataPersistencyHandler(fs_io_base.FsPersistencyHandler):
             If a particular item type is not present or should not be loaded,
             it is substituted with an empty list.
 
+            If mmap_mode is set, the data files are memory-mapped instead of
+            being read into memory, with only the accessed items being read.
+
+            If items_slice is set, only the selected items are loaded, with
+            their location in the data files computed from the npy headers.
+
             Parameters
             ----------
             :param name:        the dataset name/data filenames prefix.
             :type name:         str
             :param item_types:  types of dataset items to load.
             :type item_types:   typing.Mapping[str, bool]
+            :param mmap_mode:   (optional) memory-map mode to open files with
+                                (see numpy.load).
+            :type mmap_mode:    str
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
         """
         self._check_before_read()
         dat.check_item_types(item_types)
@@ -43,7 +55,15 @@ class NumpyDataPersistencyHandler(fs_io_base.FsPersistencyHandler):
             if item_types[item_type]:
                 filename = os.path.join(self.loaddir, '{}{}.npy'.format(
                     name, self._data[item_type]))
-                data[item_type] = np.load(filename)
+                if mmap_mode is not None:
+                    items = np.load(filename, mmap_mode=mmap_mode)
+                    if items_slice is not None:
+                        items = items[items_slice]
+                elif items_slice is not None:
+                    items = io_utils.load_NPY(filename, rows=items_slice)
+                else:
+                    items = np.load(filename)
+                data[item_type] = items
             else:
                 data[item_type] = []
         return data
@@ -70,7 +90,8 @@ class NumpyDataPersistencyHandler(fs_io_base.FsPersistencyHandler):
         for k in keys:
             filename = os.path.join(self.savedir, '{}{}.npy'.format(
                 name, self._data[k]))
-            data = np.array(data_items_dict[k], dtype=dtype)
+            # no copy is made for contiguous item arrays of the same dtype
+            data = np.asarray(data_items_dict[k], dtype=dtype)
             np.save(filename, data)
             savefiles[k] = filename
         return savefiles
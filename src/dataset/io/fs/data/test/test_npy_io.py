@@ -41,6 +41,41 @@ class TestNumpyDataPersistencyManager(testset.DatasetItemsMixin,
         dset_data = self.handler.load_data(name, itypes)
         self.assertDictEqual(dset_data, exp_items)
 
+    @mock.patch('numpy.load')
+    def test_load_data_memory_mapped(self, m_load):
+        name, items, itypes = self.name, self.items, self.item_types
+        pattern = '_(raw|gtux|gtuy|yx)_test.npy'
+        i_getter = (lambda filename, mmap_mode:
+                    items[re.search(pattern, filename).group(1)])
+        m_load.side_effect = i_getter
+
+        self.handler.load_data(name, itypes, mmap_mode='r')
+        exp_filenames = set(os.path.join(self.loaddir, self.datafiles[k])
+                            for k, v in itypes.items() if v)
+        filenames = set(cal[0][0] for cal in m_load.call_args_list)
+        self.assertSetEqual(filenames, exp_filenames)
+        for cal in m_load.call_args_list:
+            self.assertEqual(cal[1], {'mmap_mode': 'r'})
+
+    @mock.patch('utils.io_utils.load_NPY')
+    def test_load_data_slice(self, m_load):
+        name, items, itypes = self.name, self.items, self.item_types
+        items_slice = slice(1, 2)
+        pattern = '_(raw|gtux|gtuy|yx)_test.npy'
+        i_getter = (lambda filename, rows:
+                    items[re.search(pattern, filename).group(1)][rows])
+        m_load.side_effect = i_getter
+        exp_items = {k: ([] if not v else items[k][items_slice])
+                     for k, v in itypes.items()}
+
+        dset_data = self.handler.load_data(name, itypes,
+                                           items_slice=items_slice)
+        self.assertSetEqual(set(dset_data.keys()), set(exp_items.keys()))
+        for k in exp_items.keys():
+            nptest.assert_array_equal(dset_data[k], exp_items[k])
+        for cal in m_load.call_args_list:
+            self.assertEqual(cal[1], {'rows': items_slice})
+
     @mock.patch('numpy.save')
     def test_save_data(self, m_save):
         name, items = self.name, self.items
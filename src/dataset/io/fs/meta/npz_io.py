@@ -0,0 +1,196 @@
+import json
+import os
+
+import numpy as np
+
+import dataset.io.fs.base as fs_io_base
+import dataset.metadata_utils as meta
+import utils.io_utils as io_utils
+
+# key of JSON objects standing in for tuples, which JSON has no type for
+_TUPLE_KEY = '__tuple__'
+
+
+def _to_json(field, value):
+    # tuples are tagged, so that they can be told apart from lists on load
+    def encode(val):
+        if isinstance(val, tuple):
+            return {_TUPLE_KEY: [encode(item) for item in val]}
+        elif isinstance(val, list):
+            return [encode(item) for item in val]
+        elif isinstance(val, dict):
+            return {key: encode(item) for key, item in val.items()}
+        return val
+    try:
+        return json.dumps(encode(value))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Value {!r} of metadata field {} cannot be stored: '
+                         '{}'.format(value, field, e)) from e
+
+
+def _from_json(value_json):
+    def decode(val):
+        if isinstance(val, list):
+            return [decode(item) for item in val]
+        elif isinstance(val, dict):
+            if len(val) == 1 and _TUPLE_KEY in val:
+                return tuple(decode(item) for item in val[_TUPLE_KEY])
+            return {key: decode(item) for key, item in val.items()}
+        return val
+    return decode(json.loads(value_json))
+
+
+class NpzMetadataPersistencyHandler(fs_io_base.FsPersistencyHandler):
+    """
+        Persistency handler storing dataset metadata in a binary npz file
+        with one typed array per metadata field, as they are stored in a
+        dataset.metadata_utils.MetadataHolder.
+
+        Besides the field arrays, the file contains a JSON schema of all
+        fields with their kinds (see dataset.metadata_utils.COLUMN_KINDS)
+        and the values of categorical fields. Values of categorical and
+        object fields must therefore be JSON-serializable, except for tuples,
+        which are stored tagged and loaded back as tuples.
+    """
+
+    # static attributes and methods
+
+    DEFAULT_METADATA_FILE_SUFFIX = '_meta'
+    # name of the format recorded in dataset configs
+    FORMAT = 'npz'
+    SCHEMA_KEY = 'schema'
+    SCHEMA_VERSION = 2
+
+    def __init__(self, load_dir=None, save_dir=None, metafile_suffix=None):
+        super(self.__class__, self).__init__(load_dir, save_dir)
+        self._meta = metafile_suffix or self.DEFAULT_METADATA_FILE_SUFFIX
+
+    def load_metadata_holder(self, name, metafields=None, items_slice=None):
+        """
+            Load dataset metadata from secondary storage as a metadata holder.
+
+            Only the arrays of requested fields are read from the file.
+
+            Parameters
+            ----------
+            :param name:        the dataset name/metadata filename prefix.
+            :type name:         str
+            :param metafields:  (optional) names of fields to load.
+            :type metafields:   typing.Iterable[str]
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
+        """
+        self._check_before_read()
+        filename = os.path.join(self.loaddir, '{}{}.npz'.format(
+            name, self._meta))
+        idx = slice(None) if items_slice is None else items_slice
+        with np.load(filename) as npzfile:
+            schema = json.loads(str(npzfile[self.SCHEMA_KEY]))
+            fields = schema['fields']
+            if metafields is not None:
+                unknown = set(metafields).difference(fields.keys())
+                if unknown:
+                    raise KeyError('Unknown metadata fields: {}'.format(
+                                   unknown))
+                fields = {k: v for k, v in fields.items() if k in metafields}
+            num_items = len(np.arange(schema['num_items'])[idx])
+            columns = {}
+            for field, attrs in fields.items():
+                key = attrs['key']
+                kind = attrs['kind']
+                values = npzfile['values_{}'.format(key)][idx]
+                missing = npzfile['missing_{}'.format(key)][idx]
+                categories = attrs.get('categories')
+                # categories are stored as JSON values since version 2
+                if kind == 'category' and schema['version'] > 1:
+                    categories = [_from_json(category)
+                                  for category in categories]
+                elif kind == 'object':
+                    values = [_from_json(value) for value in values]
+                columns[field] = meta.MetadataColumn.from_arrays(
+                    kind, values, missing, categories=categories)
+        return meta.MetadataHolder.from_columns(columns, num_items)
+
+    def load_metadata(self, name, metafields=None, items_slice=None):
+        """
+            Load dataset metadata from secondary storage as a list of dicts.
+
+            Parameters
+            ----------
+            :param name:        the dataset name/metadata filename prefix.
+            :type name:         str
+            :param metafields:  (optional) names of fields to load.
+            :type metafields:   typing.Iterable[str]
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
+        """
+        holder = self.load_metadata_holder(name, metafields=metafields,
+                                           items_slice=items_slice)
+        return holder[None]
+
+    def save_metadata(self, name, metadata, metafields=None,
+                      metafields_order=None):
+        """
+            Persist dataset metadata into secondary storage as an npz file
+            stored in outdir.
+
+            If metafields is passed, only these fields are saved. The order of
+            fields, if passed, must account for exactly these fields and is
+            kept in the saved schema.
+
+            Parameters
+            ----------
+            :param name:        the dataset name.
+            :type name:         str
+            :param metadata:    metadata to save/persist.
+            :type metadata:     dataset.metadata_utils.MetadataHolder or
+                                typing.Sequence[typing.Mapping[
+                                    str, typing.Any]]
+            :param metafields:  (optional) names of fields to save.
+            :type metafields:   typing.Set[str]
+            :param metafields_order:    (optional) ordering of fields.
+            :type metafields_order:     typing.Sequence[str]
+        """
+        self._check_before_write()
+        holder = metadata
+        if not isinstance(holder, meta.MetadataHolder):
+            holder = meta.MetadataHolder()
+            holder.extend(metadata)
+        metafields = metafields or holder.metadata_fields
+        unknown = set(metafields).difference(holder.metadata_fields)
+        if unknown:
+            raise ValueError('Unknown metadata fields: {}'.format(unknown))
+        if metafields_order is not None:
+            fields_in_order = set(metafields_order)
+            diff = fields_in_order.symmetric_difference(metafields)
+            if diff:
+                raise Exception('Metadata field order contains more or fewer '
+                                'fields than are present in metadata.\n'
+                                'Metafields in order: {}\nMetafields: {}'
+                                .format(fields_in_order, metafields))
+        else:
+            metafields_order = list(metafields)
+            metafields_order.sort()
+        num_items = len(holder)
+        items = slice(0, num_items)
+        arrays, fields = {}, {}
+        for key, field in enumerate(metafields_order):
+            column = holder.get_metadata_column(field)
+            attrs = {'key': key, 'kind': column.kind}
+            values = column.get_stored_values(items)
+            if column.kind == 'category':
+                attrs['categories'] = [_to_json(field, category)
+                                       for category in column.categories]
+            elif column.kind == 'object':
+                values = np.array([_to_json(field, value)
+                                   for value in values], dtype=str)
+            arrays['values_{}'.format(key)] = values
+            arrays['missing_{}'.format(key)] = column.get_missing(items)
+            fields[field] = attrs
+        schema = {'version': self.SCHEMA_VERSION, 'num_items': num_items,
+                  'fields': fields}
+        arrays[self.SCHEMA_KEY] = np.array(json.dumps(schema))
+        filename = os.path.join(self.savedir, '{}{}.npz'.format(
+            name, self._meta))
+        io_utils.save_NPZ(filename, arrays)
+        return filename
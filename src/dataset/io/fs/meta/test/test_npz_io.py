@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+import numpy.testing as nptest
+
+import dataset.io.fs.meta.npz_io as npz_io
+import dataset.metadata_utils as meta
+import test.test_setups as testset
+
+
+class TestNpzMetadataPersistencyManager(testset.DatasetMetadataMixin,
+                                        unittest.TestCase):
+
+    def setUp(self):
+        self.name = 'test'
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.handler = npz_io.NpzMetadataPersistencyHandler(
+            self.tempdir.name, self.tempdir.name,
+            metafile_suffix='_meta_test')
+        self.metadata = [
+            {'gtu': 1, 'energy': 0.5, 'shower': True, 'src': 'a.root',
+             'extra': [1, 2]},
+            {'gtu': 2, 'energy': 1.5, 'shower': False, 'src': None},
+            {'gtu': 3, 'energy': 2.5, 'shower': True, 'src': 'b.root',
+             'extra': {'k': 'v'}},
+        ]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_save_dataset_metadata(self):
+        exp_filename = os.path.join(self.tempdir.name, 'test_meta_test.npz')
+        filename = self.handler.save_metadata(self.name, self.mock_meta)
+        self.assertEqual(filename, exp_filename)
+        self.assertTrue(os.path.isfile(exp_filename))
+
+    def test_save_dataset_metadata_unknown_metafields(self):
+        self.assertRaises(ValueError, self.handler.save_metadata, self.name,
+                          self.metadata, metafields={'gtu', 'test'})
+
+    def test_save_dataset_metadata_unaccounted_metafields(self):
+        self.assertRaises(Exception, self.handler.save_metadata, self.name,
+                          self.mock_meta, metafields_order=['test'])
+
+    def test_load_dataset_metadata(self):
+        self.handler.save_metadata(self.name, self.metadata)
+        dset_meta = self.handler.load_metadata(self.name)
+        self.assertListEqual(dset_meta, self.metadata)
+
+    def test_load_dataset_metadata_keeps_types(self):
+        holder = meta.MetadataHolder()
+        holder.extend(self.metadata)
+        self.handler.save_metadata(self.name, holder)
+        loaded = self.handler.load_metadata_holder(self.name)
+        for field in ('gtu', 'energy', 'shower', 'src', 'extra'):
+            self.assertEqual(loaded.get_metadata_column(field).kind,
+                             holder.get_metadata_column(field).kind)
+        nptest.assert_array_equal(loaded.get_column('gtu'), [1, 2, 3])
+
+    def test_load_dataset_metadata_non_scalar_values(self):
+        metadata = [
+            {'pos': (1, 2), 'extra': (1, [2, (3, 4)])},
+            {'pos': (3, 4), 'extra': {'k': (5, 6)}},
+            {'pos': (1, 2), 'extra': [(7, 8)]},
+        ]
+        holder = meta.MetadataHolder()
+        holder.extend(metadata)
+        self.assertEqual(holder.get_metadata_column('pos').kind, 'category')
+        self.handler.save_metadata(self.name, holder)
+        dset_meta = self.handler.load_metadata(self.name)
+        self.assertListEqual(dset_meta, metadata)
+        self.assertIsInstance(dset_meta[0]['pos'], tuple)
+        self.assertIsInstance(dset_meta[0]['extra'][1][1], tuple)
+
+    def test_save_dataset_metadata_unserializable_values(self):
+        metadata = [{'extra': {1, 2}}, {'extra': {3}}]
+        self.assertRaises(ValueError, self.handler.save_metadata, self.name,
+                          metadata)
+
+    def test_load_dataset_metadata_specific_fields(self):
+        self.handler.save_metadata(self.name, self.metadata)
+        dset_meta = self.handler.load_metadata(self.name, ['gtu', 'src'])
+        exp_meta = [{'gtu': item['gtu'], 'src': item['src']}
+                    for item in self.metadata]
+        self.assertListEqual(dset_meta, exp_meta)
+
+    def test_load_dataset_metadata_slice(self):
+        self.handler.save_metadata(self.name, self.metadata)
+        dset_meta = self.handler.load_metadata(self.name,
+                                               items_slice=slice(1, None))
+        self.assertListEqual(dset_meta, self.metadata[1:])
+        dset_meta = self.handler.load_metadata(self.name, items_slice=[2, 0])
+        self.assertListEqual(dset_meta,
+                             [self.metadata[2], self.metadata[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
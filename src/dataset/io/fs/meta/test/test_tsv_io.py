@@ -43,6 +43,18 @@ class TestTSVMetadataPersistencyManager(testset.DatasetMetadataMixin,
         m_load.assert_called_once_with(exp_filename,
                                        selected_columns=set(metafields))
 
+    @mock.patch('utils.io_utils.load_TSV')
+    def test_load_dataset_metadata_slice(self, m_load):
+        items_slice = slice(1, 2)
+        m_load.return_value = self.mock_meta[items_slice]
+        exp_filename = os.path.join(self.loaddir, self.metafile)
+
+        dset_meta = self.handler.load_metadata(self.name,
+                                               items_slice=items_slice)
+        self.assertListEqual(dset_meta, self.mock_meta[items_slice])
+        m_load.assert_called_once_with(exp_filename, selected_columns=None,
+                                       rows=items_slice)
+
     @mock.patch('utils.io_utils.save_TSV')
     def test_save_dataset_metadata(self, m_save):
         exp_filename = os.path.join(self.savedir, self.metafile)
@@ -10,12 +10,14 @@ class TSVMetadataPersistencyHandler(fs_io_base.FsPersistencyHandler):
     # static attributes and methods
 
     DEFAULT_METADATA_FILE_SUFFIX = '_meta'
+    # name of the format recorded in dataset configs
+    FORMAT = 'tsv'
 
     def __init__(self, load_dir=None, save_dir=None, metafile_suffix=None):
         super(self.__class__, self).__init__(load_dir, save_dir)
         self._meta = metafile_suffix or self.DEFAULT_METADATA_FILE_SUFFIX
 
-    def load_metadata(self, name, metafields=None):
+    def load_metadata(self, name, metafields=None, items_slice=None):
         """
             Load dataset metadata from secondary storage as a list of dicts.
 
@@ -24,19 +26,28 @@ class TSVMetadataPersistencyHandler(fs_io_base.FsPersistencyHandler):
             with any extra field values unparsed and indexed by the default
             None key.
 
+            If items_slice is set, only the metadata of the selected items are
+            parsed, with the lines of all other items being skipped.
+
             Parameters
             ----------
             :param name:        the dataset name/metadata filename prefix.
             :type name:         str
             :param metafields:  (optional) names of fields to load.
             :type metafields:   typing.Iterable[str]
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
         """
         meta_fields = metafields
         if meta_fields is not None:
             meta_fields = set(metafields)
         filename = os.path.join(self.loaddir, '{}{}.tsv'.format(
             name, self._meta))
-        meta = io_utils.load_TSV(filename, selected_columns=meta_fields)
+        if items_slice is not None:
+            meta = io_utils.load_TSV(filename, selected_columns=meta_fields,
+                                     rows=items_slice)
+        else:
+            meta = io_utils.load_TSV(filename, selected_columns=meta_fields)
         return meta
 
     def save_metadata(self, name, metadata, metafields=None,
@@ -3,6 +3,7 @@ import os
 import numpy as np
 
 import dataset.io.fs.base as fs_io_base
+import utils.io_utils as io_utils
 
 
 class NumpyTargetsPersistencyHandler(fs_io_base.FsPersistencyHandler):
@@ -17,17 +18,25 @@ class NumpyTargetsPersistencyHandler(fs_io_base.FsPersistencyHandler):
         self._targ = (classification_targets_file_suffix or
                       self.DEFAULT_CLASSIFICATION_TARGETS_FILE_SUFFIX)
 
-    def load_targets(self, name):
+    def load_targets(self, name, items_slice=None):
         """
             Load dataset targets from secondary storage as a numpy.ndarray.
 
+            If items_slice is set, only the targets of the selected items are
+            read from the targets file.
+
             Parameters
             ----------
             :param name:        the dataset name/targets filename prefix.
             :type name:         str
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
         """
         filename = '{}{}.npy'.format(name, self._targ)
-        return np.load(os.path.join(self.loaddir, filename))
+        filename = os.path.join(self.loaddir, filename)
+        if items_slice is not None:
+            return io_utils.load_NPY(filename, rows=items_slice)
+        return np.load(filename)
 
     def save_targets(self, name, targets):
         """
@@ -34,6 +34,17 @@ class TestNumpyTargetsFsPersistencyManager(testset.DatasetTargetsMixin,
         nptest.assert_array_equal(dset_targets, self.mock_targets)
         m_load.assert_called_with(exp_filename)
 
+    @mock.patch('utils.io_utils.load_NPY')
+    def test_load_dataset_targets_slice(self, m_load):
+        items_slice = slice(1, 2)
+        m_load.return_value = self.mock_targets[items_slice]
+        exp_filename = os.path.join(self.loaddir, self.targetsfile)
+        dset_targets = self.handler.load_targets(self.name,
+                                                 items_slice=items_slice)
+        nptest.assert_array_equal(dset_targets,
+                                  self.mock_targets[items_slice])
+        m_load.assert_called_once_with(exp_filename, rows=items_slice)
+
     @mock.patch('numpy.save')
     def test_save_dataset_targets(self, m_save):
         exp_filename = os.path.join(self.savedir, self.targetsfile)
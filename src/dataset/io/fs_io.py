@@ -6,9 +6,20 @@ import dataset.constants as cons
 import dataset.dataset_utils as ds
 import dataset.io.fs.base as fs_io_base
 import dataset.io.fs.data.npy_io as data_io
+import dataset.io.fs.meta.npz_io as npz_meta_io
 import dataset.io.fs.meta.tsv_io as meta_io
 import dataset.io.fs.targets.npy_io as targets_io
 
+# metadata persistency handlers by the format recorded in dataset configs
+METADATA_HANDLERS = {
+    meta_io.TSVMetadataPersistencyHandler.FORMAT:
+        meta_io.TSVMetadataPersistencyHandler,
+    npz_meta_io.NpzMetadataPersistencyHandler.FORMAT:
+        npz_meta_io.NpzMetadataPersistencyHandler,
+}
+# format of metadata of datasets with configs not recording it
+DEFAULT_METADATA_FORMAT = meta_io.TSVMetadataPersistencyHandler.FORMAT
+
 
 class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
 
@@ -45,6 +56,17 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
     def metadata_persistency_handler(self):
         return self._meta_handler
 
+    # helper methods
+
+    def _get_metadata_handler(self, metadata_format):
+        # handler of the format metadata of a dataset were saved in
+        if getattr(self._meta_handler, 'FORMAT', None) == metadata_format:
+            return self._meta_handler
+        if metadata_format not in METADATA_HANDLERS:
+            raise ValueError('Unknown metadata format: {}'.format(
+                             metadata_format))
+        return METADATA_HANDLERS[metadata_format](load_dir=self.loaddir)
+
     # dataset load
 
     def load_dataset_config(self, name):
@@ -73,6 +95,8 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
         attrs['num_data'] = int(general['num_data'])
         attrs['metafields'] = ast.literal_eval(general['metafields'])
         attrs['dtype'] = general['dtype']
+        attrs['metadata_format'] = general.get('metadata_format',
+                                               DEFAULT_METADATA_FORMAT)
         packet_shape = config['packet_shape']
         n_f = int(packet_shape['num_frames'])
         f_h = int(packet_shape['frame_height'])
@@ -102,19 +126,33 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
                                   item_types=itypes, dtype=attrs['dtype'])
         return dataset
 
-    def load_dataset(self, name, item_types=None):
+    def load_dataset(self, name, item_types=None, mmap=False,
+                     items_slice=None):
         """
             Load a dataset from secondary storage.
 
             This function assumes that the relevant dataset files are located
             in the same directory (loaddir).
 
+            If mmap is set, the dataset data are memory-mapped read-only
+            instead of being loaded into memory. Only the items actually
+            accessed (e.g. through slicing) are then read from storage, and
+            no copy of the items is made when loading.
+
+            If items_slice is set, only the selected items (data, targets and
+            metadata) are read from storage and the returned dataset contains
+            just these items.
+
             Parameters
             ----------
             :param name:        the dataset name.
             :type name:         str
             :param item_types:  (optional) types of dataset items to load.
             :type item_types:   typing.Mapping[str, bool]
+            :param mmap:        (optional) memory-map the dataset data.
+            :type mmap:         bool
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
         """
         # TODO: Think of a way to load dataset with items that does not depend
         # on knowledge of NumpyDataset internals
@@ -123,14 +161,34 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
         config = self.load_dataset_config(name)
         itypes = item_types or config['item_types']
         dataset = ds.NumpyDataset(name, config['packet_shape'],
-                                  item_types=itypes)
-        data = self._data_handler.load_data(name, dataset.item_types)
-        targets = self._target_handler.load_targets(name)
-        metadata = self._meta_handler.load_metadata(name)
-        dataset._data.extend(data)
+                                  item_types=itypes, dtype=config['dtype'])
+        if items_slice is None:
+            kwargs = {}
+        else:
+            kwargs = {'items_slice': items_slice}
+        if mmap:
+            data = self._data_handler.load_data(name, dataset.item_types,
+                                                mmap_mode='r', **kwargs)
+            dataset._data.assign(data)
+        else:
+            data = self._data_handler.load_data(name, dataset.item_types,
+                                                **kwargs)
+            dataset._data.extend(data)
+        targets = self._target_handler.load_targets(name, **kwargs)
         dataset._targ.extend({'classification': targets})
-        dataset._meta.extend(metadata)
-        dataset._num_data = config['num_data']
+        # metadata are loaded in the format they were saved in
+        meta_handler = self._get_metadata_handler(config['metadata_format'])
+        if hasattr(meta_handler, 'load_metadata_holder'):
+            # columnar metadata are merged without creating per-item dicts
+            metadata = meta_handler.load_metadata_holder(name, **kwargs)
+            dataset._meta.extend_from(metadata)
+        else:
+            metadata = meta_handler.load_metadata(name, **kwargs)
+            dataset._meta.extend(metadata)
+        if items_slice is None:
+            dataset._num_data = config['num_data']
+        else:
+            dataset._num_data = len(targets)
         return dataset
 
     # dataset save/persist
@@ -150,7 +208,11 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
         """
         self._check_before_write()
         name = dataset.name
-        metadata, metafields = dataset.get_metadata(), dataset.metadata_fields
+        metafields = dataset.metadata_fields
+        if hasattr(self._meta_handler, 'load_metadata_holder'):
+            metadata = dataset._meta
+        else:
+            metadata = dataset.get_metadata()
         self._meta_handler.save_metadata(name, metadata, metafields=metafields,
                                          metafields_order=metafields_order)
         targets = dataset.get_targets()
@@ -166,6 +228,8 @@ class DatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
         config['general']['num_data'] = str(dataset.num_data)
         config['general']['metafields'] = str(dataset.metadata_fields)
         config['general']['dtype'] = str(dataset.dtype)
+        config['general']['metadata_format'] = getattr(
+            self._meta_handler, 'FORMAT', DEFAULT_METADATA_FORMAT)
         n_f, f_h, f_w = dataset.accepted_packet_shape
         config['packet_shape'] = {}
         config['packet_shape']['num_frames'] = str(n_f)
@@ -0,0 +1,636 @@
+import ast
+import collections.abc
+import configparser
+import os
+
+import numpy as np
+
+import dataset.constants as cons
+import dataset.dataset_utils as ds
+import dataset.io.fs.base as fs_io_base
+import dataset.io.fs.data.npy_io as data_io
+import dataset.io.fs.meta.npz_io as meta_io
+import dataset.io.fs.targets.npy_io as targets_io
+import dataset.metadata_utils as meta
+import utils.io_utils as io_utils
+
+
+class ShardedDatasetFsPersistencyHandler(fs_io_base.FsPersistencyHandler):
+    """
+        Persistency handler storing a dataset as a sequence of shards, each
+        holding at most shard_size consecutive items, so that datasets which
+        do not fit into memory can be saved, appended to and loaded in parts.
+
+        Every shard consists of the same files a whole dataset would be
+        stored in (one npy file per item type, an npy file of targets and an
+        npz file of metadata), with filenames prefixed by the shard name
+        ('<name>_shard<index>'). All shards are listed in a manifest file
+        ('<name>_manifest.ini') along with the dataset configuration, their
+        item ranges, file shapes and checksums of their files.
+    """
+
+    # static attributes and methods
+
+    DEFAULT_MANIFEST_FILE_SUFFIX = '_manifest'
+    DEFAULT_SHARD_SIZE = 10000
+    SHARD_SECTION_PREFIX = 'shard_'
+    CHECKSUM_ALGORITHM = 'sha256'
+
+    def __init__(self, load_dir=None, save_dir=None, manifest_suffix=None,
+                 shard_size=None):
+        super(self.__class__, self).__init__(load_dir, save_dir)
+        self._manifest = manifest_suffix or self.DEFAULT_MANIFEST_FILE_SUFFIX
+        self.shard_size = shard_size or self.DEFAULT_SHARD_SIZE
+        self._loaders = self._create_handlers(load_dir, None)
+        self._savers = self._create_handlers(None, save_dir)
+
+    # helper methods
+
+    def _create_handlers(self, load_dir, save_dir):
+        return (data_io.NumpyDataPersistencyHandler(load_dir, save_dir),
+                targets_io.NumpyTargetsPersistencyHandler(load_dir, save_dir),
+                meta_io.NpzMetadataPersistencyHandler(load_dir, save_dir))
+
+    def _get_base_dataset(self, dataset):
+        if isinstance(dataset, ds.DatasetView):
+            return dataset.dataset
+        return dataset
+
+    def _get_dataset_index(self, dataset, items_slice_or_idx):
+        if isinstance(dataset, ds.DatasetView):
+            return dataset.get_dataset_index(items_slice_or_idx)
+        if items_slice_or_idx is None:
+            return slice(0, dataset.num_data)
+        return items_slice_or_idx
+
+    def _get_shard_name(self, name, shard_idx):
+        return '{}_shard{:05d}'.format(name, shard_idx)
+
+    def _get_manifest_filename(self, directory, name):
+        return os.path.join(directory, '{}{}.ini'.format(name,
+                                                         self._manifest))
+
+    def _read_manifest(self, directory, name):
+        filename = self._get_manifest_filename(directory, name)
+        if not os.path.exists(filename):
+            raise FileNotFoundError('Manifest file {} does not exist'.format(
+                                    filename))
+        manifest = configparser.ConfigParser(interpolation=None)
+        manifest.read(filename, encoding='UTF-8')
+        return manifest
+
+    def _write_manifest(self, name, manifest):
+        # replace the previous manifest only once the new one is complete, so
+        # that it always lists consistent shards
+        filename = self._get_manifest_filename(self.savedir, name)
+        tmp_filename = '{}.tmp'.format(filename)
+        with open(tmp_filename, 'w', encoding='UTF-8') as manifestfile:
+            manifest.write(manifestfile)
+        os.replace(tmp_filename, filename)
+        return filename
+
+    def _create_manifest(self, dataset):
+        manifest = configparser.ConfigParser(interpolation=None)
+        manifest['general'] = {}
+        manifest['general']['num_data'] = '0'
+        manifest['general']['num_shards'] = '0'
+        manifest['general']['metafields'] = str([])
+        manifest['general']['dtype'] = str(dataset.dtype)
+        n_f, f_h, f_w = dataset.accepted_packet_shape
+        manifest['packet_shape'] = {}
+        manifest['packet_shape']['num_frames'] = str(n_f)
+        manifest['packet_shape']['frame_height'] = str(f_h)
+        manifest['packet_shape']['frame_width'] = str(f_w)
+        item_types = dataset.item_types
+        manifest['item_types'] = {}
+        for k in cons.ALL_ITEM_TYPES:
+            manifest['item_types'][k] = str(item_types[k])
+        return manifest
+
+    def _parse_manifest(self, manifest):
+        attrs = {}
+        general = manifest['general']
+        attrs['num_data'] = int(general['num_data'])
+        attrs['metafields'] = set(ast.literal_eval(general['metafields']))
+        attrs['dtype'] = general['dtype']
+        packet_shape = manifest['packet_shape']
+        n_f = int(packet_shape['num_frames'])
+        f_h = int(packet_shape['frame_height'])
+        f_w = int(packet_shape['frame_width'])
+        attrs['packet_shape'] = (n_f, f_h, f_w)
+        item_types_sec = manifest['item_types']
+        item_types = {k: (v == 'True') for k, v in item_types_sec.items()}
+        attrs['item_types'] = item_types
+        shards = []
+        for shard_idx in range(int(general['num_shards'])):
+            section = manifest['{}{:05d}'.format(self.SHARD_SECTION_PREFIX,
+                                                 shard_idx)]
+            shard = {'name': section['name'], 'start': int(section['start']),
+                     'stop': int(section['stop']),
+                     'metafields': set(ast.literal_eval(
+                        section['metafields'])),
+                     'files': {}}
+            for key in section['files'].split():
+                shard['files'][key] = {
+                    'filename': section['{}_file'.format(key)],
+                    'shape': ast.literal_eval(section['{}_shape'.format(key)]),
+                    'checksum': section['{}_checksum'.format(key)]}
+            shards.append(shard)
+        attrs['shards'] = shards
+        return attrs
+
+    def _check_compatible(self, attrs, dataset):
+        if (attrs['packet_shape'] != tuple(dataset.accepted_packet_shape) or
+                attrs['item_types'] != dataset.item_types or
+                np.dtype(attrs['dtype']) != np.dtype(dataset.dtype)):
+            raise ValueError('Dataset {} is incompatible with the sharded '
+                             'dataset it is to be appended to'.format(
+                                dataset.name))
+
+    def _save_shard(self, name, shard_idx, dataset, index, metafields_order):
+        # save items of the dataset at index as a new shard, returning the
+        # manifest section describing it
+        data_handler, targets_handler, meta_handler = self._savers
+        shard_name = self._get_shard_name(name, shard_idx)
+        data = dataset.get_data_as_dict(index)
+        files = data_handler.save_data(shard_name, data, dtype=dataset.dtype)
+        shapes = {k: np.shape(data[k]) for k in files}
+        targets = dataset.get_targets(index)
+        files['targets'] = targets_handler.save_targets(shard_name, targets)
+        shapes['targets'] = np.shape(targets)
+        holder = meta.MetadataHolder()
+        holder.extend_from(dataset._meta, index)
+        order = metafields_order
+        if order is not None:
+            order = [field for field in order
+                     if field in holder.metadata_fields]
+        files['meta'] = meta_handler.save_metadata(shard_name, holder,
+                                                   metafields_order=order)
+        shapes['meta'] = (len(holder), len(holder.metadata_fields))
+        keys = [k for k in cons.ALL_ITEM_TYPES if k in files]
+        keys += ['targets', 'meta']
+        section = {'name': shard_name, 'files': ' '.join(keys)}
+        for key in keys:
+            section['{}_file'.format(key)] = os.path.basename(files[key])
+            section['{}_shape'.format(key)] = str(tuple(shapes[key]))
+            section['{}_checksum'.format(key)] = io_utils.get_file_checksum(
+                files[key], algorithm=self.CHECKSUM_ALGORITHM)
+        return section, holder.metadata_fields
+
+    def _add_shard(self, manifest, section, metafields):
+        general = manifest['general']
+        shard_idx = int(general['num_shards'])
+        start = int(general['num_data'])
+        num_items = ast.literal_eval(section['targets_shape'])[0]
+        section['start'] = str(start)
+        section['stop'] = str(start + num_items)
+        section['metafields'] = str(sorted(metafields))
+        manifest['{}{:05d}'.format(self.SHARD_SECTION_PREFIX,
+                                   shard_idx)] = section
+        fields = set(ast.literal_eval(general['metafields']))
+        general['metafields'] = str(sorted(fields.union(metafields)))
+        general['num_shards'] = str(shard_idx + 1)
+        general['num_data'] = str(start + num_items)
+
+    def _get_shard_rows(self, shards, num_data, items_slice):
+        # split selected items into (shard, rows in shard) parts in the
+        # order of shards, along with the permutation restoring the order of
+        # items in items_slice (or None if the order is the same)
+        if items_slice is None:
+            return [(shard, None) for shard in shards], None
+        if isinstance(items_slice, slice) and items_slice.step in (None, 1):
+            start, stop, _ = items_slice.indices(num_data)
+            parts = []
+            for shard in shards:
+                s_start = max(start, shard['start'])
+                s_stop = min(stop, shard['stop'])
+                if s_start < s_stop:
+                    rows = slice(s_start - shard['start'],
+                                 s_stop - shard['start'])
+                    parts.append((shard, rows))
+            return parts, None
+        if isinstance(items_slice, slice):
+            idx = np.arange(*items_slice.indices(num_data))
+        else:
+            idx = np.asarray(items_slice, dtype=np.intp).reshape(-1)
+            idx = np.where(idx < 0, idx + num_data, idx)
+            if np.any((idx < 0) | (idx >= num_data)):
+                raise IndexError('Item indexes out of range for dataset with '
+                                 '{} items'.format(num_data))
+        starts = np.array([shard['start'] for shard in shards],
+                          dtype=np.intp)
+        shard_ids = np.searchsorted(starts, idx, side='right') - 1
+        order = np.argsort(shard_ids, kind='stable')
+        idx, shard_ids = idx[order], shard_ids[order]
+        unique_ids, bounds = np.unique(shard_ids, return_index=True)
+        bounds = [*bounds, len(idx)]
+        parts = [(shards[s_id], idx[bounds[i]:bounds[i + 1]] - starts[s_id])
+                 for i, s_id in enumerate(unique_ids)]
+        if np.all(order[1:] > order[:-1]):
+            return parts, None
+        return parts, np.argsort(order)
+
+    def _load_shard(self, shard, item_types, mmap, rows):
+        data_handler, targets_handler, meta_handler = self._loaders
+        kwargs = {} if rows is None else {'items_slice': rows}
+        mmap_mode = 'r' if mmap else None
+        data = data_handler.load_data(shard['name'], item_types,
+                                      mmap_mode=mmap_mode, **kwargs)
+        targets = targets_handler.load_targets(shard['name'], **kwargs)
+        metadata = meta_handler.load_metadata_holder(shard['name'], **kwargs)
+        return data, targets, metadata
+
+    def _verify_shard(self, shard):
+        # names of shard files with contents not matching their checksums
+        corrupted = []
+        for attrs in shard['files'].values():
+            filename = os.path.join(self.loaddir, attrs['filename'])
+            checksum = io_utils.get_file_checksum(
+                filename, algorithm=self.CHECKSUM_ALGORITHM)
+            if checksum != attrs['checksum']:
+                corrupted.append(filename)
+        return corrupted
+
+    def _create_dataset(self, name, attrs, item_types):
+        itypes = item_types or attrs['item_types']
+        return ds.NumpyDataset(name, attrs['packet_shape'],
+                               item_types=itypes, dtype=attrs['dtype'])
+
+    # properties
+
+    @property
+    def shard_size(self):
+        """Maximal number of items in a saved shard."""
+        return self._shard_size
+
+    @shard_size.setter
+    def shard_size(self, value):
+        if value < 1:
+            raise ValueError('Invalid shard size: {}'.format(value))
+        self._shard_size = value
+
+    # dataset load
+
+    def load_dataset_config(self, name):
+        """
+            Load the configuration of a sharded dataset and the list of its
+            shards from its manifest, without loading any of its contents.
+
+            Besides the attributes returned by
+            dataset.io.fs_io.DatasetFsPersistencyHandler.load_dataset_config,
+            the returned dict contains the list of shards under the key
+            'shards', each being a dict with the shard name, its range of
+            items ('start' and 'stop') and its files.
+
+            Parameters
+            ----------
+            :param name:        the dataset name/manifest filename prefix.
+            :type name:         str
+        """
+        self._check_before_read()
+        return self._parse_manifest(self._read_manifest(self.loaddir, name))
+
+    def load_empty_dataset(self, name, item_types=None):
+        """
+            Create a dataset from configuration stored in the manifest of a
+            sharded dataset without loading any of its contents.
+
+            Parameters
+            ----------
+            :param name:        the dataset name/manifest filename prefix.
+            :type name:         str
+            :param item_types:  (optional) types of dataset items to load.
+            :type item_types:   typing.Mapping[str, bool]
+        """
+        attrs = self.load_dataset_config(name)
+        return self._create_dataset(name, attrs, item_types)
+
+    def load_dataset(self, name, item_types=None, mmap=False,
+                     items_slice=None):
+        """
+            Load a sharded dataset or only the selected items of it from
+            secondary storage.
+
+            Only the shards containing selected items are read, and only the
+            selected items of each of them. Items are returned in the order
+            they are selected in.
+
+            If mmap is set and all selected items are in a single shard, the
+            dataset data are memory-mapped read-only instead of being loaded
+            into memory (see dataset.io.fs_io.DatasetFsPersistencyHandler).
+
+            Parameters
+            ----------
+            :param name:        the dataset name.
+            :type name:         str
+            :param item_types:  (optional) types of dataset items to load.
+            :type item_types:   typing.Mapping[str, bool]
+            :param mmap:        (optional) memory-map the dataset data.
+            :type mmap:         bool
+            :param items_slice: (optional) slice or indexes of items to load.
+            :type items_slice:  slice or typing.Sequence[int]
+        """
+        attrs = self.load_dataset_config(name)
+        dataset = self._create_dataset(name, attrs, item_types)
+        parts, permutation = self._get_shard_rows(
+            attrs['shards'], attrs['num_data'], items_slice)
+        for shard, rows in parts:
+            data, targets, metadata = self._load_shard(
+                shard, dataset.item_types, mmap, rows)
+            if mmap and len(parts) == 1:
+                dataset._data.assign(data)
+            else:
+                dataset._data.extend(data)
+            dataset._targ.extend({'classification': targets})
+            dataset._meta.extend_from(metadata)
+            dataset._num_data += len(targets)
+        if permutation is not None:
+            dataset.permute(permutation)
+        return dataset
+
+    def iter_shards(self, name, item_types=None, mmap=False, verify=False):
+        """
+            Iterate over shards of a sharded dataset, loading every shard as a
+            dataset (with the name of the sharded dataset) only when it is
+            reached, so that at most one shard is held in memory at a time.
+
+            If verify is set, the checksums of shard files are checked before
+            the shard is loaded, raising an IOError if they do not match.
+
+            Parameters
+            ----------
+            :param name:        the dataset name.
+            :type name:         str
+            :param item_types:  (optional) types of dataset items to load.
+            :type item_types:   typing.Mapping[str, bool]
+            :param mmap:        (optional) memory-map the shard data.
+            :type mmap:         bool
+            :param verify:      (optional) verify checksums of shard files.
+            :type verify:       bool
+        """
+        attrs = self.load_dataset_config(name)
+        for shard in attrs['shards']:
+            if verify:
+                corrupted = self._verify_shard(shard)
+                if corrupted:
+                    raise IOError('Checksums of files {} do not match the '
+                                  'manifest'.format(corrupted))
+            dataset = self._create_dataset(name, attrs, item_types)
+            data, targets, metadata = self._load_shard(
+                shard, dataset.item_types, mmap, None)
+            if mmap:
+                dataset._data.assign(data)
+            else:
+                dataset._data.extend(data)
+            dataset._targ.extend({'classification': targets})
+            dataset._meta.extend_from(metadata)
+            dataset._num_data = len(targets)
+            yield dataset
+
+    def verify_dataset(self, name):
+        """
+            Check the contents of all shard files of a sharded dataset against
+            the checksums in its manifest, returning the list of files which
+            do not match (an empty list if the dataset is intact).
+
+            Parameters
+            ----------
+            :param name:        the dataset name.
+            :type name:         str
+        """
+        attrs = self.load_dataset_config(name)
+        corrupted = []
+        for shard in attrs['shards']:
+            corrupted.extend(self._verify_shard(shard))
+        return corrupted
+
+    # dataset save/persist
+
+    def create_dataset(self, dataset):
+        """
+            Create an empty sharded dataset with the configuration (name,
+            packet shape, item types and dtype) of the passed dataset in the
+            output directory, replacing any sharded dataset with the same
+            name. Shards can then be added to it with append_shard.
+
+            Parameters
+            ----------
+            :param dataset:         the dataset to take the configuration of.
+            :type dataset:          dataset.dataset_utils.NumpyDataset
+        """
+        self._check_before_write()
+        return self._write_manifest(dataset.name,
+                                    self._create_manifest(dataset))
+
+    def truncate_dataset(self, name, num_shards=None):
+        """
+            Drop all but the first num_shards shards of a sharded dataset in
+            the output directory from its manifest, e.g. to discard shards
+            written after the last known consistent state of the dataset,
+            returning the number of items in the kept shards. Files of
+            dropped shards are left in place and get overwritten by shards
+            appended afterwards.
+
+            Parameters
+            ----------
+            :param name:        the dataset name.
+            :type name:         str
+            :param num_shards:  (optional) number of shards to keep, by
+                                default all of them.
+            :type num_shards:   int
+        """
+        self._check_before_write()
+        manifest = self._read_manifest(self.savedir, name)
+        attrs = self._parse_manifest(manifest)
+        if num_shards is None:
+            num_shards = len(attrs['shards'])
+        if num_shards > len(attrs['shards']):
+            raise ValueError('Cannot keep {} shards of dataset {} with {} '
+                             'shards'.format(num_shards, name,
+                                             len(attrs['shards'])))
+        truncated = self._create_manifest(self._create_dataset(name, attrs,
+                                                               None))
+        for shard_idx in range(num_shards):
+            section_name = '{}{:05d}'.format(self.SHARD_SECTION_PREFIX,
+                                             shard_idx)
+            section = dict(manifest[section_name])
+            self._add_shard(truncated, section,
+                            attrs['shards'][shard_idx]['metafields'])
+        self._write_manifest(name, truncated)
+        return int(truncated['general']['num_data'])
+
+    def save_dataset(self, dataset, metafields_order=None):
+        """
+            Persist the dataset into secondary storage as shards of at most
+            shard_size items, replacing any sharded dataset with the same name
+            in the output directory.
+
+            Parameters
+            ----------
+            :param dataset:         the dataset or dataset view to persist.
+            :type dataset:          dataset.dataset_utils.NumpyDataset or
+                                    dataset.dataset_utils.DatasetView
+            :param metafields_order:    (optional) ordering of metadata fields
+                                        in shard metadata files.
+            :type metafields_order:     typing.Sequence[str]
+        """
+        self._check_before_write()
+        name = dataset.name
+        manifest = self._create_manifest(dataset)
+        num_data = dataset.num_data
+        for shard_idx, start in enumerate(range(0, num_data,
+                                                self._shard_size)):
+            stop = min(start + self._shard_size, num_data)
+            index = self._get_dataset_index(dataset, slice(start, stop))
+            section, metafields = self._save_shard(
+                name, shard_idx, self._get_base_dataset(dataset), index,
+                metafields_order)
+            self._add_shard(manifest, section, metafields)
+        return self._write_manifest(name, manifest)
+
+    def append_shard(self, dataset, items_slice_or_idx=None,
+                     metafields_order=None):
+        """
+            Append (selected) items of a dataset to the sharded dataset with
+            the same name in the output directory as a new shard, creating the
+            sharded dataset if it does not exist yet.
+
+            The manifest is only updated after all shard files are written,
+            so an interrupted append does not corrupt the sharded dataset.
+
+            Parameters
+            ----------
+            :param dataset:         the dataset or dataset view to append.
+            :type dataset:          dataset.dataset_utils.NumpyDataset or
+                                    dataset.dataset_utils.DatasetView
+            :param items_slice_or_idx:  (optional) slice or indexes of items
+                                        to append.
+            :type items_slice_or_idx:   slice or typing.Sequence[int]
+            :param metafields_order:    (optional) ordering of metadata fields
+                                        in the shard metadata file.
+            :type metafields_order:     typing.Sequence[str]
+        """
+        self._check_before_write()
+        name = dataset.name
+        filename = self._get_manifest_filename(self.savedir, name)
+        if os.path.exists(filename):
+            manifest = self._read_manifest(self.savedir, name)
+            self._check_compatible(self._parse_manifest(manifest), dataset)
+        else:
+            manifest = self._create_manifest(dataset)
+        index = self._get_dataset_index(dataset, items_slice_or_idx)
+        shard_idx = int(manifest['general']['num_shards'])
+        section, metafields = self._save_shard(
+            name, shard_idx, self._get_base_dataset(dataset), index,
+            metafields_order)
+        self._add_shard(manifest, section, metafields)
+        return self._write_manifest(name, manifest)
+
+
+class ShardedDatasetWriter:
+    """
+        Writer of a sharded dataset (see ShardedDatasetFsPersistencyHandler)
+        accepting items one at a time or in batches.
+
+        Added items are held in an in-memory dataset until there are enough
+        of them to fill a shard, at which point they are appended to the
+        sharded dataset as a new shard and dropped from memory. Memory usage
+        is therefore bounded by the shard size regardless of the number of
+        items written. The last (possibly smaller) shard is written by close.
+
+        If append is set, items are appended to an existing sharded dataset
+        after its first num_shards shards (all of them by default).
+    """
+
+    def __init__(self, handler, name, packet_shape, dtype=np.uint8,
+                 item_types={'raw': True, 'yx': False, 'gtux': False,
+                             'gtuy': False}, append=False, num_shards=None):
+        self._handler = handler
+        self._name = name
+        self._packet_shape = packet_shape
+        self._dtype = dtype
+        self._item_types = item_types
+        self._num_written = 0
+        self._buffer = self._create_buffer()
+        if append:
+            self._num_written = handler.truncate_dataset(name, num_shards)
+        else:
+            handler.create_dataset(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    # helper methods
+
+    def _create_buffer(self):
+        return ds.NumpyDataset(self._name, self._packet_shape,
+                               item_types=self._item_types, dtype=self._dtype)
+
+    # properties
+
+    @property
+    def name(self):
+        """Name of the written dataset."""
+        return self._name
+
+    @property
+    def num_data(self):
+        """Number of items written so far, including buffered items."""
+        return self._num_written + self._buffer.num_data
+
+    @property
+    def num_buffered(self):
+        """Number of items not yet written to a shard."""
+        return self._buffer.num_data
+
+    @property
+    def num_free(self):
+        """Number of items to be added before the next shard is written."""
+        return self._handler.shard_size - self._buffer.num_data
+
+    # add items
+
+    def add_data_item(self, packet, target, metadata={}):
+        self._buffer.add_data_item(packet, target, metadata=metadata)
+        if self._buffer.num_data >= self._handler.shard_size:
+            self.flush()
+
+    def add_data_items(self, packets, targets, metadata=None):
+        """
+            Add a batch of items (see dataset.dataset_utils.NumpyDataset.
+            add_data_items), writing every shard filled up by them.
+        """
+        num_items, start = len(packets), 0
+        is_columns = isinstance(metadata, collections.abc.Mapping)
+        while start < num_items:
+            s = slice(start, start + self.num_free)
+            if is_columns:
+                batch_meta = {name: values[s]
+                              for name, values in metadata.items()}
+            else:
+                batch_meta = None if metadata is None else metadata[s]
+            self._buffer.add_data_items(packets[s], targets[s],
+                                        metadata=batch_meta)
+            start = s.stop
+            if self._buffer.num_data >= self._handler.shard_size:
+                self.flush()
+
+    def flush(self):
+        """
+            Append all buffered items to the sharded dataset as a new shard.
+        """
+        if self._buffer.num_data == 0:
+            return
+        self._handler.append_shard(self._buffer)
+        self._num_written += self._buffer.num_data
+        self._buffer = self._create_buffer()
+
+    def close(self):
+        """
+            Write the remaining buffered items to the sharded dataset.
+        """
+        self.flush()
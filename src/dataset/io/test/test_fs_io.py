@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 import unittest.mock as mock
 
@@ -6,6 +7,7 @@ import dataset.constants as cons
 import dataset.data_utils as dat
 import dataset.dataset_utils as ds
 import dataset.io.fs.data.npy_io as data_io
+import dataset.io.fs.meta.npz_io as npz_meta_io
 import dataset.io.fs.meta.tsv_io as meta_io
 import dataset.io.fs.targets.npy_io as targets_io
 import dataset.io.fs_io as fs_io
@@ -50,6 +52,7 @@ class TestDatasetFsPersistencyManager(testset.DatasetItemsMixin,
             'num_data = {}{}'.format(n_data, os.linesep) +
             'metafields = {}{}'.format(cls.metafields, os.linesep) +
             'dtype = {}{}'.format(m_dataset.dtype, os.linesep) +
+            'metadata_format = tsv{}'.format(os.linesep) +
             '{}[packet_shape]{}'.format(os.linesep, os.linesep) +
             'num_frames = {}{}'.format(cls.n_f, os.linesep) +
             'frame_height = {}{}'.format(cls.f_h, os.linesep) +
@@ -83,6 +86,7 @@ class TestDatasetFsPersistencyManager(testset.DatasetItemsMixin,
                     meta_io.TSVMetadataPersistencyHandler
                 )
             )
+            cls.handler.metadata_persistency_handler.FORMAT = 'tsv'
 
     # test dataset loading methods
 
@@ -96,7 +100,7 @@ class TestDatasetFsPersistencyManager(testset.DatasetItemsMixin,
             'metafields': m_dataset.metadata_fields,
             'item_types': m_dataset.item_types,
             'packet_shape': m_dataset.accepted_packet_shape,
-            'dtype': m_dataset.dtype }
+            'dtype': m_dataset.dtype, 'metadata_format': 'tsv' }
         exp_filename = os.path.join(self.loaddir, self.configfile)
 
         config = self.handler.load_dataset_config(m_dataset.name)
@@ -151,5 +155,50 @@ class TestDatasetFsPersistencyManager(testset.DatasetItemsMixin,
             metafields_order=self.meta_order)
 
 
+class TestDatasetFsPersistencyMetadataFormats(testset.DatasetItemsMixin,
+                                              unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dataset = ds.NumpyDataset('test', self.packet_shape)
+        for idx in range(self.n_packets):
+            self.dataset.add_data_item(self.items['raw'][idx],
+                                       cons.CLASSIFICATION_TARGETS['noise'],
+                                       {'idx': idx, 'pos': (idx, 0)})
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_dataset_saved_with_npz_metadata(self):
+        dirname = self.tempdir.name
+        npz_handler = npz_meta_io.NpzMetadataPersistencyHandler(dirname,
+                                                                dirname)
+        fs_io.DatasetFsPersistencyHandler(
+            dirname, dirname, metadata_handler=npz_handler).save_dataset(
+            self.dataset)
+        # the default (TSV) handler loads metadata in the saved format
+        handler = fs_io.DatasetFsPersistencyHandler(dirname, dirname)
+        config = handler.load_dataset_config('test')
+        self.assertEqual(config['metadata_format'], 'npz')
+        dataset = handler.load_dataset('test')
+        self.assertListEqual(dataset.get_metadata(),
+                             self.dataset.get_metadata())
+
+    def test_load_dataset_without_recorded_metadata_format(self):
+        dirname = self.tempdir.name
+        handler = fs_io.DatasetFsPersistencyHandler(dirname, dirname)
+        handler.save_dataset(self.dataset)
+        configfile = os.path.join(dirname, 'test_config.ini')
+        with open(configfile, encoding='UTF-8') as f:
+            lines = [line for line in f
+                     if not line.startswith('metadata_format')]
+        with open(configfile, 'w', encoding='UTF-8') as f:
+            f.writelines(lines)
+        config = handler.load_dataset_config('test')
+        self.assertEqual(config['metadata_format'], 'tsv')
+        self.assertEqual(handler.load_dataset('test').num_data,
+                         self.n_packets)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,237 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import numpy.testing as nptest
+
+import dataset.constants as cons
+import dataset.dataset_utils as ds
+import dataset.io.sharded_fs_io as sharded_io
+import test.test_setups as testset
+
+
+class TestShardedDatasetFsPersistencyHandler(testset.DatasetItemsMixin,
+                                             unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.handler = sharded_io.ShardedDatasetFsPersistencyHandler(
+            self.tempdir.name, self.tempdir.name, shard_size=2)
+        item_types = {'raw': True, 'yx': True, 'gtux': False, 'gtuy': False}
+        self.dset = self._create_dataset(range(5), item_types)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _create_dataset(self, indexes, item_types=None):
+        item_types = item_types or {'raw': True, 'yx': True, 'gtux': False,
+                                    'gtuy': False}
+        dset = ds.NumpyDataset('test', self.packet_shape,
+                               item_types=item_types)
+        for idx in indexes:
+            packet = np.full(self.packet_shape, idx, dtype=np.uint8)
+            target = cons.CLASSIFICATION_TARGETS['noise' if idx % 2
+                                                 else 'shower']
+            dset.add_data_item(packet, target, {'idx': idx})
+        return dset
+
+    def _assertDatasetItems(self, dset, exp_indexes):
+        data = dset.get_data_as_dict()
+        nptest.assert_array_equal(data['raw'][:, 0, 0, 0], exp_indexes)
+        nptest.assert_array_equal(data['yx'][:, 0, 0], exp_indexes)
+        exp_targets = [[0, 1] if idx % 2 else [1, 0] for idx in exp_indexes]
+        nptest.assert_array_equal(dset.get_targets(), exp_targets)
+        self.assertListEqual(dset.get_metadata(),
+                             [{'idx': idx} for idx in exp_indexes])
+        self.assertEqual(dset.num_data, len(exp_indexes))
+
+    def test_save_dataset(self):
+        self.handler.save_dataset(self.dset)
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(config['num_data'], 5)
+        self.assertEqual(config['packet_shape'], self.packet_shape)
+        self.assertSetEqual(config['metafields'], {'idx'})
+        self.assertListEqual([(s['start'], s['stop'])
+                              for s in config['shards']],
+                             [(0, 2), (2, 4), (4, 5)])
+        files = config['shards'][2]['files']
+        self.assertSetEqual(set(files.keys()), {'raw', 'yx', 'targets',
+                                                'meta'})
+        self.assertEqual(files['raw']['shape'], (1, *self.packet_shape))
+        self.assertListEqual(self.handler.verify_dataset('test'), [])
+
+    def test_load_dataset(self):
+        self.handler.save_dataset(self.dset)
+        dset = self.handler.load_dataset('test')
+        self._assertDatasetItems(dset, range(5))
+
+    def test_load_dataset_items_slice(self):
+        self.handler.save_dataset(self.dset)
+        for items_slice in (slice(1, 4), slice(4, None), slice(None, None, 2),
+                            [4, 0, 3], [-1, 1]):
+            dset = self.handler.load_dataset('test', items_slice=items_slice)
+            self._assertDatasetItems(dset, np.arange(5)[items_slice])
+        self.assertRaises(IndexError, self.handler.load_dataset, 'test',
+                          items_slice=[5])
+
+    def test_load_dataset_mmap_single_shard(self):
+        self.handler.save_dataset(self.dset)
+        dset = self.handler.load_dataset('test', mmap=True,
+                                         items_slice=slice(2, 4))
+        self._assertDatasetItems(dset, [2, 3])
+        # read-only memory-mapped data are not copied into the dataset
+        self.assertFalse(dset.get_data_as_dict()['raw'].flags.writeable)
+
+    def test_iter_shards(self):
+        self.handler.save_dataset(self.dset)
+        shards = list(self.handler.iter_shards('test', verify=True))
+        self.assertEqual(len(shards), 3)
+        self._assertDatasetItems(shards[1], [2, 3])
+
+    def test_append_shard(self):
+        self.handler.save_dataset(self.dset)
+        view = ds.DatasetView(self._create_dataset(range(5, 10)),
+                              slice(1, 4))
+        self.handler.append_shard(view)
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(config['num_data'], 8)
+        self.assertEqual(config['shards'][-1]['start'], 5)
+        dset = self.handler.load_dataset('test', items_slice=slice(3, None))
+        self._assertDatasetItems(dset, [3, 4, 6, 7, 8])
+
+    def test_append_shard_creates_dataset(self):
+        self.handler.append_shard(self.dset, slice(0, 3))
+        dset = self.handler.load_dataset('test')
+        self._assertDatasetItems(dset, range(3))
+
+    def test_append_shard_incompatible_dataset(self):
+        self.handler.save_dataset(self.dset)
+        other = self._create_dataset(range(2), {'raw': True, 'yx': False,
+                                                'gtux': False, 'gtuy': False})
+        self.assertRaises(ValueError, self.handler.append_shard, other)
+
+    def test_truncate_dataset(self):
+        self.handler.save_dataset(self.dset)
+        num_data = self.handler.truncate_dataset('test', 2)
+        self.assertEqual(num_data, 4)
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(len(config['shards']), 2)
+        self.handler.append_shard(self._create_dataset(range(7, 8)))
+        dset = self.handler.load_dataset('test')
+        self._assertDatasetItems(dset, [0, 1, 2, 3, 7])
+        self.assertRaises(ValueError, self.handler.truncate_dataset, 'test',
+                          4)
+
+    def test_verify_dataset_corrupted_shard(self):
+        self.handler.save_dataset(self.dset)
+        config = self.handler.load_dataset_config('test')
+        shard_file = config['shards'][1]['files']['raw']['filename']
+        filename = os.path.join(self.tempdir.name, shard_file)
+        with open(filename, 'r+b') as datafile:
+            datafile.seek(-1, os.SEEK_END)
+            datafile.write(b'\xff')
+        self.assertListEqual(self.handler.verify_dataset('test'), [filename])
+        shards = self.handler.iter_shards('test', verify=True)
+        next(shards)
+        self.assertRaises(IOError, next, shards)
+
+
+
+class TestShardedDatasetWriter(testset.DatasetItemsMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.handler = sharded_io.ShardedDatasetFsPersistencyHandler(
+            self.tempdir.name, self.tempdir.name, shard_size=2)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _add_items(self, writer, indexes):
+        for idx in indexes:
+            packet = np.full(self.packet_shape, idx, dtype=np.uint8)
+            target = cons.CLASSIFICATION_TARGETS['noise' if idx % 2
+                                                 else 'shower']
+            writer.add_data_item(packet, target, {'idx': idx})
+
+    def test_add_data_item(self):
+        writer = sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                                 self.packet_shape)
+        self._add_items(writer, range(3))
+        # full shards are written as soon as they are complete
+        self.assertEqual(writer.num_buffered, 1)
+        self.assertEqual(writer.num_data, 3)
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(config['num_data'], 2)
+        writer.close()
+        dset = self.handler.load_dataset('test')
+        nptest.assert_array_equal(dset.get_data_as_dict()['raw'][:, 0, 0, 0],
+                                  range(3))
+        self.assertListEqual(dset.get_metadata(),
+                             [{'idx': idx} for idx in range(3)])
+
+    def test_add_data_items(self):
+        writer = sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                                 self.packet_shape)
+        self._add_items(writer, range(1))
+        self.assertEqual(writer.num_free, 1)
+        packets = [np.full(self.packet_shape, idx, dtype=np.uint8)
+                   for idx in range(1, 6)]
+        targets = [idx % 2 for idx in range(1, 6)]
+        writer.add_data_items(packets, targets,
+                              {'idx': list(range(1, 6))})
+        # batches are split into shards
+        self.assertEqual(writer.num_buffered, 0)
+        self.assertEqual(writer.num_data, 6)
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(len(config['shards']), 3)
+        writer.close()
+        dset = self.handler.load_dataset('test')
+        nptest.assert_array_equal(dset.get_data_as_dict()['raw'][:, 0, 0, 0],
+                                  range(6))
+        nptest.assert_array_equal(dset.get_targets().argmax(axis=1),
+                                  [idx % 2 for idx in range(6)])
+        self.assertListEqual(dset.get_metadata(),
+                             [{'idx': idx} for idx in range(6)])
+
+    def test_overwrite_existing_dataset(self):
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape) as writer:
+            self._add_items(writer, range(3))
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape) as writer:
+            self._add_items(writer, range(1))
+        config = self.handler.load_dataset_config('test')
+        self.assertEqual(config['num_data'], 1)
+        self.assertEqual(len(config['shards']), 1)
+
+    def test_append_to_existing_dataset(self):
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape) as writer:
+            self._add_items(writer, range(3))
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape,
+                                             append=True) as writer:
+            self.assertEqual(writer.num_data, 3)
+            self._add_items(writer, range(3, 5))
+        dset = self.handler.load_dataset('test')
+        nptest.assert_array_equal(dset.get_data_as_dict()['raw'][:, 0, 0, 0],
+                                  range(5))
+
+    def test_append_after_kept_shards(self):
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape) as writer:
+            self._add_items(writer, range(5))
+        with sharded_io.ShardedDatasetWriter(self.handler, 'test',
+                                             self.packet_shape, append=True,
+                                             num_shards=1) as writer:
+            self.assertEqual(writer.num_data, 2)
+            self._add_items(writer, range(2, 4))
+        dset = self.handler.load_dataset('test')
+        nptest.assert_array_equal(dset.get_data_as_dict()['raw'][:, 0, 0, 0],
+                                  range(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
-import collections
+import collections.abc
 import typing
 
+import numpy as np
+
+
 def extract_metafields(metadata):
     metafields = set()
     for item in metadata:
@@ -8,39 +11,487 @@ def extract_metafields(metadata):
     return metafields
 
 
+# marks a field not being present in a particular metadata item
+_MISSING = object()
+
+# metadata column kinds and the dtypes of arrays storing their values (for
+# categorical columns, these are codes into the list of column categories)
+COLUMN_KINDS = ('bool', 'int', 'float', 'category', 'object')
+_KIND_DTYPES = {'bool': np.bool_, 'int': np.int64, 'float': np.float64,
+                'category': np.int32, 'object': object}
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _infer_column_kind(values):
+    # most specific column kind able to store all values without changing
+    # them, None if there are no values to store
+    if len(values) == 0:
+        return None
+    types = set(type(value) for value in values)
+    if types.issubset((bool, np.bool_)):
+        return 'bool'
+    if all(issubclass(t, (int, np.integer)) and not issubclass(t, bool)
+           for t in types):
+        return 'int'
+    if all(issubclass(t, (float, np.floating)) for t in types):
+        return 'float'
+    if all(_is_hashable(value) for value in values):
+        return 'category'
+    return 'object'
+
+
+def _merge_column_kinds(kind, other_kind):
+    # column kind able to store values of both kinds without changing them
+    if other_kind is None or kind == other_kind:
+        return kind
+    if kind is None:
+        return other_kind
+    if 'object' in (kind, other_kind):
+        return 'object'
+    return 'category'
+
+
+class MetadataColumn:
+    """
+        Values of a single metadata field stored in a typed numpy array.
+
+        Boolean and numeric values are stored directly, other hashable values
+        (e.g. strings or None) as codes into a list of unique column values
+        (categories) and anything else as python objects. Items which do not
+        contain the field are marked in a separate mask of missing values.
+
+        The column kind is changed to a more general one if values which can
+        not be stored in it are written into the column.
+
+        Columns created by constant only store their single value until
+        anything is written into them, the arrays of values and of the mask
+        of missing values being allocated on the first write.
+    """
+
+    def __init__(self, kind, capacity=0):
+        self._kind = kind
+        # value of all items of a constant column which was not written to
+        # yet, _MISSING if the column arrays are already allocated
+        self._constant = _MISSING
+        self._constant_capacity = 0
+        self._values = np.empty(capacity, dtype=_KIND_DTYPES[kind])
+        self._missing = np.zeros(capacity, dtype=np.bool_)
+        self._categories = []
+        self._category_codes = {}
+        self._categories_array = np.empty(0, dtype=object)
+
+    @classmethod
+    def constant(cls, value, capacity=0):
+        """
+            Create a column of the given capacity with all its items set to
+            the same value, without writing the value into each item.
+
+            Creating the column takes constant time, its arrays are only
+            allocated once anything is written into it.
+        """
+        if _is_hashable(value):
+            column = cls('category')
+            column._encode([value])
+        else:
+            column = cls('object')
+        column._constant, column._constant_capacity = value, capacity
+        return column
+
+    @classmethod
+    def from_arrays(cls, kind, values, missing, categories=None):
+        """
+            Create a column from arrays of stored values (category codes for
+            categorical columns) and of the mask of missing values.
+        """
+        column = cls(kind)
+        column._values = np.asarray(values, dtype=_KIND_DTYPES[kind])
+        column._missing = np.asarray(missing, dtype=np.bool_)
+        if categories is not None:
+            column._encode(categories)
+        return column
+
+    # properties
+
+    @property
+    def kind(self):
+        """Kind of values stored in this column (see COLUMN_KINDS)."""
+        return self._kind
+
+    @property
+    def categories(self):
+        """Unique values of a categorical column, indexed by their codes."""
+        return self._categories
+
+    @property
+    def capacity(self):
+        if self._constant is not _MISSING:
+            return self._constant_capacity
+        return len(self._values)
+
+    # private helpers
+
+    def _allocate(self):
+        # write the value of a constant column into arrays of its items
+        if self._constant is _MISSING:
+            return
+        capacity = self._constant_capacity
+        self._values = np.empty(capacity, dtype=_KIND_DTYPES[self._kind])
+        if self._kind == 'category':
+            # the value is the only category of the column
+            self._values.fill(0)
+        else:
+            self._values.fill(self._constant)
+        self._missing = np.zeros(capacity, dtype=np.bool_)
+        self._constant = _MISSING
+
+    def _constant_values(self, idx, value, dtype):
+        # array of the given value for each selected item of a constant
+        # column
+        if isinstance(idx, slice):
+            num_items = len(range(self._constant_capacity)[idx])
+        else:
+            num_items = len(np.asarray(idx).reshape(-1))
+        result = np.empty(num_items, dtype=dtype)
+        result.fill(value)
+        return result
+
+    def _encode(self, values):
+        # category codes of values, adding new categories as needed
+        codes, categories = self._category_codes, self._categories
+        result = np.empty(len(values), dtype=np.int32)
+        for idx, value in enumerate(values):
+            # distinguish equal values of different types (e.g. 1 and True)
+            key = (type(value), value)
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(categories)
+                categories.append(value)
+            result[idx] = code
+        return result
+
+    def _decode(self, codes):
+        categories = self._categories_array
+        if len(categories) != len(self._categories):
+            # categories were added since the last call
+            categories = np.empty(len(self._categories), dtype=object)
+            categories[:] = self._categories
+            self._categories_array = categories
+        return categories[codes]
+
+    def _to_array(self, values):
+        # convert values to an array storable in this column
+        if self._kind == 'category':
+            return self._encode(values)
+        elif self._kind == 'object':
+            result = np.empty(len(values), dtype=object)
+            for idx, value in enumerate(values):
+                result[idx] = value
+            return result
+        return np.array(values, dtype=_KIND_DTYPES[self._kind])
+
+    def _convert(self, kind, num_items):
+        # change the column kind, keeping the first num_items values
+        values = self.get_values(slice(0, num_items)).tolist()
+        capacity = self.capacity
+        self._kind, self._categories, self._category_codes = kind, [], {}
+        self._categories_array = np.empty(0, dtype=object)
+        self._values = np.empty(capacity, dtype=_KIND_DTYPES[kind])
+        self._values[:num_items] = self._to_array(values)
+
+    # column manipulation
+
+    def resize(self, capacity, num_items):
+        """
+            Change the column capacity, keeping the first num_items items.
+        """
+        if self._constant is not _MISSING:
+            self._constant_capacity = capacity
+            return
+        values = np.empty(capacity, dtype=self._values.dtype)
+        missing = np.zeros(capacity, dtype=np.bool_)
+        values[:num_items] = self._values[:num_items]
+        missing[:num_items] = self._missing[:num_items]
+        self._values, self._missing = values, missing
+
+    def set_missing(self, start, stop):
+        """
+            Mark items in the range [start, stop) as not containing the field.
+        """
+        self._allocate()
+        self._missing[start:stop] = True
+
+    def write(self, start, values):
+        """
+            Write values into items starting at the given position.
+
+            Values equal to the module-level _MISSING marker denote items not
+            containing the field.
+
+            Parameters
+            ----------
+            :param start:   position of the first item to write.
+            :type start:    int
+            :param values:  values to write.
+            :type values:   typing.Sequence[typing.Any]
+        """
+        self._allocate()
+        stop = start + len(values)
+        missing = np.fromiter((value is _MISSING for value in values),
+                              dtype=np.bool_, count=len(values))
+        present = [value for value in values if value is not _MISSING]
+        kind = _infer_column_kind(present)
+        if kind is not None and self._missing[:start].all():
+            # no values to keep, use the most specific kind for new values
+            if kind != self._kind:
+                self._convert(kind, 0)
+        else:
+            kind = _merge_column_kinds(self._kind, kind)
+            if kind != self._kind:
+                self._convert(kind, start)
+        try:
+            arr = self._to_array(present)
+        except OverflowError:
+            # python ints not fitting into int64
+            self._convert('category', start)
+            arr = self._to_array(present)
+        self._missing[start:stop] = missing
+        self._values[start:stop][~missing] = arr
+
+    def write_column(self, start, other, positions):
+        """
+            Write values of items at the given positions of another column
+            into items of this column starting at the given position.
+        """
+        self._allocate()
+        stop = start + len(positions)
+        missing = other.get_missing(positions)
+        if other._kind != self._kind:
+            values = other.get_values(positions).astype(object)
+            values[missing] = _MISSING
+            self.write(start, values.tolist())
+            return
+        values = other.get_stored_values(positions)
+        if self._kind == 'category':
+            # codes of missing values are not valid category codes
+            mapping = self._encode(other._categories)
+            values = np.where(missing, 0, values)
+            values = mapping[values] if len(mapping) > 0 else values
+        self._values[start:stop] = values
+        self._missing[start:stop] = missing
+
+    def permute(self, permutation):
+        """
+            Reorder the first len(permutation) items of the column, so that
+            the item at position idx is the item formerly at permutation[idx].
+        """
+        if self._constant is not _MISSING:
+            # all items have the same value
+            return
+        num_items = len(permutation)
+        self._values[:num_items] = self._values[:num_items][permutation]
+        self._missing[:num_items] = self._missing[:num_items][permutation]
+
+    # column access
+
+    def get_values(self, idx):
+        """
+            Get values of the selected items as a numpy array (an array of
+            objects for categorical columns), ignoring whether they are
+            missing or not.
+        """
+        if self._constant is not _MISSING:
+            # categorical and object columns both return arrays of objects
+            return self._constant_values(idx, self._constant, object)
+        values = self._values[idx]
+        if self._kind == 'category':
+            # codes of missing values are not valid category codes
+            present = ~self._missing[idx]
+            result = np.empty(len(values), dtype=object)
+            result[present] = self._decode(values[present])
+            return result
+        return values
+
+    def get_stored_values(self, idx):
+        """
+            Get values of the selected items as they are stored in the column
+            (i.e. codes into categories for categorical columns).
+        """
+        if self._constant is not _MISSING:
+            value = 0 if self._kind == 'category' else self._constant
+            return self._constant_values(idx, value, _KIND_DTYPES[self._kind])
+        return self._values[idx]
+
+    def get_missing(self, idx):
+        """
+            Get mask of selected items not containing the field.
+        """
+        if self._constant is not _MISSING:
+            return self._constant_values(idx, False, np.bool_)
+        return self._missing[idx]
+
+
 class MetadataHolder:
+    """
+        Holder of dataset item metadata stored as one typed column per field.
+
+        Metadata are added and retrieved as dicts of field name to value (one
+        dict per item), while individual fields can be accessed as arrays of
+        values through get_column.
+
+        The dicts are not stored in the holder, each access creates new ones
+        from the column values. Changing a retrieved dict thus does not change
+        the metadata in the holder.
+    """
+
+    MIN_CAPACITY = 16
+    GROWTH_FACTOR = 2
 
     def __init__(self):
-        self._metadata = []
-        self._metafields = set()
+        self._columns = {}
+        self._num_items = 0
+        self._capacity = 0
+
+    @classmethod
+    def from_columns(cls, columns, num_items):
+        """
+            Create a holder from existing columns, each containing values of
+            exactly num_items items.
+
+            Parameters
+            ----------
+            :param columns:     metadata columns by field name.
+            :type columns:      typing.Mapping[str, MetadataColumn]
+            :param num_items:   number of items in the columns.
+            :type num_items:    int
+        """
+        holder = cls()
+        for name, column in columns.items():
+            if column.capacity != num_items:
+                raise ValueError('Column {} contains {} items, expected {}'
+                                 .format(name, column.capacity, num_items))
+            holder._columns[name] = column
+        holder._num_items = holder._capacity = num_items
+        return holder
 
     def __len__(self):
-        return len(self._metadata)
+        return self._num_items
 
     def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self._get_rows([range(self._num_items)[idx]])[0]
+        return self._get_rows(self._get_positions(idx))
+
+    # private helpers
+
+    def _get_positions(self, idx):
         if idx is None:
-            return self._metadata
-        elif isinstance(idx, (slice, int)):
-            return self._metadata[idx]
-        elif isinstance(idx, collections.Sequence):
+            return np.arange(self._num_items)
+        elif isinstance(idx, slice):
+            return np.arange(self._num_items)[idx]
+        elif isinstance(idx, (collections.abc.Sequence, np.ndarray)):
             # range, list, tuple, etc
-            return [self._metadata[index] for index in idx]
+            positions = np.asarray(idx, dtype=np.intp).reshape(-1)
+            return np.arange(self._num_items)[positions]
         else:
             raise Exception('Unsupported index type: {}'.format(type(idx)))
 
+    def _get_rows(self, positions):
+        rows = [{} for idx in range(len(positions))]
+        for name, column in self._columns.items():
+            values = column.get_values(positions).tolist()
+            missing = column.get_missing(positions).tolist()
+            for row, value, is_missing in zip(rows, values, missing):
+                if not is_missing:
+                    row[name] = value
+        return rows
+
+    def _reserve(self, num_items):
+        # make room for num_items new items, returning the position of the
+        # first one
+        start = self._num_items
+        required = start + num_items
+        if required > self._capacity:
+            capacity = max(required, self.MIN_CAPACITY,
+                           self.GROWTH_FACTOR * self._capacity)
+            for column in self._columns.values():
+                column.resize(capacity, start)
+            self._capacity = capacity
+        return start
+
+    def _add_column(self, name, kind):
+        # new column, with the field missing in all current items
+        column = MetadataColumn(kind or 'category', capacity=self._capacity)
+        column.set_missing(0, self._num_items)
+        self._columns[name] = column
+        return column
+
+    def _write_values(self, values, num_rows):
+        # append num_rows items with the given values of each field
+        start = self._reserve(num_rows)
+        for name, column in self._columns.items():
+            if name not in values:
+                column.set_missing(start, start + num_rows)
+        for name, field_values in values.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._add_column(name, None)
+            column.write(start, field_values)
+        self._num_items += num_rows
+
     @property
     def metadata_fields(self):
         """
             Fields of dataset item-level metadata.
         """
-        return self._metafields
+        return set(self._columns.keys())
+
+    def get_metadata_column(self, name):
+        """
+            Get the column storing values of a metadata field. The column
+            may contain more values than there are items in the holder.
+        """
+        return self._columns[name]
+
+    def get_column(self, name, idx=None, missing_value=None):
+        """
+            Get values of a metadata field for the selected items as a numpy
+            array.
+
+            For categorical fields, an array of objects is returned. If the
+            field is missing in any of the selected items, the array is also
+            converted to an array of objects with missing_value substituted
+            in place of missing values.
+
+            Parameters
+            ----------
+            :param name:            name of the field.
+            :type name:             str
+            :param idx:             (optional) index or slice of items.
+            :type idx:              slice or typing.Sequence[int]
+            :param missing_value:   (optional) substitute for missing values.
+            :type missing_value:    any
+        """
+        column = self._columns[name]
+        positions = self._get_positions(idx)
+        values = column.get_values(positions)
+        missing = column.get_missing(positions)
+        if missing.any():
+            values = values.astype(object)
+            values[missing] = missing_value
+        return values
 
     def append(self, meta_dict):
         """
             Append new metadata item to the holder
         """
-        self._metafields = self._metafields.union(meta_dict.keys())
-        self._metadata.append(meta_dict)
+        self.extend([meta_dict])
 
     def extend(self, meta_dict_iterable):
         """
@@ -52,13 +503,80 @@ class MetadataHolder:
             :type meta_dict_iterable:    typing.Iterable[typing.Mapping[
                                             str, any]]
         """
-        self._metadata.extend(meta_dict_iterable)
-        self._metafields = extract_metafields(self._metadata)
+        rows = list(meta_dict_iterable)
+        num_rows = len(rows)
+        if num_rows == 0:
+            return
+        # gather values of each field in a single pass over the items
+        values = {}
+        for idx, row in enumerate(rows):
+            for name, value in row.items():
+                field_values = values.get(name)
+                if field_values is None:
+                    field_values = values[name] = [_MISSING] * num_rows
+                field_values[idx] = value
+        self._write_values(values, num_rows)
+
+    def extend_columns(self, columns):
+        """
+            Append batch of new metadata to the holder from columns of values
+            of each field, without creating per-item dicts.
+
+            Parameters
+            ----------
+            :param columns:     values of new items by field name, all of the
+                                same length.
+            :type columns:      typing.Mapping[str, typing.Sequence[any]]
+        """
+        values = {name: list(field_values)
+                  for name, field_values in columns.items()}
+        lengths = set(len(field_values) for field_values in values.values())
+        if len(lengths) > 1:
+            raise ValueError('Different number of values passed for '
+                             'different fields: {}'.format(lengths))
+        num_rows = lengths.pop() if lengths else 0
+        if num_rows == 0:
+            return
+        self._write_values(values, num_rows)
+
+    def extend_from(self, other_holder, idx=None):
+        """
+            Append metadata of selected items from another holder, copying the
+            column values directly without creating per-item dicts.
+
+            Parameters
+            ----------
+            :param other_holder:    the holder to copy metadata from.
+            :type other_holder:     dataset.metadata_utils.MetadataHolder
+            :param idx:             (optional) index or slice of items.
+            :type idx:              slice or typing.Sequence[int]
+        """
+        positions = other_holder._get_positions(idx)
+        num_rows = len(positions)
+        if num_rows == 0:
+            return
+        start = self._reserve(num_rows)
+        # fields missing in all of the selected items are not copied
+        other_columns = {name: column
+                         for name, column in other_holder._columns.items()
+                         if not column.get_missing(positions).all()}
+        for name, column in self._columns.items():
+            if name not in other_columns:
+                column.set_missing(start, start + num_rows)
+        for name, other_column in other_columns.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._add_column(name, other_column.kind)
+            column.write_column(start, other_column, positions)
+        self._num_items += num_rows
 
     def add_metafield(self, name, default_value=None):
         """
             Add a new metafield with optional default value to the holder.
 
+            The field value is set for all items in constant time, without
+            writing it into each item separately.
+
             Parameters
             ----------
             :param name:   name of the field
@@ -66,12 +584,13 @@ class MetadataHolder:
             :param default_value:  default value for the new metafield
             :type default_value:   any
         """
-        self._metafields = self._metafields.union([name])
-        for metadata in self._metadata:
-            metadata[name] = default_value
+        self._columns[name] = MetadataColumn.constant(
+            default_value, capacity=self._capacity)
 
-    def shuffle(self, shuffler):
+    def permute(self, permutation):
         """
-            Shuffle the contained metadata using the provided shuffler
+            Reorder held metadata, so that the item at position idx is the
+            item formerly at position permutation[idx].
         """
-        shuffler(self._metadata)
+        for column in self._columns.values():
+            column.permute(permutation)
@@ -1,12 +1,82 @@
-import collections
+import collections.abc
 
 import numpy as np
 
 import dataset.constants as cons
 
+# names of classification classes, indexed by the position of 1 in the one-hot
+# vector representing the class
+CLASS_NAMES = tuple(sorted(cons.CLASSIFICATION_TARGETS.keys(),
+                           key=lambda k: cons.CLASSIFICATION_TARGETS[k]
+                                         .index(1)))
+_CLASS_NAMES_ARRAY = np.array(CLASS_NAMES, dtype=object)
+
+
+def get_class_indices(targets):
+    """
+        Convert one-hot classification targets into class indexes.
+
+        Parameters
+        ----------
+        :param targets:     one-hot target or a sequence of them.
+        :type targets:      typing.Sequence[int] or numpy.ndarray
+    """
+    targets = np.asarray(targets)
+    if targets.size == 0:
+        return np.empty(targets.shape[:-1] or (0, ), dtype=np.uint8)
+    is_one_hot = (np.all((targets == 0) | (targets == 1), axis=-1) &
+                  (np.sum(targets, axis=-1) == 1))
+    if targets.shape[-1] != len(CLASS_NAMES) or not np.all(is_one_hot):
+        raise ValueError('Invalid classification targets: {}'.format(
+                         targets))
+    return np.argmax(targets, axis=-1).astype(np.uint8)
+
+
+def check_class_indices(class_indices):
+    """
+        Check that class indexes are valid, returning them as an array.
+
+        Parameters
+        ----------
+        :param class_indices:   sequence of class indexes.
+        :type class_indices:    typing.Sequence[int] or numpy.ndarray
+    """
+    class_indices = np.asarray(class_indices)
+    if class_indices.ndim != 1:
+        raise ValueError('Invalid class indexes: {}'.format(class_indices))
+    if class_indices.size == 0:
+        return class_indices.astype(np.uint8)
+    if (not np.issubdtype(class_indices.dtype, np.integer) or
+            class_indices.min() < 0 or
+            class_indices.max() >= len(CLASS_NAMES)):
+        raise ValueError('Invalid class indexes: {}'.format(class_indices))
+    return class_indices
+
+
+def get_one_hot_targets(class_indices):
+    """
+        Convert class indexes into one-hot classification targets.
+
+        Parameters
+        ----------
+        :param class_indices:   class index or a sequence of them.
+        :type class_indices:    int or numpy.ndarray
+    """
+    eye = np.eye(len(CLASS_NAMES), dtype=np.uint8)
+    return eye[np.asarray(class_indices, dtype=np.intp)]
+
+
 def get_target_name(target_value):
-    return [k for k, v in cons.CLASSIFICATION_TARGETS.items()
-            if np.array_equal(v, target_value)][0]
+    return CLASS_NAMES[int(get_class_indices(target_value))]
+
+
+def get_target_names(targets):
+    """
+        Get class names of a sequence of one-hot classification targets as
+        a numpy array of str.
+    """
+    return _CLASS_NAMES_ARRAY[get_class_indices(targets)]
+
 
 def get_target_probabilities(raw_output, precision=4):
     probs = {}
@@ -14,16 +84,27 @@ def get_target_probabilities(raw_output, precision=4):
     probs['noise'] = round(raw_output[1], precision)
     return probs
 
+
 class TargetsHolder():
+    """
+        Holder of dataset item targets.
+
+        Classification targets are stored as an array of uint8 class indexes
+        and converted to one-hot vectors only when they are retrieved.
+    """
+
+    MIN_CAPACITY = 16
+    GROWTH_FACTOR = 2
 
     def __init__(self, target_types={'classification': True}):
         self._num_targets = 0
+        self._capacity = 0
         self._target_types = target_types
         targets = dict.fromkeys(cons.TARGET_TYPES)
         used_types = {}
         for target_type in target_types:
             if target_type:
-                targets[target_type] = []
+                targets[target_type] = np.empty(0, dtype=np.uint8)
                 used_types[target_type] = True
         self._targets = targets
         self._used_types = used_types
@@ -33,37 +114,98 @@ class TargetsHolder():
 
     def _get_indexes_sequence(self, indexing_obj):
         if indexing_obj is None:
-            return range(self._num_targets)
-        elif isinstance(indexing_obj, slice):
-            return range(self._num_targets)[indexing_obj]
-        elif isinstance(indexing_obj, collections.Sequence):
-            # range, list, tuple, etc
+            return slice(None)
+        elif isinstance(indexing_obj, (slice, int, np.integer)):
             return indexing_obj
+        elif isinstance(indexing_obj, (collections.abc.Sequence,
+                                       np.ndarray)):
+            # range, list, tuple, etc
+            return np.asarray(indexing_obj, dtype=np.intp)
+        else:
+            raise Exception('Unsupported index type: {}'.format(
+                            type(indexing_obj)))
+
+    def _get_class_indices(self, ttype, indexing_obj=None):
+        index = self._get_indexes_sequence(indexing_obj)
+        return self._targets[ttype][:self._num_targets][index]
+
+    def _reserve(self, num_targets):
+        # make room for num_targets new targets, returning the position of the
+        # first one
+        start = self._num_targets
+        required = start + num_targets
+        if required > self._capacity:
+            capacity = max(required, self.MIN_CAPACITY,
+                           self.GROWTH_FACTOR * self._capacity)
+            for ttype in self._used_types.keys():
+                targets = np.empty(capacity, dtype=np.uint8)
+                targets[:start] = self._targets[ttype][:start]
+                self._targets[ttype] = targets
+            self._capacity = capacity
+        return start
 
     def append(self, targets_dict):
+        start = self._reserve(1)
         for ttype in self._used_types.keys():
-            self._targets[ttype].append(targets_dict[ttype])
+            self._targets[ttype][start] = get_class_indices(
+                targets_dict[ttype])
         self._num_targets += 1
 
     def extend(self, targets_iterable_dict):
+        num_classes = len(CLASS_NAMES)
+        indices = {ttype: get_class_indices(np.reshape(
+                        targets_iterable_dict[ttype], (-1, num_classes)))
+                   for ttype in self._used_types.keys()}
+        num_targets = len(next(iter(indices.values())))
+        start = self._reserve(num_targets)
+        for ttype, ttype_indices in indices.items():
+            self._targets[ttype][start:start + num_targets] = ttype_indices
+        self._num_targets += num_targets
+
+    def extend_class_indices(self, class_indices_dict):
+        """
+            Append batch of new targets given as class indexes instead of
+            one-hot vectors.
+
+            Parameters
+            ----------
+            :param class_indices_dict:  class indexes of new targets by
+                                        target type.
+            :type class_indices_dict:   typing.Mapping[str,
+                                            typing.Sequence[int]]
+        """
+        indices = {ttype: check_class_indices(class_indices_dict[ttype])
+                   for ttype in self._used_types.keys()}
+        num_targets = len(next(iter(indices.values())))
+        start = self._reserve(num_targets)
+        for ttype, ttype_indices in indices.items():
+            self._targets[ttype][start:start + num_targets] = ttype_indices
+        self._num_targets += num_targets
+
+    def permute(self, permutation):
+        """
+            Reorder held targets, so that the target at position idx is the
+            target formerly at position permutation[idx].
+        """
         for ttype in self._used_types.keys():
-            self._targets[ttype].extend(targets_iterable_dict[ttype])
-        self._num_targets = len(next(iter(self._targets.values())))
+            targets = self._targets[ttype][:self._num_targets]
+            targets[:] = targets[permutation]
 
-    def shuffle(self, shuffler, shuffler_state_resetter):
-        for target_type, target in self._targets.items():
-            shuffler(target)
-            shuffler_state_resetter()
+    def get_class_indices(self, targets_slice_or_idx=None,
+                          target_type='classification'):
+        """
+            Get class indexes of the selected targets without converting them
+            to one-hot vectors.
+        """
+        return self._get_class_indices(target_type, targets_slice_or_idx)
 
     def get_targets_as_arraylike(self, targets_slice_or_idx=None):
-        idxs = self._get_indexes_sequence(targets_slice_or_idx)
-        targets = self._targets
-        return tuple([targets[ttype][idx] for idx in idxs]
+        return tuple(get_one_hot_targets(
+                        self._get_class_indices(ttype, targets_slice_or_idx))
                      for ttype in cons.TARGET_TYPES
                      if self._target_types[ttype])
 
     def get_targets_as_dict(self, targets_slice_or_idx=None):
-        idxs = self._get_indexes_sequence(targets_slice_or_idx)
-        targets = self._targets
-        return {ttype: [targets[ttype][idx] for idx in idxs]
+        return {ttype: get_one_hot_targets(
+                    self._get_class_indices(ttype, targets_slice_or_idx))
                 for ttype in cons.TARGET_TYPES if self._target_types[ttype]}
@@ -1,3 +1,7 @@
+import itertools
+
+import numpy as np
+
 import dataset.tck.constants as c
 
 
@@ -10,10 +14,14 @@ def get_event_transformer(name, packet_extraction_fn, **kwargs):
         before = kwargs.get('num_gtu_before')
         after = kwargs.get('num_gtu_after')
         adjust = kwargs.get('adjust_if_out_of_bounds', True)
+        window_fn = kwargs.get('window_extraction_fn', None)
+        packet_size = kwargs.get('packet_size', None)
         return GtuInPacketEventTransformer(packet_extraction_fn,
                                            num_gtu_before=before,
                                            num_gtu_after=after,
-                                           adjust_if_out_of_bounds=adjust)
+                                           adjust_if_out_of_bounds=adjust,
+                                           window_extraction_fn=window_fn,
+                                           packet_size=packet_size)
     elif transformer == 'ALLPACK':
         start, stop = kwargs['start_gtu'], kwargs['stop_gtu']
         return AllPacketsEventTransformer(packet_extraction_fn, start, stop)
@@ -77,12 +85,37 @@ class AllPacketsEventTransformer:
 
 
 class GtuInPacketEventTransformer:
+    """
+        Transformer of events to windows of frames around their gtu in
+        packet.
+
+        If window_extraction_fn is set, it is used to extract just the
+        frames of windows of packets, called with the source file and arrays
+        of packet indexes and start and stop gtus of the windows, e.g. to
+        read them directly from the source file (see dataset.tck.io_utils.
+        PacketWindowExtractor.extract_windows). It must return the windows
+        as a single array. The number of frames in a packet must then be
+        given as packet_size.
+
+        Consecutive events of the same source file are processed as a
+        batch, with all of their windows gathered into a single array (see
+        extract_windows), so grouping events by source file (see
+        dataset.tck.scheduling) makes processing more efficient.
+    """
 
     REQUIRED_FILELIST_COLUMNS = (c.SRCFILE_KEY, 'packet_id', 'gtu_in_packet')
+    # maximal number of events processed together
+    MAX_BATCH_SIZE = 1024
 
     def __init__(self, packets_extraction_fn, adjust_if_out_of_bounds=True,
-                 num_gtu_before=None, num_gtu_after=None):
+                 num_gtu_before=None, num_gtu_after=None,
+                 window_extraction_fn=None, packet_size=None):
+        if window_extraction_fn is not None and packet_size is None:
+            raise ValueError('Packet size is required to extract windows of '
+                             'packets')
         self._extraction_fn = packets_extraction_fn
+        self._window_extraction_fn = window_extraction_fn
+        self._packet_size = packet_size
         self._gtu_before = num_gtu_before or 4
         self._gtu_after = num_gtu_after or 15
         self._gtu_after = self._gtu_after + 1
@@ -92,28 +125,77 @@ class GtuInPacketEventTransformer:
     def num_frames(self):
         return self._gtu_after + self._gtu_before
 
+    def _get_windows(self, events, packet_size):
+        # get packet indexes and frame windows of events, shifting windows
+        # which are out of packet bounds if allowed
+        num_events = len(events)
+        packet_ids = np.fromiter((int(e['packet_id']) for e in events),
+                                 dtype=np.intp, count=num_events)
+        gtus = np.fromiter((int(e['gtu_in_packet']) for e in events),
+                           dtype=np.intp, count=num_events)
+        starts = gtus - self._gtu_before
+        stops = gtus + self._gtu_after
+        out_of_bounds = (starts < 0) | (stops > packet_size)
+        if not self._adjust and out_of_bounds.any():
+            pos = int(np.argmax(out_of_bounds))
+            event = events[pos]
+            idx = event.get('event_id', event[c.SRCFILE_KEY])
+            raise Exception('Frame range for event id {} ({}:{}) is out of'
+                            ' packet bounds'.format(idx, starts[pos],
+                                                    stops[pos]))
+        starts = np.minimum(np.maximum(starts, 0),
+                            packet_size - self.num_frames)
+        if len(starts) > 0 and starts.min() < 0:
+            raise Exception('Cannot correctly adjust frame window')
+        return packet_ids, starts, starts + self.num_frames
+
+    def extract_windows(self, srcfile, events):
+        """
+            Extract frame windows of events of the same source file into a
+            single array of shape (num_events, num_frames, height, width).
+
+            Returns the array along with packet indexes and start and stop
+            gtus of the windows.
+        """
+        if self._window_extraction_fn is None:
+            packets = self._extraction_fn(srcfile)
+            packet_ids, starts, stops = self._get_windows(events,
+                                                          packets.shape[1])
+            # gather all windows with a single fancy indexing operation
+            frame_idx = starts[:, None] + np.arange(self.num_frames)
+            windows = packets[packet_ids[:, None], frame_idx]
+        else:
+            packet_ids, starts, stops = self._get_windows(events,
+                                                          self._packet_size)
+            windows = self._window_extraction_fn(srcfile, packet_ids, starts,
+                                                 stops)
+        return windows, packet_ids, starts, stops
+
+    def process_event_batches(self, events):
+        """
+            Process batches of consecutive events of the same source file,
+            returned as a generator of (windows, items) tuples, with frame
+            windows of all events of a batch in a single array (see
+            extract_windows) and a list of the attributes of the window of
+            every event (as returned by process_events, except for the
+            window itself).
+        """
+        for srcfile, file_events in itertools.groupby(
+                events, key=lambda event: event[c.SRCFILE_KEY]):
+            while True:
+                batch = list(itertools.islice(file_events,
+                                              self.MAX_BATCH_SIZE))
+                if not batch:
+                    break
+                windows, packet_ids, starts, stops = self.extract_windows(
+                    srcfile, batch)
+                items = [{'packet_id': int(idx), 'start_gtu': int(start),
+                          'end_gtu': int(stop), 'event_meta': event}
+                         for event, idx, start, stop in zip(
+                            batch, packet_ids, starts, stops)]
+                yield windows, items
+
     def process_events(self, events):
-        packets_extraction_fn = self._extraction_fn
-        for event in events:
-            idx, gtu = int(event['packet_id']), int(event['gtu_in_packet'])
-            srcfile = event[c.SRCFILE_KEY]
-            packet = packets_extraction_fn(srcfile)[idx]
-            start = gtu - self._gtu_before
-            stop = gtu + self._gtu_after
-            if (start < 0 or stop > packet.shape[0]) and not self._adjust:
-                idx = event.get('event_id', srcfile)
-                raise Exception('Frame range for event id {} ({}:{}) is out of'
-                                ' packet bounds'.format(idx, start, stop))
-            else:
-                # TODO: this is not optimal
-                while start < 0:
-                    start += 1
-                    stop += 1
-                while stop > packet.shape[0]:
-                    start -= 1
-                    stop -= 1
-            if start < 0:
-                raise Exception('Cannot correctly adjust frame window')
-            result = {'packet': packet[start:stop], 'packet_id': idx,
-                      'start_gtu': start, 'end_gtu': stop, 'event_meta': event}
-            yield [result, ]
+        for windows, items in self.process_event_batches(events):
+            for window, item in zip(windows, items):
+                yield [{'packet': window, **item}]
@@ -1,10 +1,40 @@
 import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
 
 import numpy as np
 
 import libs.event_reading as reading
 import utils.data_templates as templates
 
+# ROOT keeps global state of open files and is not safe to use from multiple
+# threads at once (e.g. by the thread of a PacketPrefetcher and the main
+# thread loading packets of another file directly), so any access to it is
+# serialized through this lock
+_ROOT_LOCK = threading.Lock()
+
+# helper functions
+
+
+def _get_window_length(starts, stops):
+    # number of frames of windows start:stop, which must all be of the same
+    # length to be gathered into a single array
+    lengths = np.unique(stops - starts)
+    if len(lengths) > 1:
+        raise ValueError('Windows of different lengths: {}'.format(lengths))
+    return int(lengths[0]) if len(lengths) > 0 else 0
+
+
+def _get_resident_nbytes(packets):
+    # memory-mapped packets are only read into the page cache on access and
+    # do not count towards memory budgets
+    return 0 if isinstance(packets, np.memmap) else packets.nbytes
+
+
 # classes
 
 
@@ -41,31 +71,69 @@ class PacketExtractor:
 
     def extract_packets_from_rootfile(self, acqfile, triggerfile=None):
         reader = reading.AcqL1EventReader(acqfile, triggerfile)
-        iterator = reader.iter_gtu_pdm_data()
-        first_frame = next(iterator).photon_count_data
-        # NOTE: ROOT file iterator returns packet frames of shape
-        # (1, 1, height, width)
-        frame_shape = first_frame.shape[2:4]
+        # NOTE: ROOT file reader returns frames of shape
+        # (num_frames, 1, 1, height, width)
+        gtus, frames = reader.read_photon_count_data()
+        frame_shape = frames.shape[3:5]
         frames_total = reader.tevent_entries
 
         self._check_packet_against_template(frame_shape, frames_total, acqfile)
 
-        num_frames = self._template.num_frames
-        num_packets = int(frames_total / num_frames)
-        container_shape = (num_packets, *self._template.packet_shape)
-        dtype = first_frame.dtype
-        packets = np.empty(container_shape, dtype=dtype)
-        # reset iterator to start of packets list
-        iterator = reader.iter_gtu_pdm_data()
-        for frame in iterator:
-            global_gtu = frame.gtu
-            packet_idx = int(global_gtu / num_frames)
-            packet_gtu = global_gtu % num_frames
-            packets[packet_idx][packet_gtu] = frame.photon_count_data
-        return packets
+        frames = frames.reshape(frames_total, *frame_shape)
+        # put frames in order of their global gtu, if they are not already
+        if not np.array_equal(gtus, np.arange(frames_total)):
+            ordered_frames = np.empty_like(frames)
+            ordered_frames[gtus] = frames
+            frames = ordered_frames
+        num_packets = int(frames_total / self._template.num_frames)
+        return frames.reshape(num_packets, *self._template.packet_shape)
+
+    def extract_frames_from_rootfile(self, acqfile, packet_idx, start_gtu,
+                                     stop_gtu, triggerfile=None):
+        """
+            Extract frames start_gtu:stop_gtu of a packet of a ROOT file,
+            reading only their entries from the file (see
+            extract_windows_from_rootfile).
+        """
+        return self.extract_windows_from_rootfile(
+            acqfile, [packet_idx], [start_gtu], [stop_gtu], triggerfile)[0]
+
+    def extract_windows_from_rootfile(self, acqfile, packet_ids, starts,
+                                      stops, triggerfile=None):
+        """
+            Extract windows of frames starts[idx]:stops[idx] of packets
+            packet_ids[idx] of a ROOT file into a single array of shape
+            (num_windows, num_frames, height, width).
+
+            The file is opened once and only entries of the windows are read
+            from it (see libs.event_reading.AcqL1EventReader.
+            read_gtu_windows). All windows must be of the same length.
+        """
+        packet_ids, starts, stops = (np.asarray(arr, dtype=np.intp)
+                                     for arr in (packet_ids, starts, stops))
+        num_frames = _get_window_length(starts, stops)
+        offsets = packet_ids * self._template.num_frames
+        with reading.AcqL1EventReader(acqfile, triggerfile) as reader:
+            gtus, frames, counts = reader.read_gtu_windows(offsets + starts,
+                                                           offsets + stops)
+            frames_total = reader.tevent_entries
+        # NOTE: ROOT file reader returns frames of shape
+        # (num_frames, 1, 1, height, width)
+        frame_shape = frames.shape[3:5]
+        self._check_packet_against_template(frame_shape, frames_total,
+                                            acqfile)
+        incomplete = counts != num_frames
+        if incomplete.any():
+            pos = int(np.argmax(incomplete))
+            raise ValueError(('Frames {}:{} of packet {} were not found in {}'
+                              ).format(starts[pos], stops[pos],
+                                       packet_ids[pos], acqfile))
+        return frames.reshape(len(packet_ids), num_frames, *frame_shape)
 
     def extract_packets_from_npyfile(self, npyfile, triggerfile=None):
-        ndarray = np.load(npyfile)
+        # packets are memory-mapped read-only, so that only frames actually
+        # sliced from them are read from the file
+        ndarray = np.load(npyfile, mmap_mode='r')
         frame_shape  = ndarray.shape[1:]
         frames_total = len(ndarray)
 
@@ -75,36 +143,414 @@ class PacketExtractor:
         return ndarray.reshape(num_packets, *self._template.packet_shape)
 
 
+class PacketWindowExtractor:
+    """
+        Extractor of windows of frames of packets from source files.
+
+        Windows of ROOT files are read directly from the file, using an
+        index of its entries cached next to it (see PacketExtractor.
+        extract_windows_from_rootfile), which is much faster than extracting
+        all packets of the file when only a few windows of it are needed.
+        Windows of other files are sliced from packets returned by
+        packet_extraction_fn.
+
+        Windows are best extracted in batches of windows of the same file
+        through extract_windows, so that the file is only opened once.
+    """
+
+    def __init__(self, packet_extraction_fn, packet_extractor):
+        self._extraction_fn = packet_extraction_fn
+        self._extractor = packet_extractor
+
+    def extract(self, filename, packet_idx, start_gtu, stop_gtu):
+        return self.extract_windows(filename, [packet_idx], [start_gtu],
+                                    [stop_gtu])[0]
+
+    def extract_windows(self, filename, packet_ids, starts, stops):
+        """
+            Extract windows of frames starts[idx]:stops[idx] of packets
+            packet_ids[idx] of a source file into a single array of shape
+            (num_windows, num_frames, height, width).
+        """
+        if filename.endswith('.root'):
+            with _ROOT_LOCK:
+                return self._extractor.extract_windows_from_rootfile(
+                    filename, packet_ids, starts, stops)
+        packet_ids, starts, stops = (np.asarray(arr, dtype=np.intp)
+                                     for arr in (packet_ids, starts, stops))
+        num_frames = _get_window_length(starts, stops)
+        packets = self._extraction_fn(filename)
+        # gather all windows with a single fancy indexing operation
+        frame_idx = starts[:, None] + np.arange(num_frames)
+        return packets[packet_ids[:, None], frame_idx]
+
+
+class PacketDiskCache:
+    """
+        Cache of packets extracted from source files, stored as npy files in
+        a directory so that they can be reused by later or concurrently
+        running processes.
+
+        Cached packets are keyed by the absolute path, modification time and
+        size of their source file and by the packet template they were
+        extracted with, so changing any of them leads to a cache miss. Cache
+        hits are memory-mapped read-only instead of being read into memory,
+        with the page cache shared by all processes using them.
+    """
+
+    def __init__(self, cache_dir, packet_template):
+        if not os.path.isdir(cache_dir):
+            raise IOError('Invalid cache directory: {}'.format(cache_dir))
+        self._cache_dir = cache_dir
+        self._template = sorted(vars(packet_template).items())
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    def get_cache_filename(self, filename):
+        """
+            Get the name of the npy file which (would) contain the cached
+            packets of a source file.
+        """
+        stat = os.stat(filename)
+        key = [os.path.abspath(filename), stat.st_mtime_ns, stat.st_size,
+               self._template]
+        key = hashlib.sha256(json.dumps(key).encode('UTF-8')).hexdigest()
+        return os.path.join(self._cache_dir, '{}.npy'.format(key))
+
+    def load(self, filename):
+        """
+            Get the cached packets of a source file memory-mapped read-only,
+            or None if they are not cached.
+        """
+        try:
+            return np.load(self.get_cache_filename(filename), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+
+    def store(self, filename, packets):
+        """
+            Store packets extracted from a source file, returning them
+            memory-mapped from the cache file.
+        """
+        cache_filename = self.get_cache_filename(filename)
+        # write into a temporary file first, so that other processes never
+        # see a partially written cache file
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tmp',
+                                            dir=self._cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmpfile:
+                np.save(tmpfile, packets)
+            os.replace(tmp_filename, cache_filename)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        return np.load(cache_filename, mmap_mode='r')
+
+
 class PacketCache:
+    """
+        Least-recently-used cache of packets extracted from source files.
+
+        The cache holds at most max_size files and, if max_bytes is set, at
+        most max_bytes of packet data (as given by ndarray.nbytes). When
+        either limit would be exceeded by newly extracted packets, the least
+        recently accessed files are evicted until they fit. Packets larger
+        than max_bytes on their own are returned without being cached.
+
+        Memory-mapped packets (e.g. those of npy files) take up no memory
+        until accessed and do not count towards max_bytes.
+
+        If disk_cache (a PacketDiskCache) is set, packets of ROOT files not
+        held in memory are looked up there before being extracted, with
+        newly extracted packets being stored in it. This way, every ROOT
+        file only needs to be decoded once across runs.
+
+        Counters of cache hits, misses, evictions, bytes of extracted packets
+        and time spent extracting them are available through stats, along
+        with the number of packets found in the disk cache.
+    """
+
+    # types of files with packets kept in the disk cache
+    DISK_CACHED_TYPES = ('ROOT', )
 
-    def __init__(self, max_size, packet_extractors, num_evict_on_full=10):
-        if max_size < num_evict_on_full:
-            raise ValueError('Number of evicted items must be less than the '
-                             'cache size')
+    def __init__(self, max_size, packet_extractors, max_bytes=None,
+                 disk_cache=None):
+        if max_size is not None and max_size < 1:
+            raise ValueError('Invalid cache size: {}'.format(max_size))
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('Invalid cache memory budget: {}'.format(
+                             max_bytes))
         self._maxsize = max_size
+        self._maxbytes = max_bytes
         self._extractors = {}
         for key in ('NPY', 'ROOT'):
             self._extractors[key] = packet_extractors[key]
-        self._num_evict = num_evict_on_full
-        self._packets = {}
-        self._file_queue = collections.deque([], max_size)
+        self._disk_cache = disk_cache
+        self._packets = collections.OrderedDict()
+        self._nbytes = 0
+        self._hits = self._misses = self._evictions = 0
+        self._disk_hits = 0
+        self._bytes_loaded = 0
+        self._load_time = 0.0
+        # extraction counters may be updated from a prefetching thread
+        self._stats_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._packets)
+
+    def __contains__(self, filename):
+        return filename in self._packets
+
+    # helper methods
+
+    def _get_file_type(self, filename):
+        if filename.endswith('.npy'):
+            return 'NPY'
+        elif filename.endswith('.root'):
+            return 'ROOT'
+        else:
+            raise Exception('Unknown file type: {}'.format(filename))
+
+    def _load(self, filename):
+        # extract packets of a file (or get them from the disk cache)
+        file_type = self._get_file_type(filename)
+        disk_cache = self._disk_cache
+        use_disk_cache = (disk_cache is not None and
+                          file_type in self.DISK_CACHED_TYPES)
+        if use_disk_cache:
+            packets = disk_cache.load(filename)
+            if packets is not None:
+                with self._stats_lock:
+                    self._disk_hits += 1
+                return packets
+        start = time.perf_counter()
+        if file_type == 'ROOT':
+            with _ROOT_LOCK:
+                packets = self._extractors[file_type](filename)
+        else:
+            packets = self._extractors[file_type](filename)
+        with self._stats_lock:
+            self._load_time += time.perf_counter() - start
+            self._bytes_loaded += packets.nbytes
+        if use_disk_cache:
+            packets = disk_cache.store(filename, packets)
+        return packets
+
+    def _is_full(self, nbytes):
+        # check if packets of nbytes do not fit into the cache
+        if self._maxsize is not None and len(self._packets) >= self._maxsize:
+            return True
+        return (self._maxbytes is not None and
+                self._nbytes + nbytes > self._maxbytes)
+
+    def _add(self, filename, packets):
+        nbytes = _get_resident_nbytes(packets)
+        if self._maxbytes is not None and nbytes > self._maxbytes:
+            return
+        all_packets = self._packets
+        while all_packets and self._is_full(nbytes):
+            evicted = all_packets.popitem(last=False)[1]
+            self._nbytes -= _get_resident_nbytes(evicted)
+            self._evictions += 1
+        all_packets[filename] = packets
+        self._nbytes += nbytes
+
+    # properties
+
+    @property
+    def nbytes(self):
+        """Total size of cached packets which are not memory-mapped."""
+        return self._nbytes
+
+    @property
+    def stats(self):
+        """
+            Cache usage counters as a dict with the number of hits, misses
+            and evictions, bytes of extracted packets ('bytes_loaded'), time
+            in seconds spent extracting them ('load_time') and the number of
+            packets found in the disk cache ('disk_hits').
+        """
+        return {'hits': self._hits, 'misses': self._misses,
+                'evictions': self._evictions,
+                'bytes_loaded': self._bytes_loaded,
+                'load_time': self._load_time, 'disk_hits': self._disk_hits}
 
     def get(self, filename):
-        all_packets, queue = self._packets, self._file_queue
+        all_packets = self._packets
         packets = all_packets.get(filename, None)
-        if packets is None:
-            extractors = self._extractors
-            if filename.endswith('.npy'):
-                extractor = extractors['NPY']
-            elif filename.endswith('.root'):
-                extractor = extractors['ROOT']
-            else:
-                raise Exception('Unknown file type: {}'.format(filename))
-            packets = extractor(filename)
-            all_packets[filename] = packets
-            queue.append(filename)
-            if len(queue) == self._maxsize:
-                for idx in range(self._num_evict):
-                    filename = queue.popleft()
-                    all_packets.pop(filename)
+        if packets is not None:
+            all_packets.move_to_end(filename)
+            self._hits += 1
+            return packets
+        self._misses += 1
+        packets = self._load(filename)
+        self._add(filename, packets)
+        return packets
+
+    def extract(self, filename):
+        """
+            Extract packets of a file (or get them from the disk cache)
+            without adding them to the cache, e.g. to load them ahead of
+            time on a background thread.
+        """
+        return self._load(filename)
+
+    def add(self, filename, packets):
+        """
+            Add packets extracted by extract to the cache, counted as a cache
+            miss.
+        """
+        self._misses += 1
+        self._add(filename, packets)
+
+
+class PacketPrefetcher:
+    """
+        Loader of packets of source files ahead of their use into a packet
+        cache on a background thread, so that reading and decoding of the
+        next files overlaps with processing of the current one.
+
+        After start is called with source files in the order they are going
+        to be used, the background thread extracts packets of at most depth
+        files following the one last requested through get, as long as the
+        extracted but not yet requested packets take up less than max_bytes
+        of memory. Files requested out of this order are loaded directly
+        into the cache as usual, so prefetching works best with events
+        grouped by source file (see dataset.tck.scheduling).
+
+        Time spent waiting for packets which were not yet extracted is
+        available through stats, along with the number of prefetched files
+        ('prefetched') and the number of files loaded directly ('direct').
+    """
+
+    def __init__(self, cache, depth=2, max_bytes=None):
+        if depth < 1:
+            raise ValueError('Invalid prefetch depth: {}'.format(depth))
+        self._cache = cache
+        self._depth = depth
+        self._maxbytes = max_bytes
+        self._cond = threading.Condition()
+        self._thread = None
+        self._filenames, self._positions = [], {}
+        # prefetched packets (or extraction errors) which were not requested
+        self._loaded = {}
+        self._nbytes = 0
+        # position of the last requested file and number of files handled by
+        # the background thread
+        self._next_pos = self._num_handled = 0
+        self._closed = False
+        self._wait_time = 0.0
+        self._num_prefetched = self._num_direct = 0
+
+    # helper methods
+
+    def _can_load(self, pos):
+        if self._closed:
+            return True
+        if pos > self._next_pos + self._depth:
+            return False
+        return (self._maxbytes is None or not self._loaded or
+                self._nbytes < self._maxbytes)
+
+    def _run(self):
+        cache, cond = self._cache, self._cond
+        for pos, filename in enumerate(self._filenames):
+            with cond:
+                cond.wait_for(lambda: self._can_load(pos))
+                if self._closed:
+                    return
+                skip = pos < self._next_pos or filename in cache
+            if not skip:
+                try:
+                    packets = cache.extract(filename)
+                    loaded = (packets, _get_resident_nbytes(packets))
+                except Exception as error:
+                    loaded = (error, 0)
+            with cond:
+                if not skip:
+                    self._loaded[filename] = loaded
+                    self._nbytes += loaded[1]
+                self._num_handled = pos + 1
+                cond.notify_all()
+
+    def _drop(self, filename):
+        packets, nbytes = self._loaded.pop(filename)
+        self._nbytes -= nbytes
+        return packets
+
+    # properties
+
+    @property
+    def stats(self):
+        """
+            Prefetching counters as a dict with the time in seconds spent
+            waiting for packets ('wait_time') and the numbers of prefetched
+            ('prefetched') and directly loaded ('direct') files.
+        """
+        return {'wait_time': self._wait_time,
+                'prefetched': self._num_prefetched,
+                'direct': self._num_direct}
+
+    def start(self, filenames):
+        """
+            Start prefetching packets of source files in the given order,
+            with repeated files being prefetched only once.
+        """
+        if self._thread is not None:
+            raise Exception('Prefetching has already been started')
+        self._filenames = list(dict.fromkeys(filenames))
+        self._positions = {filename: pos
+                           for pos, filename in enumerate(self._filenames)}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+            Stop prefetching and drop all prefetched packets.
+        """
+        with self._cond:
+            self._closed = True
+            self._loaded.clear()
+            self._nbytes = 0
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get(self, filename):
+        """
+            Get packets of a source file, waiting for them to be prefetched
+            if they are among the next files to be used. Packets are added
+            to the packet cache as if they were extracted by its get method.
+        """
+        cache = self._cache
+        pos = self._positions.get(filename, None)
+        if (filename in cache or pos is None or pos < self._next_pos or
+                self._closed):
+            if filename not in cache:
+                self._num_direct += 1
+            return cache.get(filename)
+        with self._cond:
+            # files before the requested one are not going to be requested
+            for skipped in self._filenames[self._next_pos:pos]:
+                if skipped in self._loaded:
+                    self._drop(skipped)
+            self._next_pos = pos
+            self._cond.notify_all()
+            start = time.perf_counter()
+            self._cond.wait_for(lambda: filename in self._loaded or
+                                self._num_handled > pos)
+            self._wait_time += time.perf_counter() - start
+            if filename not in self._loaded:
+                # the file was not prefetched as it was still in the cache
+                if filename not in cache:
+                    self._num_direct += 1
+                return cache.get(filename)
+            packets = self._drop(filename)
+            self._cond.notify_all()
+        if isinstance(packets, Exception):
+            raise packets
+        self._num_prefetched += 1
+        cache.add(filename, packets)
         return packets
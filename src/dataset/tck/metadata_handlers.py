@@ -13,6 +13,24 @@ class MetadataCreator:
     def extra_metafields(self):
         return self._extra
 
+    def create_metadata(self, event):
+        """
+        Create metadata of a packet created by the event transformer classes
+        from its attributes (packet_id, start_gtu, end_gtu and event_meta).
+
+        :param event: attributes of the packet
+        :type event: dict
+        :returns: dict
+        """
+        metafields = self._extra.union(self.MANDATORY_EVENT_META)
+        return {
+            "packet_id": event["packet_id"],
+            "start_gtu": event["start_gtu"],
+            "end_gtu": event["end_gtu"],
+            **{fieldname: event['event_meta'][fieldname]
+               for fieldname in metafields}
+        }
+
     def process_events(self, events):
         """
         Add metadata to events created by the event transformer classes.
@@ -32,17 +50,10 @@ class MetadataCreator:
         :type events: iterable of dict
         :returns: generator of tuple
         """
-        metafields = self._extra.union(self.MANDATORY_EVENT_META)
         for events_list in events:
             yield [(
                 # packet extracted in the previous step
                 event['packet'],
                 # metadata to include in created dataset
-                {
-                    "packet_id": event["packet_id"],
-                    "start_gtu": event["start_gtu"],
-                    "end_gtu": event["end_gtu"],
-                    **{fieldname: event['event_meta'][fieldname]
-                       for fieldname in metafields}
-                }
+                self.create_metadata(event)
             ) for event in events_list]
@@ -0,0 +1,84 @@
+import collections
+import itertools
+
+import numpy as np
+
+import dataset.tck.constants as c
+
+# metadata field with the index of the filelist row an item was created from,
+# recorded when rows are not processed in filelist order
+FILELIST_ROW_KEY = 'filelist_row'
+
+
+def group_by_source_file(events, srcfile_key=c.SRCFILE_KEY):
+    """
+        Reorder events so that all events of the same source file follow
+        each other, making it possible to extract every file only once.
+
+        Source files are ordered by their first event and events of the same
+        file keep their relative order. Besides the reordered events, the
+        indexes of the events in the original order are returned.
+
+        Parameters
+        ----------
+        :param events:      events (filelist rows) to reorder.
+        :type events:       typing.Sequence[typing.Mapping[str, typing.Any]]
+        :param srcfile_key: (optional) name of the source file field.
+        :type srcfile_key:  str
+    """
+    groups = {}
+    for idx, event in enumerate(events):
+        groups.setdefault(event[srcfile_key], []).append(idx)
+    order = np.fromiter(itertools.chain.from_iterable(groups.values()),
+                        dtype=np.intp, count=len(events))
+    return [events[idx] for idx in order], order
+
+
+def count_file_loads(events, cache_size=None, srcfile_key=c.SRCFILE_KEY):
+    """
+        Count how many times source files would be loaded when processing
+        events in their order, with extracted files being held in a least
+        recently used cache of (at most) cache_size files.
+
+        Parameters
+        ----------
+        :param events:      events (filelist rows) in the order of processing.
+        :type events:       typing.Iterable[typing.Mapping[str, typing.Any]]
+        :param cache_size:  (optional) maximal number of cached files, by
+                            default unlimited.
+        :type cache_size:   int
+        :param srcfile_key: (optional) name of the source file field.
+        :type srcfile_key:  str
+    """
+    cache = collections.OrderedDict()
+    num_loads = 0
+    for event in events:
+        srcfile = event[srcfile_key]
+        if srcfile in cache:
+            cache.move_to_end(srcfile)
+            continue
+        num_loads += 1
+        if cache_size is not None and len(cache) >= cache_size:
+            cache.popitem(last=False)
+        cache[srcfile] = True
+    return num_loads
+
+
+def get_items_permutation(order, num_event_items):
+    """
+        Get the permutation of items created from reordered events which
+        restores the original order of events (see group_by_source_file),
+        e.g. to be passed to dataset.dataset_utils.NumpyDataset.permute.
+
+        Parameters
+        ----------
+        :param order:           indexes of the reordered events in the
+                                original order.
+        :type order:            typing.Sequence[int]
+        :param num_event_items: number of items created from each of the
+                                reordered events.
+        :type num_event_items:  typing.Sequence[int]
+    """
+    item_events = np.repeat(np.asarray(order, dtype=np.intp),
+                            num_event_items)
+    return np.argsort(item_events, kind='stable')
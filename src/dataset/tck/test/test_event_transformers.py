@@ -0,0 +1,117 @@
+import unittest
+import unittest.mock as mock
+
+import numpy as np
+import numpy.testing as nptest
+
+import dataset.tck.constants as c
+import dataset.tck.event_transformers as event_tran
+
+
+class TestGtuInPacketEventTransformer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # 2 packets of 10 frames per file, with frame values set to their
+        # (global) gtu
+        cls.packets = np.arange(20).reshape(2, 10, 1, 1) * np.ones(
+            (1, 1, 2, 3), dtype=np.int64)
+
+    def setUp(self):
+        self.m_extraction_fn = mock.Mock(return_value=self.packets)
+
+    def _create_events(self, srcfile, windows):
+        return [{c.SRCFILE_KEY: srcfile, 'packet_id': packet_id,
+                 'gtu_in_packet': gtu} for packet_id, gtu in windows]
+
+    def _process(self, events, **kwargs):
+        transformer = event_tran.GtuInPacketEventTransformer(
+            self.m_extraction_fn, num_gtu_before=2, num_gtu_after=2,
+            **kwargs)
+        return [items[0] for items in transformer.process_events(events)]
+
+    def test_process_events(self):
+        events = self._create_events('a.npy', [(0, 5), (1, 2)])
+        items = self._process(events)
+        self.assertEqual(len(items), 2)
+        nptest.assert_array_equal(items[0]['packet'][:, 0, 0], range(3, 8))
+        nptest.assert_array_equal(items[1]['packet'][:, 0, 0],
+                                  range(10, 15))
+        self.assertEqual(items[1]['packet'].shape, (5, 2, 3))
+        self.assertEqual((items[1]['packet_id'], items[1]['start_gtu'],
+                          items[1]['end_gtu']), (1, 0, 5))
+        self.assertIs(items[0]['event_meta'], events[0])
+
+    def test_process_event_batches(self):
+        events = (self._create_events('a.npy', [(0, 5), (1, 2)]) +
+                  self._create_events('b.npy', [(1, 5)]))
+        transformer = event_tran.GtuInPacketEventTransformer(
+            self.m_extraction_fn, num_gtu_before=2, num_gtu_after=2)
+        batches = list(transformer.process_event_batches(events))
+        self.assertEqual(len(batches), 2)
+        windows, items = batches[0]
+        # windows of a batch are returned as a single array
+        self.assertIsInstance(windows, np.ndarray)
+        self.assertEqual(windows.shape, (2, 5, 2, 3))
+        nptest.assert_array_equal(windows[1][:, 0, 0], range(10, 15))
+        self.assertEqual((items[1]['packet_id'], items[1]['start_gtu'],
+                          items[1]['end_gtu']), (1, 0, 5))
+        self.assertNotIn('packet', items[0])
+        self.assertIs(items[0]['event_meta'], events[0])
+        self.assertEqual(len(batches[1][1]), 1)
+
+    def test_adjust_out_of_bounds_windows(self):
+        events = self._create_events('a.npy', [(0, 0), (0, 1), (1, 9)])
+        items = self._process(events)
+        self.assertListEqual([(i['start_gtu'], i['end_gtu']) for i in items],
+                             [(0, 5), (0, 5), (5, 10)])
+        nptest.assert_array_equal(items[2]['packet'][:, 0, 0], range(15, 20))
+
+    def test_out_of_bounds_windows_not_adjusted(self):
+        events = self._create_events('a.npy', [(0, 5), (0, 9)])
+        self.assertRaises(Exception, self._process, events,
+                          adjust_if_out_of_bounds=False)
+
+    def test_window_larger_than_packet(self):
+        transformer = event_tran.GtuInPacketEventTransformer(
+            self.m_extraction_fn, num_gtu_before=6, num_gtu_after=6)
+        events = self._create_events('a.npy', [(0, 5)])
+        self.assertRaises(Exception, list, transformer.process_events(events))
+
+    def test_batches_by_source_file(self):
+        events = (self._create_events('a.npy', [(0, 5), (0, 6)]) +
+                  self._create_events('b.npy', [(1, 5)]) +
+                  self._create_events('a.npy', [(1, 5)]))
+        with mock.patch.object(event_tran.GtuInPacketEventTransformer,
+                               'MAX_BATCH_SIZE', 1):
+            self.assertEqual(len(self._process(events)), 4)
+        self.assertEqual(self.m_extraction_fn.call_count, 4)
+        self.m_extraction_fn.reset_mock()
+        self.assertEqual(len(self._process(events)), 4)
+        self.assertListEqual(
+            [args[0] for args, _ in self.m_extraction_fn.call_args_list],
+            ['a.npy', 'b.npy', 'a.npy'])
+
+    def test_window_extraction_fn(self):
+        windows = np.arange(60).reshape(2, 5, 2, 3)
+        m_window_fn = mock.Mock(return_value=windows)
+        events = self._create_events('a.root', [(1, 9), (0, 2)])
+        items = self._process(events, window_extraction_fn=m_window_fn,
+                              packet_size=10)
+        # windows of all events of the file are extracted at once
+        m_window_fn.assert_called_once()
+        args = m_window_fn.call_args[0]
+        self.assertEqual(args[0], 'a.root')
+        nptest.assert_array_equal(args[1], [1, 0])
+        nptest.assert_array_equal(args[2], [5, 0])
+        nptest.assert_array_equal(args[3], [10, 5])
+        self.m_extraction_fn.assert_not_called()
+        self.assertEqual(items[0]['end_gtu'], 10)
+        nptest.assert_array_equal(items[1]['packet'], windows[1])
+        self.assertRaises(ValueError, event_tran.GtuInPacketEventTransformer,
+                          self.m_extraction_fn,
+                          window_extraction_fn=m_window_fn)
+
+
+if __name__ == '__main__':
+    unittest.main()
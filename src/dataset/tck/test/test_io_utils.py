@@ -1,3 +1,7 @@
+import os
+import tempfile
+import threading
+import time
 import unittest
 import unittest.mock as mock
 
@@ -39,54 +43,338 @@ class TestPacketExtractor(unittest.TestCase):
         m_np_load.return_value = self.packets
         extracted_packets = self.extractor.extract_packets_from_npyfile(
             self.srcfile, self.triggerfile)
-        m_np_load.assert_called_with(self.srcfile)
+        m_np_load.assert_called_with(self.srcfile, mmap_mode='r')
         nptest.assert_array_equal(extracted_packets, self.expected_packets)
 
+    def test_extract_from_npyfile_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            npyfile = os.path.join(tempdir, 'packets.npy')
+            np.save(npyfile, self.packets)
+            extracted_packets = self.extractor.extract_packets_from_npyfile(
+                npyfile, self.triggerfile)
+            self.assertIsInstance(extracted_packets, np.memmap)
+            self.assertFalse(extracted_packets.flags.writeable)
+            nptest.assert_array_equal(extracted_packets[1][0:2],
+                                      self.expected_packets[1][0:2])
+            del extracted_packets
+
     @mock.patch('dataset.tck.io_utils.reading')
     def test_extract_from_rootfile(self, m_reading):
-        it = NpyIterator(self.packets)
-        m_reading.AcqL1EventReader.return_value = it
+        m_reading.AcqL1EventReader.return_value = NpyReader(self.packets)
         extracted_packets = self.extractor.extract_packets_from_rootfile(
             self.srcfile, self.triggerfile)
         m_reading.AcqL1EventReader.assert_called_with(
             self.srcfile, self.triggerfile)
         nptest.assert_array_equal(extracted_packets, self.expected_packets)
 
+    @mock.patch('dataset.tck.io_utils.reading')
+    def test_extract_from_rootfile_unordered_gtus(self, m_reading):
+        gtus = np.random.default_rng(0).permutation(len(self.packets))
+        m_reading.AcqL1EventReader.return_value = NpyReader(self.packets,
+                                                            gtus)
+        extracted_packets = self.extractor.extract_packets_from_rootfile(
+            self.srcfile, self.triggerfile)
+        nptest.assert_array_equal(extracted_packets, self.expected_packets)
+
+
+    @mock.patch('dataset.tck.io_utils.reading')
+    def test_extract_frames_from_rootfile(self, m_reading):
+        m_reading.AcqL1EventReader.return_value = NpyReader(self.packets)
+        frames = self.extractor.extract_frames_from_rootfile(
+            self.srcfile, 1, 5, 9, self.triggerfile)
+        nptest.assert_array_equal(frames, self.expected_packets[1][5:9])
+        self.assertRaises(ValueError,
+                          self.extractor.extract_frames_from_rootfile,
+                          self.srcfile, 1, 15, 25)
+
+    @mock.patch('dataset.tck.io_utils.reading')
+    def test_extract_windows_from_rootfile(self, m_reading):
+        m_reading.AcqL1EventReader.return_value = NpyReader(self.packets)
+        windows = self.extractor.extract_windows_from_rootfile(
+            self.srcfile, [1, 0, 1], [5, 0, 12], [9, 4, 16])
+        # the file is opened only once for all windows
+        m_reading.AcqL1EventReader.assert_called_once_with(self.srcfile,
+                                                           None)
+        exp_windows = [self.expected_packets[1][5:9],
+                       self.expected_packets[0][0:4],
+                       self.expected_packets[1][12:16]]
+        nptest.assert_array_equal(windows, exp_windows)
+        self.assertRaises(ValueError,
+                          self.extractor.extract_windows_from_rootfile,
+                          self.srcfile, [0, 1], [0, 0], [4, 5])
+
+
+class TestPacketWindowExtractor(unittest.TestCase):
+
+    def setUp(self):
+        packets = np.arange(40).reshape(2, 20)
+        self.m_extraction_fn = mock.Mock(return_value=packets)
+        self.m_extractor = mock.Mock()
+        self.window_extractor = io_utils.PacketWindowExtractor(
+            self.m_extraction_fn, self.m_extractor)
+
+    def test_extract(self):
+        m_extractor = self.m_extractor
+        m_extractor.extract_windows_from_rootfile.return_value = [[1, 2, 3]]
+        nptest.assert_array_equal(
+            self.window_extractor.extract('a.npy', 1, 2, 5), [22, 23, 24])
+        m_extractor.extract_windows_from_rootfile.assert_not_called()
+        nptest.assert_array_equal(
+            self.window_extractor.extract('a.root', 1, 2, 5), [1, 2, 3])
+        m_extractor.extract_windows_from_rootfile.assert_called_once_with(
+            'a.root', [1], [2], [5])
+        self.m_extraction_fn.assert_called_once_with('a.npy')
+
+    def test_extract_windows(self):
+        windows = self.window_extractor.extract_windows(
+            'a.npy', [1, 0], [2, 17], [5, 20])
+        nptest.assert_array_equal(windows, [[22, 23, 24], [17, 18, 19]])
+        self.m_extraction_fn.assert_called_once_with('a.npy')
+        self.assertRaises(ValueError, self.window_extractor.extract_windows,
+                          'a.npy', [1, 0], [2, 17], [5, 19])
+        self.window_extractor.extract_windows('a.root', [1, 0], [2, 17],
+                                              [5, 20])
+        self.m_extractor.extract_windows_from_rootfile.assert_called_once_with(
+            'a.root', [1, 0], [2, 17], [5, 20])
+
+
+class TestPacketCache(unittest.TestCase):
+
+    def setUp(self):
+        # packets of 100 bytes per file
+        self.m_extractor = mock.Mock(
+            side_effect=lambda filename: np.zeros(100, dtype=np.uint8))
+        self.extractors = {'NPY': self.m_extractor, 'ROOT': mock.Mock()}
+
+    def test_get_hit(self):
+        cache = io_utils.PacketCache(2, self.extractors)
+        packets = cache.get('a.npy')
+        self.assertIs(cache.get('a.npy'), packets)
+        self.m_extractor.assert_called_once_with('a.npy')
+        stats = cache.stats
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['bytes_loaded'], 100)
+
+    def test_max_size(self):
+        cache = io_utils.PacketCache(2, self.extractors)
+        cache.get('a.npy')
+        cache.get('b.npy')
+        # the cache holds max_size files before evicting any
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats['evictions'], 0)
+        cache.get('c.npy')
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('a.npy', cache)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_evict_least_recently_used(self):
+        cache = io_utils.PacketCache(None, self.extractors, max_bytes=250)
+        cache.get('a.npy')
+        cache.get('b.npy')
+        cache.get('a.npy')
+        cache.get('c.npy')
+        self.assertIn('a.npy', cache)
+        self.assertNotIn('b.npy', cache)
+        self.assertEqual(cache.nbytes, 200)
+
+    def test_packets_over_budget_not_cached(self):
+        cache = io_utils.PacketCache(None, self.extractors, max_bytes=50)
+        cache.get('a.npy')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_memory_mapped_packets_not_counted(self):
+        with tempfile.TemporaryFile() as datafile:
+            packets = np.memmap(datafile, dtype=np.uint8, mode='w+',
+                                shape=(100, ))
+            self.extractors['NPY'] = mock.Mock(return_value=packets)
+            cache = io_utils.PacketCache(None, self.extractors, max_bytes=50)
+            cache.get('a.npy')
+            self.assertIn('a.npy', cache)
+            self.assertEqual(cache.nbytes, 0)
 
-# mock class for utils.event_reading.GtuPdmDataIterator
-# and utils.event_reading.AcqL1EventReader
-class NpyIterator:
+    def test_unknown_file_type(self):
+        cache = io_utils.PacketCache(2, self.extractors)
+        self.assertRaises(Exception, cache.get, 'a.txt')
 
-    # mock class for utils.event_reading.GtuPdmDataObject
-    class Frame:
 
-        def __init__(self, gtu, photon_count_data):
-            self.gtu = gtu
-            self.photon_count_data = photon_count_data
+class TestPacketDiskCache(unittest.TestCase):
 
-    def __init__(self, packets_list):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.template = templates.PacketTemplate(16, 16, 48, 48, 128)
+        self.disk_cache = io_utils.PacketDiskCache(self.tempdir.name,
+                                                   self.template)
+        self.srcfile = os.path.join(self.tempdir.name, 'src.root')
+        with open(self.srcfile, 'wb') as srcfile:
+            srcfile.write(b'acquisition')
+        self.packets = np.arange(24, dtype=np.uint8).reshape(2, 3, 4)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_missing(self):
+        self.assertIsNone(self.disk_cache.load(self.srcfile))
+
+    def test_store_and_load(self):
+        stored = self.disk_cache.store(self.srcfile, self.packets)
+        nptest.assert_array_equal(stored, self.packets)
+        loaded = self.disk_cache.load(self.srcfile)
+        self.assertIsInstance(loaded, np.memmap)
+        nptest.assert_array_equal(loaded, self.packets)
+
+    def test_key_depends_on_source_file_and_template(self):
+        filename = self.disk_cache.get_cache_filename(self.srcfile)
+        other_template = templates.PacketTemplate(16, 16, 48, 48, 256)
+        other_cache = io_utils.PacketDiskCache(self.tempdir.name,
+                                               other_template)
+        self.assertNotEqual(other_cache.get_cache_filename(self.srcfile),
+                            filename)
+        with open(self.srcfile, 'ab') as srcfile:
+            srcfile.write(b' modified')
+        self.assertNotEqual(self.disk_cache.get_cache_filename(self.srcfile),
+                            filename)
+
+    def test_packet_cache_disk_tier(self):
+        m_extractor = mock.Mock(return_value=self.packets)
+        extractors = {'NPY': mock.Mock(), 'ROOT': m_extractor}
+        cache = io_utils.PacketCache(2, extractors,
+                                     disk_cache=self.disk_cache)
+        cache.get(self.srcfile)
+        # a new cache (e.g. in a later run) reuses the stored packets
+        cache = io_utils.PacketCache(2, extractors,
+                                     disk_cache=self.disk_cache)
+        nptest.assert_array_equal(cache.get(self.srcfile), self.packets)
+        m_extractor.assert_called_once_with(self.srcfile)
+        self.assertEqual(cache.stats['disk_hits'], 1)
+
+
+class TestPacketPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.extracted = []
+
+        def extract(filename):
+            if filename.startswith('bad'):
+                raise IOError('Cannot read {}'.format(filename))
+            self.extracted.append(filename)
+            return np.full(100, len(self.extracted), dtype=np.uint8)
+
+        extractors = {'NPY': mock.Mock(side_effect=extract),
+                      'ROOT': mock.Mock()}
+        self.cache = io_utils.PacketCache(2, extractors)
+
+    def _wait_until_extracted(self, filenames):
+        # wait for the background thread to extract the given files
+        for _ in range(1000):
+            if self.extracted == filenames:
+                return
+            time.sleep(0.001)
+        self.assertListEqual(self.extracted, filenames)
+
+    def test_prefetch_ahead(self):
+        prefetcher = io_utils.PacketPrefetcher(self.cache, depth=1)
+        prefetcher.start(['a.npy', 'b.npy', 'b.npy', 'c.npy'])
+        try:
+            # at most depth files following the requested one are loaded
+            self._wait_until_extracted(['a.npy', 'b.npy'])
+            packets = prefetcher.get('a.npy')
+            self.assertIs(self.cache.get('a.npy'), packets)
+            prefetcher.get('b.npy')
+            self._wait_until_extracted(['a.npy', 'b.npy', 'c.npy'])
+            prefetcher.get('b.npy')
+            prefetcher.get('c.npy')
+        finally:
+            prefetcher.close()
+        self.assertEqual(prefetcher.stats['prefetched'], 3)
+        self.assertEqual(prefetcher.stats['direct'], 0)
+        self.assertEqual(self.cache.stats['misses'], 3)
+
+    def test_direct_load(self):
+        prefetcher = io_utils.PacketPrefetcher(self.cache, depth=1)
+        prefetcher.start(['a.npy'])
+        try:
+            prefetcher.get('x.npy')
+            prefetcher.get('a.npy')
+        finally:
+            prefetcher.close()
+        self.assertIn('x.npy', self.cache)
+        self.assertEqual(prefetcher.stats['prefetched'], 1)
+        self.assertEqual(prefetcher.stats['direct'], 1)
+
+    def test_direct_load_during_root_extraction(self):
+        started = threading.Event()
+        active, max_active = [], []
+
+        def extract(filename):
+            active.append(filename)
+            max_active.append(len(active))
+            started.set()
+            time.sleep(0.05)
+            active.remove(filename)
+            return np.zeros(100, dtype=np.uint8)
+
+        extractors = {'NPY': mock.Mock(),
+                      'ROOT': mock.Mock(side_effect=extract)}
+        cache = io_utils.PacketCache(2, extractors)
+        prefetcher = io_utils.PacketPrefetcher(cache, depth=1)
+        prefetcher.start(['a.root'])
+        try:
+            self.assertTrue(started.wait(1))
+            # loaded directly while the thread may still be extracting
+            prefetcher.get('x.root')
+            prefetcher.get('a.root')
+        finally:
+            prefetcher.close()
+        self.assertEqual(prefetcher.stats['direct'], 1)
+        # ROOT files are never read by both threads at once
+        self.assertEqual(max(max_active), 1)
+
+    def test_extraction_error(self):
+        prefetcher = io_utils.PacketPrefetcher(self.cache, depth=2)
+        prefetcher.start(['a.npy', 'bad.npy', 'c.npy'])
+        try:
+            prefetcher.get('a.npy')
+            self.assertRaises(IOError, prefetcher.get, 'bad.npy')
+            prefetcher.get('c.npy')
+        finally:
+            prefetcher.close()
+        self.assertNotIn('bad.npy', self.cache)
+
+    def test_invalid_depth(self):
+        self.assertRaises(ValueError, io_utils.PacketPrefetcher, self.cache,
+                          depth=0)
+
+
+# mock class for utils.event_reading.AcqL1EventReader
+class NpyReader:
+
+    def __init__(self, packets_list, gtus=None):
         self.packets = packets_list
-        frame_h, frame_w = packets_list.shape[1:]
-        self.new_shape = (1, 1, frame_h, frame_w)
         self.tevent_entries = len(packets_list)
-        self.index = -1
+        self.gtus = (np.arange(self.tevent_entries) if gtus is None
+                     else np.asarray(gtus))
 
-    def iter_gtu_pdm_data(self):
-        self.index = -1
-        return self
+    def read_photon_count_data(self):
+        frame_h, frame_w = self.packets.shape[1:]
+        frames = self.packets[self.gtus]
+        return self.gtus, frames.reshape(-1, 1, 1, frame_h, frame_w)
 
-    def __iter__(self):
-        self.index = -1
+    def __enter__(self):
         return self
 
-    def __next__(self):
-        self.index += 1
-        if self.index < self.tevent_entries:
-            return NpyIterator.Frame(
-                self.index, self.packets[self.index].reshape(self.new_shape)
-            )
-        else:
-            raise StopIteration()
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def read_gtu_windows(self, start_gtus, stop_gtus):
+        frame_h, frame_w = self.packets.shape[1:]
+        all_gtus = np.arange(self.tevent_entries)
+        windows = [all_gtus[start:stop]
+                   for start, stop in zip(start_gtus, stop_gtus)]
+        gtus = np.concatenate(windows)
+        frames = self.packets[gtus]
+        return (gtus, frames.reshape(-1, 1, 1, frame_h, frame_w),
+                np.array([len(window) for window in windows]))
 
 
 if __name__ == '__main__':
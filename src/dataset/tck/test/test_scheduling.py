@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+import numpy.testing as nptest
+
+import dataset.tck.constants as c
+import dataset.tck.scheduling as sched
+
+
+class TestSchedulingFunctions(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        srcfiles = ['a', 'b', 'a', 'c', 'b', 'a']
+        cls.events = [{c.SRCFILE_KEY: srcfile, 'idx': idx}
+                      for idx, srcfile in enumerate(srcfiles)]
+
+    def test_group_by_source_file(self):
+        events, order = sched.group_by_source_file(self.events)
+        nptest.assert_array_equal(order, [0, 2, 5, 1, 4, 3])
+        self.assertListEqual([event['idx'] for event in events],
+                             [0, 2, 5, 1, 4, 3])
+
+    def test_count_file_loads(self):
+        self.assertEqual(sched.count_file_loads(self.events), 3)
+        self.assertEqual(sched.count_file_loads(self.events, cache_size=1),
+                         6)
+        self.assertEqual(sched.count_file_loads(self.events, cache_size=2),
+                         5)
+        events, order = sched.group_by_source_file(self.events)
+        self.assertEqual(sched.count_file_loads(events, cache_size=1), 3)
+
+    def test_get_items_permutation(self):
+        events, order = sched.group_by_source_file(self.events)
+        num_event_items = [2, 1, 0, 1, 1, 3]
+        # items created from the reordered events, as (event, item) pairs
+        items = [(event['idx'], item_idx)
+                 for event, num in zip(events, num_event_items)
+                 for item_idx in range(num)]
+        permutation = sched.get_items_permutation(order, num_event_items)
+        restored = [items[idx] for idx in permutation]
+        self.assertListEqual(restored, sorted(items))
+
+
+if __name__ == '__main__':
+    unittest.main()
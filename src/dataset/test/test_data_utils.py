@@ -127,6 +127,36 @@ class TestDatasetUtilsFunctions(testset.DatasetItemsMixin, unittest.TestCase):
             exp_items[item_type] = None
             item_types[item_type] = False
 
+    def test_convert_packets(self):
+        packets = self.items['raw']
+        exp_items = {'raw': self.items['raw'][:, self.start:self.end],
+            'gtux': self.items['gtux'][:, self.start:self.end],
+            'gtuy': self.items['gtuy'][:, self.start:self.end],
+            'yx'  : self.items['yx']}
+        item_types = {k: True for k in cons.ALL_ITEM_TYPES}
+        exp_types = {k: True for k in cons.ALL_ITEM_TYPES}
+        ## gradually turn off all item types except 'gtuy'
+        for item_type in cons.ALL_ITEM_TYPES:
+            items = dat.convert_packets(packets, item_types,
+                                        start_idx=self.start, end_idx=self.end)
+            all_equal = {k: (not item_types[k] if v is None
+                             else np.array_equal(v, exp_items[k]))
+                             for k, v in items.items()}
+            self.assertDictEqual(all_equal, exp_types)
+            exp_items[item_type] = None
+            item_types[item_type] = False
+
+    def test_convert_packets_into_preallocated_arrays(self):
+        packets = self.items['raw']
+        item_types = {'raw': False, 'yx': True, 'gtux': True, 'gtuy': False}
+        out = dat.create_data_holders(self.packet_shape, item_types,
+                                      num_items=self.n_packets,
+                                      dtype='float32')
+        items = dat.convert_packets(packets, item_types, out=out)
+        for itype in ('yx', 'gtux'):
+            self.assertIs(items[itype], out[itype])
+            nptest.assert_array_equal(items[itype], self.items[itype])
+
     # test get item shapes
 
     def test_get_y_x_projection_shape(self):
@@ -152,6 +182,42 @@ class TestDatasetUtilsFunctions(testset.DatasetItemsMixin, unittest.TestCase):
             item_shapes[item_type] = None
             item_types[item_type] = False
 
+    # test dtype conversion
+
+    def test_convert_items_dtype_in_place(self):
+        items = np.arange(24, dtype='uint32').reshape(4, 2, 3)
+        converted = dat.convert_items_dtype(items, 'uint8', chunk_size=8)
+        self.assertEqual(converted.dtype, np.uint8)
+        self.assertTrue(np.shares_memory(converted, items))
+        nptest.assert_array_equal(converted,
+                                  np.arange(24).reshape(4, 2, 3))
+
+    def test_convert_items_dtype_larger_dtype(self):
+        items = np.arange(24, dtype='uint8').reshape(4, 2, 3)
+        converted = dat.convert_items_dtype(items, 'float64', chunk_size=8)
+        self.assertEqual(converted.dtype, np.float64)
+        self.assertFalse(np.shares_memory(converted, items))
+        nptest.assert_array_equal(converted, items)
+
+    def test_convert_items_dtype_not_in_place(self):
+        items = np.arange(24, dtype='uint32').reshape(4, 2, 3)
+        converted = dat.convert_items_dtype(items, 'uint8', in_place=False)
+        self.assertFalse(np.shares_memory(converted, items))
+        self.assertEqual(items.dtype, np.uint32)
+        nptest.assert_array_equal(converted, items)
+
+    def test_convert_items_dtype_out_of_range(self):
+        items = np.array([[0.5, 1.5], [255.0, 256.0]], dtype='float32')
+        self.assertRaises(ValueError, dat.convert_items_dtype, items,
+                          'uint8', chunk_size=8)
+        nptest.assert_array_equal(items, [[0.5, 1.5], [255.0, 256.0]])
+
+    def test_check_dtype_range_non_finite(self):
+        items = np.array([[0.0, np.nan]], dtype='float64')
+        self.assertRaises(ValueError, dat.check_dtype_range, items, 'int16')
+        # NaNs can be represented by other float dtypes
+        dat.check_dtype_range(items, 'float16')
+
 
 class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
 
@@ -243,6 +309,28 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
         holder.extend(items)
         self.assertEqual(len(holder), 2)
 
+    def test_capacity_grows_geometrically(self):
+        holder = dat.DataHolder(self.packet_shape)
+        self.assertEqual(holder.capacity, 0)
+        holder.append_packet(self.items['raw'][0])
+        capacity = holder.capacity
+        self.assertEqual(capacity, dat.DataHolder.MIN_CAPACITY)
+        for idx in range(capacity):
+            holder.append_packet(self.items['raw'][1])
+        self.assertEqual(len(holder), capacity + 1)
+        self.assertEqual(holder.capacity,
+                         capacity * dat.DataHolder.GROWTH_FACTOR)
+        nptest.assert_array_equal(holder.get_data_as_dict(0)['raw'],
+                                  self.items['raw'][0])
+
+    def test_get_data_as_dict_returns_views_for_slices(self):
+        holder = dat.DataHolder(self.packet_shape)
+        holder.extend_packets(self.items['raw'])
+        items = holder.get_data_as_dict(slice(0, 2))['raw']
+        all_items = holder.get_data_as_dict()['raw']
+        self.assertIsInstance(items, np.ndarray)
+        self.assertTrue(np.shares_memory(items, all_items))
+
     ## test holder dtype
 
     def test_dtype_on_creation_empty(self):
@@ -283,12 +371,55 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
         self._assertItemsDtype(items, dtype, item_types)
         self.assertEqual(holder.dtype, dtype)
 
+    def test_dtype_casting_out_of_range(self):
+        holder = dat.DataHolder(self.packet_shape, dtype='uint16')
+        packets = np.full((2, *self.packet_shape), 300, dtype='uint16')
+        holder.extend_packets(packets)
+        with self.assertRaises(ValueError):
+            holder.dtype = 'uint8'
+        self.assertEqual(holder.dtype, 'uint16')
+
+    def test_dtype_casting_after_assign(self):
+        items = self._create_items(('raw', ), slice(0, 2))
+        packets = items['raw'].astype('uint16')
+        exp_packets = packets.copy()
+        holder = dat.DataHolder(self.packet_shape, dtype='uint16')
+        holder.assign({'raw': packets})
+        holder.dtype = 'uint8'
+        # assigned arrays are not owned by the holder and must not change
+        self.assertEqual(packets.dtype, np.uint16)
+        nptest.assert_array_equal(packets, exp_packets)
+        self._assertItemsDict(holder.get_data_as_dict(), {'raw': packets},
+                              self._create_item_types(('raw', )))
+
+    def test_extend_out_of_range(self):
+        holder = dat.DataHolder(self.packet_shape, dtype='uint8')
+        packets = np.full((2, *self.packet_shape), 300, dtype='uint16')
+        self.assertRaises(ValueError, holder.extend_packets, packets)
+        self.assertEqual(len(holder), 0)
+
+    def test_extend_out_of_range_list(self):
+        holder = dat.DataHolder(self.packet_shape, dtype='uint8')
+        packets = [np.full(self.packet_shape, 300.5)] * 2
+        self.assertRaises(ValueError, holder.extend, {'raw': packets})
+        self.assertEqual(len(holder), 0)
+
+    def test_append_out_of_range(self):
+        holder = dat.DataHolder(self.packet_shape, dtype='uint8')
+        packet = np.full(self.packet_shape, 300, dtype='uint16')
+        self.assertRaises(ValueError, holder.append, {'raw': packet})
+        self.assertRaises(ValueError, holder.append_packet, packet)
+        self.assertRaises(ValueError, holder.append_packet,
+                          np.full(self.packet_shape, -1.0))
+        self.assertEqual(len(holder), 0)
+
     ## test item retrieval methods
 
     def test_get_data_as_dict_empty(self):
         included_types = ('raw', 'yx')
         item_types = self._create_item_types(included_types)
-        exp_items = {itype: [] for itype in included_types}
+        exp_items = {itype: np.empty((0, *self.item_shapes[itype]))
+                     for itype in included_types}
 
         holder = dat.DataHolder(self.packet_shape, item_types=item_types)
         self._assertItemsDict(holder.get_data_as_dict(), exp_items, item_types)
@@ -332,7 +463,8 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
     def test_get_data_as_arraylike_empty(self):
         included_types = ('yx', )
         item_types = self._create_item_types(included_types)
-        exp_items = tuple([] for itype in included_types)
+        exp_items = tuple(np.empty((0, *self.item_shapes[itype]))
+                          for itype in included_types)
 
         holder = dat.DataHolder(self.packet_shape, item_types=item_types)
         self._assertItemsArraylike(holder.get_data_as_arraylike(), exp_items,
@@ -387,6 +519,16 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
         holder.extend(items)
         self._assertItemsDict(holder.get_data_as_dict(), exp_items, item_types)
 
+    def test_extend_empty(self):
+        included_types = ('raw', 'gtux')
+        item_types = self._create_item_types(included_types)
+        holder = dat.DataHolder(self.packet_shape, item_types=item_types)
+        holder.extend({'raw': [], 'gtux': iter(())})
+        self.assertEqual(len(holder), 0)
+        holder.extend(self._create_items(included_types, slice(0, 2)))
+        holder.extend({'raw': [], 'gtux': []})
+        self.assertEqual(len(holder), 2)
+
     def test_extend_packets(self):
         included_types = ('raw', 'gtuy')
         items = self._create_items(included_types, slice(0, 2))
@@ -398,6 +540,34 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
         holder.extend_packets(packets)
         self._assertItemsDict(holder.get_data_as_dict(), exp_items, item_types)
 
+    def test_assign(self):
+        included_types = ('raw', 'gtux')
+        items = self._create_items(included_types, slice(0, 3))
+        items = {k: items[k].astype('float32') for k in included_types}
+        item_types = self._create_item_types(included_types)
+
+        holder = dat.DataHolder(self.packet_shape, item_types=item_types,
+                                dtype='float32')
+        holder.assign(items)
+        self.assertEqual(len(holder), 3)
+        data = holder.get_data_as_dict()
+        for itype in included_types:
+            # items are not copied if their dtype matches
+            self.assertTrue(np.shares_memory(data[itype], items[itype]))
+        self._assertItemsDict(data, items, item_types)
+
+    def test_append_after_assign(self):
+        items = self._create_items(('raw', ), slice(0, 2))
+        readonly_packets = items['raw'].astype('uint8')
+        readonly_packets.flags.writeable = False
+
+        holder = dat.DataHolder(self.packet_shape)
+        holder.assign({'raw': readonly_packets})
+        holder.append_packet(self.items['raw'][0])
+        exp_items = {'raw': [*items['raw'], self.items['raw'][0]]}
+        self._assertItemsDict(holder.get_data_as_dict(), exp_items,
+                              self._create_item_types(('raw', )))
+
     def test_append(self):
         included_types = ('yx', 'gtux')
         items = self._create_items(included_types, 0)
@@ -447,23 +617,19 @@ class TestDataHolder(testset.DatasetItemsMixin, unittest.TestCase):
         holder = dat.DataHolder(self.packet_shape, item_types=item_types)
         self.assertRaises(Exception, holder.extend, items)
 
-    ## test item shuffling
+    ## test item reordering
 
-    def test_shuffle(self):
+    def test_permute(self):
         included_types = ('raw', 'yx')
         item_types = self._create_item_types(included_types)
         items = self._create_items(included_types, slice(0, 2))
-        exp_items = {itype: items[itype] for itype in included_types}
-        def shuffler(seq):
-            temp = seq[0]
-            seq[0] = seq[1]
-            seq[1] = temp
-        shuffler(exp_items['raw'])
-        shuffler(exp_items['yx'])
+        permutation = [1, 0]
+        exp_items = {itype: items[itype][permutation]
+                     for itype in included_types}
 
         holder = dat.DataHolder(self.packet_shape, item_types=item_types)
         holder.extend_packets(items['raw'])
-        holder.shuffle(shuffler, lambda: None)
+        holder.permute(permutation)
         self._assertItemsDict(holder.get_data_as_dict(), exp_items, item_types)
 
 
@@ -77,6 +77,63 @@ class TestNumpyDataset(testset.DatasetItemsMixin, testset.DatasetTargetsMixin,
 
         self.assertRaises(ValueError, dset.add_data_item, packet, targ, meta)
 
+    def test_add_items(self):
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        dset.add_data_items(self.items['raw'], self.mock_targets,
+                            self.mock_meta)
+        self._assertDatasetItems(dset, self.items, self.mock_targets,
+                                 self.mock_meta, self.metafields,
+                                 self.n_packets, self.item_types)
+
+    def test_add_items_class_indices_and_metadata_columns(self):
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        indices = np.argmax(self.mock_targets, axis=1)
+        columns = {'idx': list(range(self.n_packets))}
+        dset.add_data_items(self.items['raw'], indices, columns)
+        exp_meta = [{'idx': idx} for idx in range(self.n_packets)]
+        self._assertDatasetItems(dset, self.items, self.mock_targets,
+                                 exp_meta, {'idx'}, self.n_packets,
+                                 self.item_types)
+
+    def test_add_items_equals_add_item(self):
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        exp_dset = ds.NumpyDataset(self.name, self.packet_shape,
+                                   item_types=self.item_types)
+        for idx in range(self.n_packets):
+            exp_dset.add_data_item(self.items['raw'][idx],
+                                   self.mock_targets[idx])
+        dset.add_data_items(list(self.items['raw']), self.mock_targets)
+        self._assertDatasetItems(dset, exp_dset.get_data_as_dict(),
+                                 exp_dset.get_targets(),
+                                 exp_dset.get_metadata(), set(),
+                                 self.n_packets, self.item_types)
+
+    def test_add_items_non_resizable_dataset(self):
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        dset.resizable = False
+
+        self.assertRaises(Exception, dset.add_data_items, self.items['raw'],
+                          self.mock_targets, self.mock_meta)
+
+    def test_add_items_wrong_number_of_targets_or_metadata(self):
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        packets = self.items['raw']
+
+        self.assertRaises(ValueError, dset.add_data_items, packets,
+                          self.mock_targets[:-1], self.mock_meta)
+        self.assertRaises(ValueError, dset.add_data_items, packets,
+                          self.mock_targets, self.mock_meta[:-1])
+        self.assertRaises(ValueError, dset.add_data_items, packets,
+                          [[1, 1]] * self.n_packets)
+        self.assertEqual(dset.num_data, 0)
+        self.assertEqual(len(dset.get_targets()), 0)
+        self.assertListEqual(dset.get_metadata(), [])
+
     # test dataset item getting
 
     def test_get_data_as_dict(self):
@@ -266,8 +323,147 @@ class TestNumpyDataset(testset.DatasetItemsMixin, testset.DatasetTargetsMixin,
                 self.assertEqual(items_dict[itype][0].dtype.name, 'float16')
         self.assertEqual(dset.dtype, 'float16')
 
-    # TODO: Possibly think of a way to test ds.shuffle_dataset,
-    # though it has low priority
+    # shuffling
+
+    def _create_indexed_dataset(self, num_items=5):
+        # items, targets and metadata all identify the item index
+        dset = ds.NumpyDataset(self.name, self.packet_shape,
+                               item_types=self.item_types)
+        for idx in range(num_items):
+            packet = np.full(self.packet_shape, idx, dtype=np.uint8)
+            dset.add_data_item(packet, self.mock_targets[idx % 2],
+                               {'idx': idx})
+        return dset
+
+    def _assertItemOrder(self, dset, exp_order):
+        nptest.assert_array_equal(dset.get_data_as_dict()['raw'][:, 0, 0, 0],
+                                  exp_order)
+        exp_targets = [self.mock_targets[idx % 2] for idx in exp_order]
+        nptest.assert_array_equal(dset.get_targets(), exp_targets)
+        self.assertListEqual([meta['idx'] for meta in dset.get_metadata()],
+                             list(exp_order))
+
+    def test_permute(self):
+        dset = self._create_indexed_dataset()
+        permutation = [3, 0, 4, 2, 1]
+        dset.permute(permutation)
+        self._assertItemOrder(dset, permutation)
+
+    def test_permute_invalid_permutation(self):
+        dset = self._create_indexed_dataset()
+        for permutation in ([0, 1], [0, 0, 1, 2, 3], [1, 2, 3, 4, 5]):
+            self.assertRaises(ValueError, dset.permute, permutation)
+        self._assertItemOrder(dset, range(5))
+
+    def test_shuffle_dataset_seeded(self):
+        dset1 = self._create_indexed_dataset()
+        dset2 = self._create_indexed_dataset()
+        dset1.shuffle_dataset(rng=42)
+        dset2.shuffle_dataset(rng=42)
+        exp_order = np.random.default_rng(42).permutation(5)
+        self._assertItemOrder(dset1, exp_order)
+        self._assertItemOrder(dset2, exp_order)
+
+    def test_shuffle_dataset_zero_shuffles(self):
+        dset = self._create_indexed_dataset()
+        dset.shuffle_dataset(0, rng=42)
+        self._assertItemOrder(dset, range(5))
+
+
+class TestDatasetView(testset.DatasetItemsMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.dset = ds.NumpyDataset('test', self.packet_shape)
+        for idx in range(5):
+            packet = np.full(self.packet_shape, idx, dtype=np.uint8)
+            target = cons.CLASSIFICATION_TARGETS['noise' if idx % 2
+                                                 else 'shower']
+            self.dset.add_data_item(packet, target, {'idx': idx})
+
+    def _assertViewItems(self, view, exp_indexes):
+        data = view.get_data_as_dict()
+        nptest.assert_array_equal(data['raw'][:, 0, 0, 0], exp_indexes)
+        exp_targets = [[0, 1] if idx % 2 else [1, 0] for idx in exp_indexes]
+        nptest.assert_array_equal(view.get_targets(), exp_targets)
+        self.assertListEqual(view.get_metadata(),
+                             [{'idx': idx} for idx in exp_indexes])
+        self.assertEqual(view.num_data, len(exp_indexes))
+
+    def test_slice_view(self):
+        view = ds.DatasetView(self.dset, slice(1, 4))
+        self._assertViewItems(view, [1, 2, 3])
+        self.assertEqual(view.item_shapes, self.dset.item_shapes)
+        # data of slice views are not copied
+        data = view.get_data_as_dict()['raw']
+        base = self.dset.get_data_as_dict()['raw']
+        self.assertTrue(np.shares_memory(data, base))
+
+    def test_index_view(self):
+        view = ds.DatasetView(self.dset, [4, 0, 2])
+        self._assertViewItems(view, [4, 0, 2])
+        nptest.assert_array_equal(
+            view.get_data_as_dict(slice(1, None))['raw'][:, 0, 0, 0], [0, 2])
+
+    def test_view_of_view(self):
+        view = ds.DatasetView(self.dset, slice(None, None, -1))
+        subview = ds.DatasetView(view, slice(1, None))
+        self.assertIs(subview.dataset, self.dset)
+        self._assertViewItems(subview, [3, 2, 1, 0])
+        subview = ds.DatasetView(view, [0, 2])
+        self._assertViewItems(subview, [4, 2])
+
+    def test_merge_view_into_dataset(self):
+        dset = ds.NumpyDataset('other', self.packet_shape)
+        dset.merge_with(ds.DatasetView(self.dset, [3, 1]))
+        self._assertViewItems(dset, [3, 1])
+
+
+class TestPermutedView(testset.DatasetItemsMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.dset = ds.NumpyDataset('test', self.packet_shape)
+        for idx in range(5):
+            packet = np.full(self.packet_shape, idx, dtype=np.uint8)
+            target = cons.CLASSIFICATION_TARGETS['noise' if idx % 2
+                                                 else 'shower']
+            self.dset.add_data_item(packet, target, {'idx': idx})
+
+    def test_get_items(self):
+        permutation = [3, 0, 4, 2, 1]
+        view = ds.PermutedView(self.dset, permutation=permutation)
+        self.assertEqual(view.num_data, 5)
+        data = view.get_data_as_dict(slice(1, 3))
+        nptest.assert_array_equal(data['raw'][:, 0, 0, 0], [0, 4])
+        nptest.assert_array_equal(view.get_targets([0, 4]), [[0, 1], [0, 1]])
+        self.assertListEqual(view.get_metadata(), [{'idx': idx}
+                                                   for idx in permutation])
+        # the underlying dataset is left unchanged
+        self.assertListEqual(self.dset.get_metadata(),
+                             [{'idx': idx} for idx in range(5)])
+
+    def test_reshuffle(self):
+        view = ds.PermutedView(self.dset, rng=7)
+        rng = np.random.default_rng(7)
+        nptest.assert_array_equal(view.permutation, rng.permutation(5))
+        view.reshuffle()
+        nptest.assert_array_equal(view.permutation, rng.permutation(5))
+
+    def test_permuted_view_of_view(self):
+        view = ds.DatasetView(self.dset, slice(2, None))
+        permuted = ds.PermutedView(view, permutation=[2, 0, 1])
+        self.assertListEqual(permuted.get_metadata(),
+                             [{'idx': idx} for idx in (4, 2, 3)])
+
+    def test_invalid_permutation_length(self):
+        self.assertRaises(ValueError, ds.PermutedView, self.dset,
+                          permutation=[0, 1])
+
+    def test_invalid_permutation_values(self):
+        num_items = self.dset.num_data
+        for permutation in ([0] * num_items, list(range(1, num_items + 1)),
+                            [-1] + list(range(1, num_items))):
+            self.assertRaises(ValueError, ds.PermutedView, self.dset,
+                              permutation=permutation)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,8 @@
 import unittest
 
+import numpy as np
+import numpy.testing as nptest
+
 import dataset.metadata_utils as meta
 import test.test_setups as testset
 
@@ -22,6 +25,21 @@ class TestMetadataHolder(testset.DatasetMetadataMixin, unittest.TestCase):
         self.assertListEqual(holder[slice(None)], metadata)
         self.assertSetEqual(holder.metadata_fields, metafields)
 
+    def test_extend_columns(self):
+        holder = meta.MetadataHolder()
+        holder.extend([{'test': 'val'}])
+        holder.extend_columns({'test': ['val2', 'val3'], 'test2': [1, 2]})
+        exp_metadata = [{'test': 'val'}, {'test': 'val2', 'test2': 1},
+                        {'test': 'val3', 'test2': 2}]
+        self.assertListEqual(holder[slice(None)], exp_metadata)
+        self.assertSetEqual(holder.metadata_fields, set(['test', 'test2']))
+
+    def test_extend_columns_different_lengths(self):
+        holder = meta.MetadataHolder()
+        self.assertRaises(ValueError, holder.extend_columns,
+                          {'test': ['val'], 'test2': [1, 2]})
+        self.assertEqual(len(holder), 0)
+
     def test_append_metadata(self):
         holder = meta.MetadataHolder()
         metadata = [{'test': 'val'}, {'test2': 'otherval'},
@@ -46,21 +64,102 @@ class TestMetadataHolder(testset.DatasetMetadataMixin, unittest.TestCase):
         self.assertListEqual(holder[slice(None)], exp_metadata)
         self.assertSetEqual(holder.metadata_fields, exp_metafields)
 
-    def test_shuffle(self):
+    def test_permute(self):
         holder = meta.MetadataHolder()
         metadata = [{'test': 'val'}, {'test2': 'otherval'},
                     {'test': 'valval', 'test3': 'someval2'}]
         holder.extend(metadata)
-        exp_metadata = metadata.copy()
-        def shuffler(seq):
-            temp = seq[0]
-            seq[0] = seq[1]
-            seq[1] = temp
-        shuffler(exp_metadata)
-        exp_metafields = set(['test', 'test2', 'test3'])
-        holder.shuffle(shuffler)
-        self.assertListEqual(holder[slice(None)], exp_metadata)
-        self.assertSetEqual(holder.metadata_fields, exp_metafields)
+        permutation = [1, 2, 0]
+        holder.permute(permutation)
+        self.assertListEqual(holder[slice(None)],
+                             [metadata[idx] for idx in permutation])
+
+    def test_get_metadata_with_indexes(self):
+        holder = meta.MetadataHolder()
+        metadata = [{'test': idx} for idx in range(5)]
+        holder.extend(metadata)
+        self.assertDictEqual(holder[3], metadata[3])
+        self.assertDictEqual(holder[-1], metadata[-1])
+        self.assertListEqual(holder[[4, 0]], [metadata[4], metadata[0]])
+        self.assertListEqual(holder[np.array([1, 2])], metadata[1:3])
+        self.assertListEqual(holder[slice(1, None, 2)], metadata[1::2])
+
+    def test_column_kinds(self):
+        holder = meta.MetadataHolder()
+        metadata = [{'b': True, 'i': 1, 'f': 0.5, 's': 'a', 'n': None},
+                    {'b': False, 'i': 2, 'f': 1.5, 's': 'b', 'n': None}]
+        holder.extend(metadata)
+        columns = holder._columns
+        exp_kinds = {'b': 'bool', 'i': 'int', 'f': 'float', 's': 'category',
+                     'n': 'category'}
+        self.assertDictEqual({k: v.kind for k, v in columns.items()},
+                             exp_kinds)
+        nptest.assert_array_equal(holder.get_column('i'), [1, 2])
+        self.assertEqual(holder.get_column('f').dtype, np.float64)
+        self.assertListEqual(holder.get_column('s').tolist(), ['a', 'b'])
+        self.assertListEqual(holder[slice(None)], metadata)
+
+    def test_column_kind_change_keeps_values(self):
+        holder = meta.MetadataHolder()
+        metadata = [{'test': 1}, {'test': True}, {'test': 'val'},
+                    {'test': [1, 2]}]
+        for meta_dict in metadata:
+            holder.append(meta_dict)
+        self.assertEqual(holder._columns['test'].kind, 'object')
+        self.assertListEqual(holder[slice(None)], metadata)
+        self.assertIs(holder[1]['test'], True)
+
+    def test_get_column_with_missing_values(self):
+        holder = meta.MetadataHolder()
+        holder.extend([{'test': 1}, {'other': 'val'}, {'test': 3}])
+        column = holder.get_column('test', missing_value=-1)
+        self.assertListEqual(column.tolist(), [1, -1, 3])
+        nptest.assert_array_equal(holder.get_column('test', [0, 2]), [1, 3])
+
+    def test_extend_from(self):
+        holder, other = meta.MetadataHolder(), meta.MetadataHolder()
+        metadata = [{'test': 'val', 'num': 1}, {'test2': 'otherval'}]
+        other_metadata = [{'test': 'val2', 'num': 2.5}, {'test': 'val'},
+                          {'test3': 3}]
+        holder.extend(metadata)
+        other.extend(other_metadata)
+        holder.extend_from(other, slice(0, 2))
+        self.assertListEqual(holder[slice(None)],
+                             metadata + other_metadata[0:2])
+        # fields of items not merged into the holder are not added
+        self.assertSetEqual(holder.metadata_fields,
+                            set(['test', 'test2', 'num']))
+
+    def test_add_metafield_unhashable_default(self):
+        holder = meta.MetadataHolder()
+        holder.extend(self.mock_meta)
+        holder.add_metafield('somekey', default_value=[1])
+        holder.append({'somekey': [2]})
+        values = [meta_dict['somekey'] for meta_dict in holder[None]]
+        self.assertListEqual(values, [[1]] * len(self.mock_meta) + [[2]])
+
+    def test_add_metafield_allocates_on_write(self):
+        holder = meta.MetadataHolder()
+        holder.extend(self.mock_meta)
+        holder.add_metafield('somekey', default_value='someval')
+        column = holder.get_metadata_column('somekey')
+        self.assertEqual(len(column._values), 0)
+        self.assertEqual(column.capacity, holder._capacity)
+        holder.permute(np.arange(len(holder))[::-1])
+        self.assertListEqual(holder.get_column('somekey').tolist(),
+                             ['someval'] * len(self.mock_meta))
+        holder.append({'somekey': 'otherval'})
+        self.assertEqual(len(column._values), holder._capacity)
+        values = [meta_dict['somekey'] for meta_dict in holder[None]]
+        self.assertListEqual(values,
+                             ['someval'] * len(self.mock_meta) + ['otherval'])
+
+    def test_get_metadata_returns_copies(self):
+        holder = meta.MetadataHolder()
+        holder.extend([{'test': 'val'}])
+        holder[0]['test'] = 'otherval'
+        holder[slice(None)][0]['test2'] = 'val2'
+        self.assertListEqual(holder[slice(None)], [{'test': 'val'}])
 
     def test_length_empty(self):
         holder = meta.MetadataHolder()
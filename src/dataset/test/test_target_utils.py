@@ -1,5 +1,8 @@
 import unittest
 
+import numpy as np
+import numpy.testing as nptest
+
 import dataset.constants as cons
 import dataset.target_utils as targ
 import test.test_setups as testset
@@ -17,6 +20,21 @@ class TestModuleFunctions(unittest.TestCase):
         name = targ.get_target_name(target)
         self.assertEqual(name, 'noise')
 
+    def test_get_target_names(self):
+        targets = [cons.CLASSIFICATION_TARGETS['noise'],
+                   cons.CLASSIFICATION_TARGETS['shower']]
+        names = targ.get_target_names(targets)
+        self.assertListEqual(names.tolist(), ['noise', 'shower'])
+
+    def test_get_target_name_invalid_target(self):
+        self.assertRaises(ValueError, targ.get_target_name, [1, 1])
+
+    def test_one_hot_targets_round_trip(self):
+        targets = np.array([[1, 0], [0, 1], [0, 1]], dtype=np.uint8)
+        indices = targ.get_class_indices(targets)
+        self.assertEqual(indices.dtype, np.uint8)
+        nptest.assert_array_equal(targ.get_one_hot_targets(indices), targets)
+
     def test_get_target_probabilities(self):
         output = [0, 0]
         output[cons.CLASSIFICATION_TARGETS['shower'].index(1)] = 0.2314123
@@ -40,10 +58,16 @@ class TestTargetHolder(testset.DatasetTargetsMixin, unittest.TestCase):
     # helper methods (custom asserts)
 
     def _assertTargetsArraylikeEqual(self, targets, exp_targets):
-        self.assertTupleEqual(targets, exp_targets)
+        self.assertEqual(len(targets), len(exp_targets))
+        for ttargets, exp_ttargets in zip(targets, exp_targets):
+            exp_ttargets = np.reshape(exp_ttargets, (-1, 2))
+            nptest.assert_array_equal(ttargets, exp_ttargets)
 
     def _assertTargetsDictEqual(self, targets, exp_targets):
-        self.assertDictEqual(targets, exp_targets)
+        self.assertSetEqual(set(targets.keys()), set(exp_targets.keys()))
+        for ttype in exp_targets.keys():
+            exp_ttargets = np.reshape(exp_targets[ttype], (-1, 2))
+            nptest.assert_array_equal(targets[ttype], exp_ttargets)
 
     # test setup
 
@@ -144,20 +168,44 @@ class TestTargetHolder(testset.DatasetTargetsMixin, unittest.TestCase):
         holder.append(target)
         self._assertTargetsDictEqual(holder.get_targets_as_dict(), exp_target)
 
-    ## test shuffle
+    def test_get_class_indices(self):
+        holder = targ.TargetsHolder()
+        holder.extend(self._create_targets(slice(None)))
+        indices = holder.get_class_indices(slice(1, 3))
+        exp_indices = targ.get_class_indices(self.mock_targets[1:3])
+        nptest.assert_array_equal(indices, exp_indices)
+
+    def test_extend_class_indices(self):
+        targets = self._create_targets(slice(None))
+        exp_targets = {'classification': targets['classification']}
+        indices = targ.get_class_indices(targets['classification'])
+        holder = targ.TargetsHolder()
+        holder.extend_class_indices({'classification': indices})
+        self._assertTargetsDictEqual(holder.get_targets_as_dict(), exp_targets)
+
+    def test_extend_class_indices_invalid_indices(self):
+        holder = targ.TargetsHolder()
+        self.assertRaises(ValueError, holder.extend_class_indices,
+                          {'classification': [0, 2]})
+        self.assertEqual(len(holder), 0)
 
-    def test_shuffle(self):
+    def test_extend_invalid_targets(self):
         holder = targ.TargetsHolder()
-        targets = {'classification': [[0, 0], [0, 1], [1, 0], [1, 1]]}
+        self.assertRaises(ValueError, holder.extend,
+                          {'classification': [[1, 1]]})
+
+    ## test reordering
+
+    def test_permute(self):
+        holder = targ.TargetsHolder()
+        targets = {'classification': [[1, 0], [0, 1], [0, 1], [1, 0]]}
         holder.extend(targets)
-        exp_targets = targets.copy()
-        def shuffler(seq):
-            temp = seq[0]
-            seq[0] = seq[1]
-            seq[1] = temp
-        shuffler(exp_targets['classification'])
-        holder.shuffle(shuffler, lambda: None)
+        permutation = [1, 0, 3, 2]
+        exp_targets = {'classification': [targets['classification'][idx]
+                                          for idx in permutation]}
+        holder.permute(permutation)
         self._assertTargetsDictEqual(holder.get_targets_as_dict(), exp_targets)
 
+
 if __name__ == '__main__':
     unittest.main()
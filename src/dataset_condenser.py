@@ -1,11 +1,20 @@
+import collections
+import configparser
+import hashlib
+import itertools
+import json
 import logging
+import multiprocessing
+import os
 
 import dataset.dataset_utils as ds
 import dataset.io.fs_io as fs_io
+import dataset.io.sharded_fs_io as sharded_io
 import dataset.tck.constants as tck_cons
 import dataset.tck.event_transformers as event_tran
 import dataset.tck.io_utils as tck_io_utils
 import dataset.tck.metadata_handlers as meta
+import dataset.tck.scheduling as sched
 import dataset.tck.target_handlers as targ
 import utils.io_utils as io_utils
 
@@ -23,8 +32,16 @@ import utils.io_utils as io_utils
 # - frames 27-47 are the rule of thumb
 
 
+# arguments of main needed to create a condenser
+CONDENSER_ARGS = ('packet_template', 'cache', 'event_transformer',
+                  'target_handler', 'extra_metafields', 'logger')
+
+
 class DatasetCondenser:
 
+    # maximal number of items added to the output dataset at once
+    ADD_BATCH_SIZE = 256
+
     def __init__(self, packets_handler, metadata_handler, targets_handler,
                  logger=None):
         self.packets_handler = packets_handler
@@ -32,37 +49,350 @@ class DatasetCondenser:
         self.targets_handler = targets_handler
         self.logger = logger or logging.getLogger(self.__class__.__name__)
 
-    def add_to_dataset(self, event_stream, dataset):
+    def create_items(self, event_stream):
+        """
+            Create items from events (filelist rows), returned as a generator
+            of lists of (packet, target, metadata) tuples, one list for every
+            event.
+        """
         events = self.packets_handler.process_events(event_stream)
         events = self.metadata_handler.process_events(events)
-        events = self.targets_handler.process_events(events)
+        return self.targets_handler.process_events(events)
+
+    @property
+    def creates_item_batches(self):
+        """
+            Whether the packets handler creates items of batches of events
+            at once, with exactly one item per event (see
+            create_item_batches).
+        """
+        return hasattr(self.packets_handler, 'process_event_batches')
+
+    def create_item_batches(self, event_stream):
+        """
+            Create items from events (filelist rows) in batches, returned as
+            a generator of (packets, targets, metadata) tuples, with packets
+            of all items of a batch in a single array and one item for every
+            event of the batch.
+        """
+        create_metadata = self.metadata_handler.create_metadata
+        get_target = self.targets_handler.get_target
+        for packets, items in self.packets_handler.process_event_batches(
+                event_stream):
+            metadata = [create_metadata(item) for item in items]
+            targets = [get_target(meta) for meta in metadata]
+            yield packets, targets, metadata
+
+    def _get_max_batch_size(self, dataset):
+        # batches added to a sharded dataset end where shards do, so that
+        # progress is reported whenever a shard has just been written
+        if isinstance(dataset, sharded_io.ShardedDatasetWriter):
+            return min(self.ADD_BATCH_SIZE, dataset.num_free)
+        return self.ADD_BATCH_SIZE
+
+    def add_to_dataset(self, event_stream, dataset, start_row=0,
+                       start_item=0, progress_fn=None):
+        """
+            Create items from events (filelist rows) and add them to dataset.
+
+            To continue a previous run, the first start_row events are
+            skipped without being processed, as are the first start_item
+            items created from the event following them.
+
+            Items are added to the dataset in batches of at most
+            ADD_BATCH_SIZE items. If progress_fn is passed, it is called
+            after every added batch with the number of events all items of
+            which have been added and the number of items of the next event
+            added so far.
+
+            Returns the number of items created from each processed event.
+        """
+        if self.creates_item_batches:
+            return self._add_item_batches(event_stream, dataset, start_row,
+                                          start_item, progress_fn)
+        event_stream = itertools.islice(event_stream, start_row, None)
+        events = self.create_items(event_stream)
         log_info = self.logger.info
-        for event_list in events:
+        num_event_items = []
+        batch, progress = [], None
+
+        def add_batch():
+            packets, targets, metadata = zip(*batch)
+            dataset.add_data_items(packets, targets, metadata=list(metadata))
+            batch.clear()
+            if progress_fn is not None:
+                progress_fn(*progress)
+            log_info(f"Dataset current total data items count: "
+                     f"{dataset.num_data}")
+
+        for row_idx, event_list in enumerate(events, start=start_row):
+            num_event_items.append(len(event_list))
+            if len(event_list) == 0:
+                continue
             event_meta = event_list[0][2]
             log_info(f"Processing {len(event_list)} packets from "
                      f"{event_meta[tck_cons.SRCFILE_KEY]}")
-            for event in event_list:
-                packet, target, meta = event[:]
-                dataset.add_data_item(packet, target, metadata=meta)
-            log_info(f"Dataset current total data items count: "
-                     f"{dataset.num_data}")
+            first_item = start_item if row_idx == start_row else 0
+            for item_idx in range(first_item, len(event_list)):
+                batch.append(event_list[item_idx][:3])
+                if item_idx + 1 == len(event_list):
+                    progress = (row_idx + 1, 0)
+                else:
+                    progress = (row_idx, item_idx + 1)
+                if len(batch) >= self._get_max_batch_size(dataset):
+                    add_batch()
+        if batch:
+            add_batch()
+        return num_event_items
+
+    def _add_item_batches(self, event_stream, dataset, start_row, start_item,
+                          progress_fn):
+        # every event creates exactly one item, so an event with some items
+        # already added has all of them added
+        start_row += 1 if start_item > 0 else 0
+        event_stream = itertools.islice(event_stream, start_row, None)
+        log_info = self.logger.info
+        num_rows = start_row
+        for packets, targets, metadata in self.create_item_batches(
+                event_stream):
+            log_info(f"Processing {len(packets)} packets from "
+                     f"{metadata[0][tck_cons.SRCFILE_KEY]}")
+            start = 0
+            while start < len(packets):
+                stop = start + self._get_max_batch_size(dataset)
+                # packets are added as (views of) the whole batch array
+                dataset.add_data_items(packets[start:stop],
+                                       targets[start:stop],
+                                       metadata=metadata[start:stop])
+                num_rows += len(targets[start:stop])
+                start = stop
+                if progress_fn is not None:
+                    progress_fn(num_rows, 0)
+                log_info(f"Dataset current total data items count: "
+                         f"{dataset.num_data}")
+        return [1] * (num_rows - start_row)
+
+
+# condenser and packet cache instances of a pool worker process
+_worker_condenser, _worker_cache = None, None
+
+
+def _init_worker(condenser_args):
+    global _worker_condenser, _worker_cache
+    _worker_cache = get_packet_cache(condenser_args['packet_template'],
+                                     **condenser_args['cache'])
+    _worker_condenser = get_condenser(_worker_cache.get, **condenser_args)
+
+
+def _create_worker_items(events):
+    results = list(_worker_condenser.create_items(events))
+    return os.getpid(), _worker_cache.stats, results
+
+
+class ParallelDatasetCondenser(DatasetCondenser):
+    """
+        Dataset condenser creating items in a pool of worker processes.
+
+        Events are read as they are needed and handed to workers in chunks
+        of EVENTS_PER_TASK consecutive events, with at most TASKS_PER_WORKER
+        chunks per worker being processed or waiting to be returned at any
+        time, so that only items of a bounded number of events are held in
+        memory. Created items are returned in the original order of events
+        regardless of which worker created them and when, so the created
+        dataset is the same as that of a DatasetCondenser.
+
+        Every worker creates its own condenser and packet cache from
+        condenser_args (see get_condenser and get_packet_cache). Events of
+        the same source file are best kept together (see dataset.tck.
+        scheduling), so that they mostly end up in the same chunk and the
+        file is extracted by as few workers as possible.
+    """
+
+    # number of consecutive events processed by a worker at once
+    EVENTS_PER_TASK = 64
+    # maximal number of submitted chunks of events per worker
+    TASKS_PER_WORKER = 2
+
+    def __init__(self, packets_handler, metadata_handler, targets_handler,
+                 num_workers, condenser_args, logger=None):
+        super(ParallelDatasetCondenser, self).__init__(
+            packets_handler, metadata_handler, targets_handler, logger=logger)
+        self.num_workers = num_workers
+        self.condenser_args = condenser_args
+        self._worker_stats = {}
+
+    @property
+    def creates_item_batches(self):
+        # items are created by workers one event at a time
+        return False
+
+    @property
+    def cache_stats(self):
+        """Packet cache usage counters summed over all workers."""
+        stats = dict.fromkeys(('hits', 'misses', 'evictions', 'bytes_loaded',
+                               'load_time', 'disk_hits'), 0)
+        for worker_stats in self._worker_stats.values():
+            for key, value in worker_stats.items():
+                stats[key] += value
+        return stats
+
+    def create_items(self, event_stream):
+        event_stream = iter(event_stream)
+        max_tasks = self.num_workers * self.TASKS_PER_WORKER
+        with multiprocessing.Pool(self.num_workers, initializer=_init_worker,
+                                  initargs=(self.condenser_args, )) as pool:
+            # results of chunks are collected in the order of submission
+            tasks = collections.deque()
+            while True:
+                while len(tasks) < max_tasks:
+                    events = list(itertools.islice(event_stream,
+                                                   self.EVENTS_PER_TASK))
+                    if not events:
+                        break
+                    tasks.append(pool.apply_async(_create_worker_items,
+                                                  (events, )))
+                if not tasks:
+                    break
+                pid, stats, results = tasks.popleft().get()
+                self._worker_stats[pid] = stats
+                yield from results
+
+
+class CondenserCheckpoint:
+    """
+        Progress of a condenser run streaming items into a sharded dataset,
+        stored as an ini file next to the dataset.
+
+        The checkpoint records the number of filelist rows all items of which
+        have been written into shards and the number of written items of the
+        next row, along with a hash of the condenser configuration, so that
+        a run is only ever continued with the same configuration.
+    """
+
+    FILE_SUFFIX = '_checkpoint'
+
+    def __init__(self, outdir, name, config_hash):
+        self.filename = os.path.join(outdir, f"{name}{self.FILE_SUFFIX}.ini")
+        self.config_hash = config_hash
+
+    def load(self):
+        """
+            Load the recorded progress as a dict, or None if there is no
+            checkpoint yet.
+        """
+        if not os.path.exists(self.filename):
+            return None
+        config = configparser.ConfigParser()
+        config.read(self.filename, encoding='UTF-8')
+        checkpoint = config['checkpoint']
+        if checkpoint['config_hash'] != self.config_hash:
+            raise ValueError(f"Checkpoint {self.filename} was created with "
+                             f"different condenser settings")
+        return {k: int(checkpoint[k]) for k in ('num_rows', 'num_row_items',
+                                                'num_shards', 'num_data')}
+
+    def save(self, num_rows, num_row_items, num_shards, num_data):
+        config = configparser.ConfigParser()
+        config['checkpoint'] = {
+            'config_hash': self.config_hash, 'num_rows': str(num_rows),
+            'num_row_items': str(num_row_items),
+            'num_shards': str(num_shards), 'num_data': str(num_data)}
+        # replace the previous checkpoint only once the new one is complete
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='UTF-8') as checkpointfile:
+            config.write(checkpointfile)
+        os.replace(tmp_filename, self.filename)
+
+
+def get_config_hash(**kwargs):
+    """
+        Get a hash of all condenser settings affecting the created dataset,
+        including the contents of the filelist.
+    """
+    output_dataset = dict(kwargs['output_dataset'])
+    # the dataset may be moved to another directory between runs
+    output_dataset.pop('outdir', None)
+    config = {
+        'filelist': io_utils.get_file_checksum(kwargs['filelist']),
+        'packet_template': vars(kwargs['packet_template']),
+        'output_dataset': output_dataset,
+        'event_transformer': kwargs['event_transformer'],
+        'target_handler': kwargs['target_handler'],
+        'extra_metafields': sorted(kwargs['extra_metafields']),
+        'group_by_srcfile': kwargs.get('group_by_srcfile', False),
+    }
+    config = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(config.encode('UTF-8')).hexdigest()
 
 
 def main(**kwargs):
     logger = kwargs['logger']
     logger.debug(kwargs)
 
+    # items of rows grouped by source file are put back into filelist order
+    # if the dataset is held in memory, otherwise their row is recorded
+    output_args = kwargs['output_dataset']
+    group_rows = kwargs.get('group_by_srcfile', False)
+    streaming = output_args.get('shard_size', None) is not None
+    if group_rows and streaming:
+        extra_metafields = [*kwargs['extra_metafields'],
+                            sched.FILELIST_ROW_KEY]
+        kwargs = {**kwargs, 'extra_metafields': extra_metafields}
+
     # get conversion class from events to dataset items
     packet_template = kwargs['packet_template']
-    cache = get_packet_cache(packet_template, **kwargs['cache'])
-    condenser = get_condenser(cache.get, **kwargs)
+    cache_args = kwargs['cache']
+    cache = get_packet_cache(packet_template, **cache_args)
+    # source files are prefetched only by a condenser in the main process
+    # and only if whole packets are extracted from them (windows of ROOT
+    # files are read directly from the files instead)
+    prefetcher, extraction_fn = None, cache.get
+    prefetch_depth = cache_args.get('prefetch_depth', 0)
+    read_windows = kwargs['event_transformer']['args'].get(
+        'read_gtu_windows', False)
+    if prefetch_depth > 0 and read_windows:
+        logger.warning("Source files are not prefetched when reading gtu "
+                       "windows directly from them")
+    elif prefetch_depth > 0 and kwargs.get('num_workers', 1) <= 1:
+        prefetcher = tck_io_utils.PacketPrefetcher(
+            cache, depth=prefetch_depth,
+            max_bytes=cache_args.get('prefetch_max_bytes', None))
+        extraction_fn = prefetcher.get
+    condenser = get_condenser(extraction_fn, **kwargs)
 
     # create output dataset
     data_handler = condenser.packets_handler
     output_packet_shape = list(packet_template.packet_shape)
     output_packet_shape[0] = data_handler.num_frames
-    dataset, handler = get_output_dataset_and_handler(output_packet_shape,
-                                                      **kwargs['output_dataset'])
+    checkpoint, progress = None, None
+    if streaming:
+        checkpoint = CondenserCheckpoint(output_args['outdir'],
+                                         output_args['name'],
+                                         get_config_hash(**kwargs))
+        if kwargs.get('resume', False):
+            progress = checkpoint.load()
+            if progress is None:
+                logger.info("No checkpoint found, starting from scratch")
+    resume_shards = None if progress is None else progress['num_shards']
+    dataset, handler = get_output_dataset_and_handler(
+        output_packet_shape, resume_shards=resume_shards, **output_args)
+    start_row, start_item, progress_fn = 0, 0, None
+    if progress is not None:
+        if dataset.num_data != progress['num_data']:
+            raise Exception(f"Dataset \"{dataset.name}\" is inconsistent "
+                            f"with its checkpoint")
+        start_row, start_item = progress['num_rows'], progress['num_row_items']
+        logger.info(f"Resuming from filelist row {start_row} with "
+                    f"{dataset.num_data} items already written")
+    if checkpoint is not None:
+        shard_size = output_args['shard_size']
+
+        def progress_fn(num_rows, num_row_items):
+            # record progress whenever a full shard has just been written
+            if dataset.num_buffered == 0:
+                checkpoint.save(num_rows, num_row_items,
+                                dataset.num_data // shard_size,
+                                dataset.num_data)
 
     # load events from filelist and add them to output dataset as items
     meta_creator = condenser.metadata_handler
@@ -70,41 +400,119 @@ def main(**kwargs):
     fields = set(data_handler.REQUIRED_FILELIST_COLUMNS)
     fields = fields.union(meta_creator.MANDATORY_EVENT_META)
     fields = fields.union(meta_creator.extra_metafields)
+    fields = fields.difference((sched.FILELIST_ROW_KEY, ))
     rows = io_utils.load_TSV(input_tsv, selected_columns=fields)
-    condenser.add_to_dataset(rows, dataset)
+    cache_size = kwargs['cache']['max_size']
+    num_loads = sched.count_file_loads(rows, cache_size=cache_size)
+    if group_rows:
+        rows, order = sched.group_by_source_file(rows)
+        for row, row_idx in zip(rows, order):
+            row[sched.FILELIST_ROW_KEY] = int(row_idx)
+        num_grouped_loads = sched.count_file_loads(rows,
+                                                   cache_size=cache_size)
+        logger.info(f"Expected number of source file loads: "
+                    f"{num_grouped_loads} ({num_loads} in filelist order)")
+    else:
+        logger.info(f"Expected number of source file loads: {num_loads}")
+    if prefetcher is not None:
+        prefetcher.start(row[tck_cons.SRCFILE_KEY]
+                         for row in rows[start_row:])
+    try:
+        num_event_items = condenser.add_to_dataset(
+            rows, dataset, start_row=start_row, start_item=start_item,
+            progress_fn=progress_fn)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+    if group_rows and not streaming:
+        dataset.permute(sched.get_items_permutation(order, num_event_items))
 
     # save dataset
-    logger.info(f"Creating dataset \"{dataset.name}\" containing "
-                f"{dataset.num_data} items")
-    handler.save_dataset(dataset)
+    if isinstance(dataset, sharded_io.ShardedDatasetWriter):
+        # all but the last shard have been written while adding items
+        dataset.close()
+        num_shards = -(-dataset.num_data // shard_size)
+        checkpoint.save(len(rows), 0, num_shards, dataset.num_data)
+        logger.info(f"Created sharded dataset \"{dataset.name}\" containing "
+                    f"{dataset.num_data} items")
+    else:
+        logger.info(f"Creating dataset \"{dataset.name}\" containing "
+                    f"{dataset.num_data} items")
+        handler.save_dataset(dataset)
+
+    stats = cache.stats
+    if isinstance(condenser, ParallelDatasetCondenser):
+        stats = condenser.cache_stats
+    logger.info(f"Packet cache: {stats['hits']} hits, {stats['misses']} "
+                f"misses, {stats['evictions']} evictions, "
+                f"{stats['bytes_loaded']} bytes loaded in "
+                f"{stats['load_time']:.2f} s, {stats['disk_hits']} files "
+                f"found in disk cache")
+    if prefetcher is not None:
+        stats = prefetcher.stats
+        logger.info(f"Packet prefetching: {stats['prefetched']} files "
+                    f"prefetched, {stats['direct']} loaded directly, "
+                    f"{stats['wait_time']:.2f} s spent waiting for packets")
 
 
 def get_packet_cache(packet_template, **cache_args):
     extractor = tck_io_utils.PacketExtractor(packet_template=packet_template)
     extractors = {'NPY': extractor.extract_packets_from_npyfile,
                   'ROOT': extractor.extract_packets_from_rootfile}
+    disk_cache = None
+    if cache_args.get('cache_dir', None) is not None:
+        disk_cache = tck_io_utils.PacketDiskCache(cache_args['cache_dir'],
+                                                  packet_template)
     cache = tck_io_utils.PacketCache(
         cache_args['max_size'], extractors,
-        num_evict_on_full=cache_args['num_evict_on_full'])
+        max_bytes=cache_args.get('max_bytes', None), disk_cache=disk_cache)
     return cache
 
 
 def get_condenser(packet_extraction_fn, **kwargs):
     event_transformer = kwargs['event_transformer']
+    transformer_args = dict(event_transformer['args'])
+    if transformer_args.pop('read_gtu_windows', False):
+        packet_template = kwargs['packet_template']
+        window_extractor = tck_io_utils.PacketWindowExtractor(
+            packet_extraction_fn,
+            tck_io_utils.PacketExtractor(packet_template=packet_template))
+        transformer_args['window_extraction_fn'] = (
+            window_extractor.extract_windows)
+        transformer_args['packet_size'] = packet_template.num_frames
     data_handler = event_tran.get_event_transformer(
-        event_transformer['name'], packet_extraction_fn,
-        **event_transformer['args'])
+        event_transformer['name'], packet_extraction_fn, **transformer_args)
 
     target_handler = kwargs['target_handler']
     target_handler = targ.get_target_handler(
         target_handler['name'], **target_handler['args'])
 
     meta_creator = meta.MetadataCreator(kwargs['extra_metafields'])
+    num_workers = kwargs.get('num_workers', 1)
+    if num_workers > 1:
+        condenser_args = {k: kwargs[k] for k in CONDENSER_ARGS}
+        return ParallelDatasetCondenser(data_handler, meta_creator,
+                                        target_handler, num_workers,
+                                        condenser_args,
+                                        logger=kwargs['logger'])
     return DatasetCondenser(data_handler, meta_creator, target_handler,
                             logger=kwargs['logger'])
 
 
-def get_output_dataset_and_handler(output_packet_shape, **dataset_args):
+def get_output_dataset_and_handler(output_packet_shape, resume_shards=None,
+                                   **dataset_args):
+    shard_size = dataset_args.get('shard_size', None)
+    if shard_size is not None:
+        # stream items into a sharded dataset, holding at most one shard
+        # worth of items in memory
+        output_handler = sharded_io.ShardedDatasetFsPersistencyHandler(
+            save_dir=dataset_args['outdir'], shard_size=shard_size)
+        dataset = sharded_io.ShardedDatasetWriter(
+            output_handler, dataset_args['name'], output_packet_shape,
+            item_types=dataset_args['item_types'],
+            dtype=dataset_args['dtype'], append=resume_shards is not None,
+            num_shards=resume_shards)
+        return dataset, output_handler
     dataset = ds.NumpyDataset(dataset_args['name'], output_packet_shape,
                               item_types=dataset_args['item_types'],
                               dtype=dataset_args['dtype'])
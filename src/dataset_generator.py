@@ -161,9 +161,12 @@ class SimulatedDataGenerator():
             target = handler['target']
             # idx serves as both an index into targets and data, as well as
             # shower angle in xy projection
-            for idx in range(start, stop):
-                packet, meta = packet_handler(idx)
-                dataset.add_data_item(packet, target, meta)
+            items = [packet_handler(idx) for idx in range(start, stop)]
+            if len(items) == 0:
+                continue
+            packets, metadata = zip(*items)
+            dataset.add_data_items(packets, [target] * len(packets),
+                                   metadata=list(metadata))
         return dataset
 
 
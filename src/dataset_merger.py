@@ -41,7 +41,9 @@ if __name__ == "__main__":
     output_handler = io_utils.DatasetFsPersistencyHandler(save_dir=outdir)
     for tup in persistency_handlers:
         name, handler = tup[:]
-        dataset = handler.load_dataset(name)
+        # items are read from the memory-mapped files and converted to the
+        # output dtype as they are copied into the merged dataset
+        dataset = handler.load_dataset(name, mmap=True)
         if not 'orig_dataset' in dataset.metadata_fields:
             dataset.add_metafield('orig_dataset', default_value=name)
         first_dataset.merge_with(dataset)
@@ -0,0 +1,78 @@
+import argparse
+import sys
+
+import cmdint.common.dataset_args as dargs
+import dataset.io.fs.meta.npz_io as npz_io
+import dataset.io.fs.meta.tsv_io as tsv_io
+import dataset.metadata_utils as meta
+import utils.common_utils as cutils
+
+
+def convert_metadata(name, srcdir, outdir=None, field_types={},
+                     nullable=False):
+    """
+        Convert dataset metadata stored in a TSV file into a binary npz file
+        (see dataset.io.fs.meta.npz_io.NpzMetadataPersistencyHandler).
+
+        As TSV files do not keep the types of values, all fields are stored as
+        strings unless their type is passed in field_types.
+
+        Parameters
+        ----------
+        :param name:        the dataset name.
+        :type name:         str
+        :param srcdir:      directory containing the TSV metadata file.
+        :type srcdir:       str
+        :param outdir:      (optional) directory to save the npz file to,
+                            defaults to srcdir.
+        :type outdir:       str
+        :param field_types: (optional) names of types ('str', 'int' or
+                            'float') to cast values of fields to.
+        :type field_types:  typing.Mapping[str, str]
+        :param nullable:    (optional) keep empty values of cast fields as
+                            empty strings.
+        :type nullable:     bool
+    """
+    outdir = outdir or srcdir
+    tsv_handler = tsv_io.TSVMetadataPersistencyHandler(load_dir=srcdir)
+    npz_handler = npz_io.NpzMetadataPersistencyHandler(save_dir=outdir)
+    metadata = tsv_handler.load_metadata(name)
+    cast_funcs = {field: cutils.get_cast_func(typename, nullable=nullable)
+                  for field, typename in field_types.items()}
+    for item in metadata:
+        for field, cast_fn in cast_funcs.items():
+            if field in item:
+                item[field] = cast_fn(item[field])
+    holder = meta.MetadataHolder()
+    holder.extend(metadata)
+    return npz_handler.save_metadata(name, holder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=('Convert dataset metadata from a TSV file into a binary '
+                     'npz file'))
+    in_aliases = {'dataset name': 'name', 'dataset directory': 'srcdir'}
+    dset_args = dargs.DatasetArgs(input_aliases=in_aliases)
+    group = parser.add_argument_group(title='Dataset settings')
+    dset_args.add_dataset_arg_double(group, dargs.arg_type.INPUT)
+    group.add_argument('--outdir', default=None,
+                       help=('directory to save the converted metadata to, '
+                             'default: the dataset directory'))
+
+    group = parser.add_argument_group(title='Field settings')
+    group.add_argument('--field_type', nargs=2, action='append', default=[],
+                       metavar=('FIELD', 'TYPE'),
+                       help=('type (str, int or float) to convert values of '
+                             'a metadata field to, can be passed multiple '
+                             'times'))
+    group.add_argument('--nullable', default=False, action='store_true',
+                       help=('If set, empty values of converted fields are '
+                             'kept as empty strings'))
+
+    args = parser.parse_args(sys.argv[1:])
+    name, srcdir = dset_args.get_dataset_double(args, dargs.arg_type.INPUT)
+    filename = convert_metadata(name, srcdir, outdir=args.outdir,
+                                field_types=dict(args.field_type),
+                                nullable=args.nullable)
+    print('Saved metadata to {}'.format(filename))
@@ -48,9 +48,9 @@ if __name__ == "__main__":
     attr = args.attribute
     name, srcdir = dset_args.get_dataset_double(args,dargs.arg_type.INPUT)
     io_handler = io_utils.DatasetFsPersistencyHandler(load_dir=srcdir)
-    dset = io_handler.load_dataset(name)
     items_slice = slice(args.start_item, args.stop_item)
-    metadata = dset.get_metadata(items_slice)
+    dset = io_handler.load_dataset(name, mmap=True, items_slice=items_slice)
+    metadata = dset.get_metadata()
 
     attr_ype = args.attribute_type,
     precision, nullable = args.fp_precision, args.nullable
@@ -14,11 +14,14 @@ if __name__ == "__main__":
     dset_args.add_dataset_arg_double(parser, dargs.arg_type.INPUT)
     parser.add_argument('--num_shuffles', type=atypes.int_range(0), default=0,
                         help='Number of times the dataset should be shuffled.')
+    parser.add_argument('--seed', type=atypes.int_range(0), default=None,
+                        help=('Seed of the random generator used to shuffle '
+                              'the dataset.'))
 
     args = parser.parse_args(sys.argv[1:])
     name, srcdir = dset_args.get_dataset_double(args,dargs.arg_type.INPUT)
     io_handler = io_utils.DatasetFsPersistencyHandler(load_dir=srcdir,
                                                       save_dir=srcdir)
     dataset = io_handler.load_dataset(name)
-    dataset.shuffle_dataset(args.num_shuffles)
+    dataset.shuffle_dataset(args.num_shuffles, rng=args.seed)
     io_handler.save_dataset(dataset)
\ No newline at end of file
@@ -22,19 +22,17 @@ def get_cast_func(name, fp_precision=None, nullable=False):
 
 def main(**settings):
     srcdir, outdir = settings['srcdir'], settings['outdir']
-    name, outname = args['name'], args['outname']
+    name, outname = settings['name'], settings['outname']
     if outname is None:
         outname = name
     if outdir is None:
         outdir = srcdir
     io_handler = io_utils.DatasetFsPersistencyHandler(load_dir=srcdir,
                                                       save_dir=outdir)
-    items_slice = args['items_slice']
-    old_dataset = io_handler.load_dataset(name)
-    new_dataset = ds.NumpyDataset(outname, old_dataset.accepted_packet_shape,
-                                  item_types=old_dataset.item_types,
-                                  dtype=old_dataset.dtype)
-    new_dataset.merge_with(old_dataset, items_slice)
+    items_slice = settings['item_slice']
+    # only the items being split off are read from the input dataset
+    new_dataset = io_handler.load_dataset(name, items_slice=items_slice)
+    new_dataset.name = outname
     io_handler.save_dataset(new_dataset)
 
 
@@ -46,3 +44,4 @@ if __name__ == "__main__":
     cmd_int = cmd.CmdInterface()
     args = cmd_int.get_cmd_args(sys.argv[1:])
     print(args)
+    main(**args)
@@ -39,7 +39,7 @@ if __name__ == '__main__':
         meta_text_adder = meta_to_text[text_conv]
 
     handler = io_utils.DatasetFsPersistencyHandler(load_dir=srcdir)
-    dataset = handler.load_dataset(name, item_types=item_types)
+    dataset = handler.load_dataset(name, item_types=item_types, mmap=True)
 
     start, stop = args.start_item, args.stop_item
     if stop is None:
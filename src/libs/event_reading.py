@@ -1,40 +1,59 @@
 #!/usr/bin/python3
 
+import contextlib
 import datetime
 from enum import Enum
+import os
+import tempfile
 import numpy as np
 import ROOT
 
 from libs.eusotrees.exptree import ExpTree
 
 
+def _as_scalar(value):
+    # values of tree branches are 1-element arrays reused for every entry
+    return value.item() if type(value) is np.ndarray else value
+
+
+@contextlib.contextmanager
+def _only_branches_enabled(tree, *branch_names):
+    """
+    Enable reading of only the given branches of a tree, restoring the previous status of all branches
+    of the tree on exit.
+    """
+    statuses = [(branch.GetName(), tree.GetBranchStatus(branch.GetName()))
+                for branch in tree.GetListOfBranches()]
+    tree.SetBranchStatus("*", 0)
+    try:
+        for branch_name in branch_names:
+            tree.SetBranchStatus(branch_name, 1)
+        yield
+    finally:
+        for branch_name, status in statuses:
+            tree.SetBranchStatus(branch_name, status)
+
+
+def orient_photon_count_data(photon_count_data):
+    """
+    Transform photon count data of shape (ccb_count, pdm_count, height, width) so that every PDM is
+    np.transpose(np.fliplr(pdm_data)), with a single flip and swap of axes over the whole block.
+    """
+    return np.ascontiguousarray(np.flip(photon_count_data, -1).swapaxes(-1, -2))
+
+
 class GtuPdmData(object):
-    photon_count_data = None
-    gtu = -1
-    gtu_time = -1
-    # gtu_time1 = -1
-    gtu_datetime = datetime.datetime(1910, 1, 1)
-
-    # gtu_global = -1         #  "gtuGlobal/I"
-    trg_box_per_gtu = -1    #  "trgBoxPerGTU/I"
-    trg_pmt_per_gtu = -1    #  "trgPMTPerGTU/I"
-    trg_ec_per_gtu = -1     #  "trgECPerGTU/I"
-    n_persist = -1          #  "&nPersist/I"
-    gtu_in_persist = -1     #  "&gtuInPersist/I"
-    sum_l1_pdm = -1         #  "sumL1PDM/I"
-    sum_l1_ec = None                #  "sumL1EC[9]/I"
-    sum_l1_pmt = None   #  "sumL1PMT[18][2]/I"
-
-    gps_datetime = datetime.datetime(1910, 1, 1)
-    gps_date__raw = -1
-    gps_time__raw = -1
-    gps_lat = -999.
-    gps_lon = -999.
-    gps_alt = -999.
-    gps_speed = -999.
-    gps_course = -999.
-
-    l1trg_events = None
+    __slots__ = ('photon_count_data', 'gtu', 'gtu_time',
+                 'trg_box_per_gtu',     #  "trgBoxPerGTU/I"
+                 'trg_pmt_per_gtu',     #  "trgPMTPerGTU/I"
+                 'trg_ec_per_gtu',      #  "trgECPerGTU/I"
+                 'n_persist',           #  "&nPersist/I"
+                 'gtu_in_persist',      #  "&gtuInPersist/I"
+                 'sum_l1_pdm',          #  "sumL1PDM/I"
+                 'sum_l1_ec',           #  "sumL1EC[9]/I"
+                 'sum_l1_pmt',          #  "sumL1PMT[18][2]/I"
+                 'gps_date__raw', 'gps_time__raw', 'gps_lat', 'gps_lon', 'gps_alt', 'gps_speed', 'gps_course',
+                 'l1trg_events')
 
     def __init__(self, photon_count_data, gtu, gtu_time, #gtu_time1,
                  trg_box_per_gtu, trg_pmt_per_gtu, trg_ec_per_gtu,
@@ -44,46 +63,52 @@ class GtuPdmData(object):
                  gps_speed=-999, gps_course=-999):
 
         if not use_raw_photon_count_data:
-            self.photon_count_data = np.zeros_like(photon_count_data, dtype=photon_count_data.dtype)
-
-            for ccb_index in range(0,len(photon_count_data)):
-                for pdm_index in range(0,len(photon_count_data[ccb_index])):
-                    self.photon_count_data[ccb_index, pdm_index] = np.transpose(np.fliplr(photon_count_data[ccb_index, pdm_index])) # np.fliplr(np.transpose(photon_count_data[ccb_index, pdm_index]))
+            self.photon_count_data = orient_photon_count_data(photon_count_data)
         else:
             self.photon_count_data = np.array(photon_count_data)
 
-        self.gtu = np.asscalar(gtu) if isinstance(gtu, np.ndarray) else gtu
-        self.gtu_time = np.asscalar(gtu_time) if isinstance(gtu_time, np.ndarray) else gtu_time
-        # self.gtu_time1 = np.asscalar(gtu_time1) if isinstance(gtu_time1, np.ndarray) else gtu_time1
-
-        if self.gtu_time is not None:
-            self.gtu_datetime = datetime.datetime.utcfromtimestamp(self.gtu_time)
-
-        self.trg_box_per_gtu = np.asscalar(trg_box_per_gtu) if isinstance(trg_box_per_gtu, np.ndarray) else trg_box_per_gtu 
-        self.trg_pmt_per_gtu = np.asscalar(trg_pmt_per_gtu) if isinstance(trg_pmt_per_gtu, np.ndarray) else trg_pmt_per_gtu
-        self.trg_ec_per_gtu = np.asscalar(trg_ec_per_gtu) if isinstance(trg_ec_per_gtu, np.ndarray) else trg_ec_per_gtu
-        self.n_persist = np.asscalar(n_persist) if isinstance(n_persist, np.ndarray) else n_persist
-        self.gtu_in_persist = np.asscalar(gtu_in_persist) if isinstance(gtu_in_persist, np.ndarray) else gtu_in_persist
-        self.sum_l1_pdm = np.asscalar(sum_l1_pdm) if isinstance(sum_l1_pdm, np.ndarray) else sum_l1_pdm
+        # NOTE: scalar fields are converted eagerly on purpose, as they are passed in as branch buffers
+        # which are overwritten by reading the next entry of the tree, so a lazily converted value would
+        # be that of a later entry (a 1-element copy of the buffer costs about as much as converting it)
+        self.gtu = _as_scalar(gtu)
+        self.gtu_time = _as_scalar(gtu_time)
+
+        self.trg_box_per_gtu = _as_scalar(trg_box_per_gtu)
+        self.trg_pmt_per_gtu = _as_scalar(trg_pmt_per_gtu)
+        self.trg_ec_per_gtu = _as_scalar(trg_ec_per_gtu)
+        self.n_persist = _as_scalar(n_persist)
+        self.gtu_in_persist = _as_scalar(gtu_in_persist)
+        self.sum_l1_pdm = _as_scalar(sum_l1_pdm)
         self.sum_l1_ec = sum_l1_ec
         self.sum_l1_pmt = sum_l1_pmt
 
-        self.gps_date__raw = np.asscalar(gps_date) if isinstance(gps_date, np.ndarray) else gps_date
-        self.gps_time__raw = np.asscalar(gps_time) if isinstance(gps_time, np.ndarray) else gps_time
-        self.gps_lat = np.asscalar(gps_lat) if isinstance(gps_lat, np.ndarray) else gps_lat
-        self.gps_lon = np.asscalar(gps_lon) if isinstance(gps_lon, np.ndarray) else gps_lon
-        self.gps_alt = np.asscalar(gps_alt) if isinstance(gps_alt, np.ndarray) else gps_alt
-        self.gps_speed = np.asscalar(gps_speed) if isinstance(gps_speed, np.ndarray) else gps_speed
-        self.gps_course = np.asscalar(gps_course) if isinstance(gps_course, np.ndarray) else gps_course
+        self.gps_date__raw = _as_scalar(gps_date)
+        self.gps_time__raw = _as_scalar(gps_time)
+        self.gps_lat = _as_scalar(gps_lat)
+        self.gps_lon = _as_scalar(gps_lon)
+        self.gps_alt = _as_scalar(gps_alt)
+        self.gps_speed = _as_scalar(gps_speed)
+        self.gps_course = _as_scalar(gps_course)
 
+        self.l1trg_events = l1trg_events
+
+    # datetimes are only constructed when requested
+
+    @property
+    def gtu_datetime(self):
+        if self.gtu_time is None:
+            return datetime.datetime(1910, 1, 1)
+        return datetime.datetime.utcfromtimestamp(self.gtu_time)
+
+    @property
+    def gps_datetime(self):
         # based on ETOS' eusotrees/datatree.py
+        gps_date, gps_time = self.gps_date__raw, self.gps_time__raw
         if gps_date is not None and gps_time is not None and gps_date > 0.1 and gps_time > 0.1:
-            self.gps_datetime = datetime.datetime(int(gps_date) % 100 + 2000, int((gps_date % 10000) / 100), int(gps_date / 10000),
-                                      int(gps_time / 10000), int((gps_time % 10000) / 100), int(gps_time) % 100)
+            return datetime.datetime(int(gps_date) % 100 + 2000, int((gps_date % 10000) / 100), int(gps_date / 10000),
+                                     int(gps_time / 10000), int((gps_time % 10000) / 100), int(gps_time) % 100)
         else:
-            self.gps_datetime = datetime.datetime(1910, 1, 1)
-
-        self.l1trg_events = l1trg_events
+            return datetime.datetime(1910, 1, 1)
 
 
 class L1TrgEvent(object):
@@ -103,17 +128,17 @@ class L1TrgEvent(object):
     def __init__(self, gtu_pdm_data, ec_id, pmt_row, pmt_col, pix_row, pix_col, sum_l1, thr_l1, persist_l1,
                  packet_id = -1, gtu_in_packet = -1):
         self.gtu_pdm_data = gtu_pdm_data
-        self.ec_id = np.asscalar(ec_id) if isinstance(ec_id, np.ndarray) else ec_id
-        self.pmt_row = np.asscalar(pmt_row) if isinstance(pmt_row, np.ndarray) else pmt_row
-        self.pmt_col = np.asscalar(pmt_col) if isinstance(pmt_col, np.ndarray) else pmt_col
-        self.pix_row = np.asscalar(pix_row) if isinstance(pix_row, np.ndarray) else pix_row
-        self.pix_col = np.asscalar(pix_col) if isinstance(pix_col, np.ndarray) else pix_col
-        self.sum_l1 = np.asscalar(sum_l1) if isinstance(sum_l1, np.ndarray) else sum_l1
-        self.thr_l1 = np.asscalar(thr_l1) if isinstance(thr_l1, np.ndarray) else thr_l1
-        self.persist_l1 = np.asscalar(persist_l1) if isinstance(persist_l1, np.ndarray) else persist_l1
-
-        self.packet_id = np.asscalar(packet_id) if isinstance(packet_id, np.ndarray) else packet_id
-        self.gtu_in_packet = np.asscalar(gtu_in_packet) if isinstance(gtu_in_packet, np.ndarray) else gtu_in_packet
+        self.ec_id = _as_scalar(ec_id)
+        self.pmt_row = _as_scalar(pmt_row)
+        self.pmt_col = _as_scalar(pmt_col)
+        self.pix_row = _as_scalar(pix_row)
+        self.pix_col = _as_scalar(pix_col)
+        self.sum_l1 = _as_scalar(sum_l1)
+        self.thr_l1 = _as_scalar(thr_l1)
+        self.persist_l1 = _as_scalar(persist_l1)
+
+        self.packet_id = _as_scalar(packet_id)
+        self.gtu_in_packet = _as_scalar(gtu_in_packet)
 
     @classmethod
     def from_mario_format(cls, gtu_pdm_data, ec_id, pmt_row, pmt_col, pix_row, pix_col, sum_l1, thr_l1, persist_l1,
@@ -145,6 +170,127 @@ class L1TrgEvent(object):
 # there should be an additional base event reader class
 
 
+def read_tevent_photon_count_data(t_tevent, photon_count_data, gtu, first_entry=0, num_entries=None,
+                                  use_raw_photon_count_data=False, entries=None):
+    """
+    Read photon count data of consecutive entries of a tevent tree (or of the given entry numbers, if
+    entries is set) into a single array of shape (num_entries, ccb_count, pdm_count, height, width),
+    without creating a GtuPdmData object per entry.
+
+    photon_count_data and gtu are the arrays set as addresses of the "photon_count_data" and "gtu"
+    branches of the tree. Other branches are not read. Unless use_raw_photon_count_data is set, frames
+    are oriented the same way as GtuPdmData.photon_count_data.
+
+    Returns the gtu numbers of the entries and their photon count data.
+    """
+    if entries is None:
+        if num_entries is None:
+            num_entries = t_tevent.GetEntries() - first_entry
+        entries = range(first_entry, first_entry + num_entries)
+    num_entries = len(entries)
+    gtus = np.empty(num_entries, dtype=gtu.dtype)
+    ccb_count, pdm_count, size_x, size_y = photon_count_data.shape
+    if use_raw_photon_count_data:
+        frames = np.empty((num_entries, ccb_count, pdm_count, size_x, size_y), dtype=photon_count_data.dtype)
+        frames_view = frames
+    else:
+        frames = np.empty((num_entries, ccb_count, pdm_count, size_y, size_x), dtype=photon_count_data.dtype)
+        # raw frames copied into this view of the whole block end up as np.transpose(np.fliplr(frame))
+        # in frames, the same as in GtuPdmData
+        frames_view = np.flip(frames.swapaxes(-1, -2), -1)
+
+    with _only_branches_enabled(t_tevent, "photon_count_data", "gtu"):
+        for idx, entry in enumerate(entries):
+            t_tevent.GetEntry(int(entry))
+            frames_view[idx] = photon_count_data
+            gtus[idx] = gtu[0]
+    return gtus, frames
+
+
+class GtuEntryIndex(object):
+    """
+    Index of entries of a tree by their gtu number, for lookups of entries of a gtu by binary search.
+
+    Entry numbers sorted by gtu are kept along with the sorted gtus, so the index takes up 8 bytes per
+    entry regardless of the range of gtus of the entries.
+    """
+
+    def __init__(self, gtus):
+        gtus = np.asarray(gtus, dtype=np.int32)
+        self.gtus = gtus
+        self._entries = np.argsort(gtus, kind='stable').astype(np.int32)
+        # entries of gtu g are self._entries[searchsorted(g, 'left'):searchsorted(g, 'right')]
+        self._sorted_gtus = gtus[self._entries]
+        if len(gtus) > 0:
+            self.min_gtu, self.max_gtu = int(self._sorted_gtus[0]), int(self._sorted_gtus[-1])
+        else:
+            self.min_gtu, self.max_gtu = 0, -1
+
+    @classmethod
+    def from_tree(cls, tree, gtu, branch_name="gtuGlobal"):
+        """
+        Build the index by reading the gtu of every entry of a tree, with gtu being the array set as
+        address of the branch_name branch. Other branches are not read.
+        """
+        num_entries = tree.GetEntries()
+        gtus = np.empty(num_entries, dtype=np.int32)
+        with _only_branches_enabled(tree, branch_name):
+            for entry in range(num_entries):
+                tree.GetEntry(entry)
+                gtus[entry] = gtu[0]
+        return cls(gtus)
+
+    @classmethod
+    def from_tree_cached(cls, tree, gtu, cache_filename, source_filename, branch_name="gtuGlobal"):
+        """
+        Load the index from cache_filename if it is up to date with the source file of the tree,
+        otherwise build it (see from_tree) and try to save it there for later use.
+        """
+        try:
+            if os.path.getmtime(cache_filename) >= os.path.getmtime(source_filename):
+                index = cls.load(cache_filename)
+                if len(index) == tree.GetEntries():
+                    return index
+        except (OSError, ValueError):
+            pass
+        index = cls.from_tree(tree, gtu, branch_name)
+        try:
+            index.save(cache_filename)
+        except OSError:
+            # e.g. the directory of the source file is read-only
+            pass
+        return index
+
+    @classmethod
+    def load(cls, filename):
+        return cls(np.load(filename))
+
+    def save(self, filename):
+        # write into a temporary file first, so that a partially written index is never loaded
+        fd, tmp_filename = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(filename)))
+        try:
+            with os.fdopen(fd, 'wb') as tmpfile:
+                np.save(tmpfile, self.gtus)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+
+    def __len__(self):
+        return len(self.gtus)
+
+    def get_entries(self, gtu):
+        """Get entry numbers of a gtu in ascending order, empty if the gtu is not indexed."""
+        return self.get_entries_range(gtu, gtu + 1)
+
+    def get_entries_range(self, start_gtu, stop_gtu):
+        """Get entry numbers of gtus from start_gtu up to (excluding) stop_gtu, sorted by gtu."""
+        if start_gtu >= stop_gtu:
+            return self._entries[:0]
+        start, stop = np.searchsorted(self._sorted_gtus, (start_gtu, stop_gtu))
+        return self._entries[start:stop]
+
+
 class L1EventReader(object):
     t_l1trg = None
     t_gtusry = None
@@ -152,6 +298,9 @@ class L1EventReader(object):
 
     kenji_l1_file = None
 
+    _l1trg_index = None
+    _gtusry_index = None
+
     _current_l1trg_entry = -1
     _current_gtusry_entry = -1
 
@@ -312,45 +461,47 @@ class L1EventReader(object):
         if self.kenji_l1_file:
             self.kenji_l1_file.Close()
 
+    @property
+    def l1trg_index(self):
+        """Index of l1trg entries by gtu, built on first use."""
+        if self._l1trg_index is None:
+            self._l1trg_index = GtuEntryIndex.from_tree(self.t_l1trg, self._l1trg_gtuGlobal)
+        return self._l1trg_index
+
+    @property
+    def gtusry_index(self):
+        """Index of gtusry entries by gtu, built on first use."""
+        if self._gtusry_index is None:
+            self._gtusry_index = GtuEntryIndex.from_tree(self.t_gtusry, self._gtusry_gtuGlobal)
+        return self._gtusry_index
+
     def _search_for_gtusry_by_gtu(self, gtu):
         if not self.kenji_l1_file:
             return None
-        while (self._current_gtusry_entry < 0 or self._gtusry_gtuGlobal != gtu) and \
-                        self._current_gtusry_entry < self.t_gtusry_entries:
-            self._current_gtusry_entry += 1
-            self.t_gtusry.GetEntry(self._current_gtusry_entry)
-
+        entries = self.gtusry_index.get_entries(_as_scalar(gtu))
+        if len(entries) == 0:
+            # not found, same as after searching through all entries
+            self._current_gtusry_entry = self.t_gtusry_entries
+            return self._current_gtusry_entry
+        self._current_gtusry_entry = int(entries[0])
+        self.t_gtusry.GetEntry(self._current_gtusry_entry)
         return self._current_gtusry_entry
 
     def _search_for_l1trg_events_by_gtu(self, gtu, gtu_pdm_data=None, presume_sorted=True):
+        # NOTE: presume_sorted is kept for compatibility, events of the gtu are looked up in the index
+        # regardless of the order of the l1trg tree
         if not self.kenji_l1_file:
             return None
-        if not presume_sorted: # or self._l1trg_gtuGlobal > gtu:
-            self._current_l1trg_entry = -1
 
         events_list = []
 
-        while self._current_l1trg_entry < self.kenji_l1trg_entries:
-            if self._current_l1trg_entry == -1 or (presume_sorted and self._l1trg_gtuGlobal < gtu) or (not presume_sorted and self._l1trg_gtuGlobal != gtu) :
-                self._current_l1trg_entry += 1
-                self.t_l1trg.GetEntry(self._current_l1trg_entry)
-
-            # if self._current_l1trg_entry == 168:
-            #     print(">"*30, "Entry 168 read", "<"*30)
-
-            if self._l1trg_gtuGlobal == gtu:
-                events_list.append(L1TrgEvent.from_mario_format(gtu_pdm_data, self._l1trg_ecID,
-                      self._l1trg_pmtRow, self._l1trg_pmtCol,
-                      self._l1trg_pixRow, self._l1trg_pixCol, self._l1trg_sumL1, self._l1trg_thrL1, self. _l1trg_persistL1,
-                      self._l1trg_packetID, self._l1trg_gtuInPacket))
-
-                # _l1trg_packetID = None  # np.array([-1], dtype=np.int32)
-                # _l1trg_gtuInPacket = None  # np.array([-1], dtype=np.int32)
-
-                self._current_l1trg_entry += 1
-                self.t_l1trg.GetEntry(self._current_l1trg_entry)
-            elif presume_sorted and self._l1trg_gtuGlobal > gtu:
-                break
+        for entry in self.l1trg_index.get_entries(_as_scalar(gtu)):
+            self._current_l1trg_entry = int(entry)
+            self.t_l1trg.GetEntry(self._current_l1trg_entry)
+            events_list.append(L1TrgEvent.from_mario_format(gtu_pdm_data, self._l1trg_ecID,
+                  self._l1trg_pmtRow, self._l1trg_pmtCol,
+                  self._l1trg_pixRow, self._l1trg_pixCol, self._l1trg_sumL1, self._l1trg_thrL1, self. _l1trg_persistL1,
+                  self._l1trg_packetID, self._l1trg_gtuInPacket))
 
         return events_list
 
@@ -386,10 +537,15 @@ class AcqL1EventReader(L1EventReader):
     first_gtu = None
     last_gtu = None
 
+    # suffix of files with cached tevent indexes, appended to the acquisition file name
+    TEVENT_INDEX_SUFFIX = '.gtuidx.npy'
+    _tevent_index = None
+
     def __init__(self, acquisition_pathname, kenji_l1_pathname, first_gtu=None, last_gtu=None,
                  entry_is_gtu_optimization=False, load_texp=True):
         super(AcqL1EventReader, self).__init__(kenji_l1_pathname)
 
+        self.acquisition_pathname = acquisition_pathname
         self.acquisition_file, self.t_texp, self.t_tevent = self.open_acquisition(acquisition_pathname, load_texp)
 
         self.exp_tree = ExpTree(self.t_texp, self.acquisition_file)
@@ -550,7 +706,15 @@ class AcqL1EventReader(L1EventReader):
         def __iter__(self):
             aer = self.ack_ev_reader
 
-            aer._current_tevent_entry = aer.first_gtu-1 if aer.first_gtu is not None and aer.entry_is_gtu_optimization else -1
+            if aer.first_gtu is not None and aer.entry_is_gtu_optimization:
+                aer._current_tevent_entry = aer.first_gtu-1
+            elif aer.first_gtu is not None:
+                # entries before the first one of a gtu from first_gtu on are skipped anyway
+                index = aer.tevent_index
+                entries = index.get_entries_range(aer.first_gtu, index.max_gtu + 1)
+                aer._current_tevent_entry = (int(entries.min()) if len(entries) > 0 else aer.tevent_entries) - 1
+            else:
+                aer._current_tevent_entry = -1
 
             aer._current_l1trg_entry = -1
             aer._current_gtusry_entry = -1
@@ -568,7 +732,7 @@ class AcqL1EventReader(L1EventReader):
 
                 aer.t_tevent.GetEntry(aer._current_tevent_entry)
 
-                tevent_gtu_scalar = np.asscalar(aer._tevent_gtu)
+                tevent_gtu_scalar = _as_scalar(aer._tevent_gtu)
 
                 if  aer.last_gtu is not None and tevent_gtu_scalar > aer.last_gtu:
                     raise StopIteration
@@ -615,6 +779,67 @@ class AcqL1EventReader(L1EventReader):
     def iter_gtu_pdm_data(self):
         return self.GtuPdmDataIterator(self)
 
+    @property
+    def tevent_index(self):
+        """
+        Index of tevent entries by gtu, built on first use and cached in a file next to the acquisition
+        file (see TEVENT_INDEX_SUFFIX).
+        """
+        if self._tevent_index is None:
+            self._tevent_index = GtuEntryIndex.from_tree_cached(
+                self.t_tevent, self._tevent_gtu, self.acquisition_pathname + self.TEVENT_INDEX_SUFFIX,
+                self.acquisition_pathname, branch_name="gtu")
+        return self._tevent_index
+
+    def read_gtu_range(self, start_gtu, stop_gtu, use_raw_photon_count_data=False, read_l1trg_events=False):
+        """
+        Read photon count data of gtus from start_gtu up to (excluding) stop_gtu, reading only the tevent
+        entries of these gtus (see tevent_index and read_tevent_photon_count_data).
+
+        Returns the gtu numbers of the read entries, their photon count data and, if read_l1trg_events
+        is set, a list of L1 trigger events of every gtu (otherwise None).
+        """
+        entries = self.tevent_index.get_entries_range(start_gtu, stop_gtu)
+        self._current_tevent_entry = -1
+        gtus, frames = read_tevent_photon_count_data(self.t_tevent, self._tevent_photon_count_data,
+                                                     self._tevent_gtu, use_raw_photon_count_data=use_raw_photon_count_data,
+                                                     entries=entries)
+        l1trg_events = None
+        if read_l1trg_events:
+            if not self.kenji_l1_file:
+                raise Exception('kenji_l1_file file is required')
+            l1trg_events = [self._search_for_l1trg_events_by_gtu(gtu) for gtu in gtus]
+        return gtus, frames, l1trg_events
+
+    def read_gtu_windows(self, start_gtus, stop_gtus, use_raw_photon_count_data=False):
+        """
+        Read photon count data of several gtu ranges start_gtus[idx]:stop_gtus[idx] at once, reading the
+        tevent entries of all of them in a single pass over the tree (see read_gtu_range).
+
+        Returns the gtu numbers and photon count data of the read entries of all ranges concatenated in
+        order, along with the number of entries read for every range.
+        """
+        index = self.tevent_index
+        range_entries = [index.get_entries_range(int(start_gtu), int(stop_gtu))
+                         for start_gtu, stop_gtu in zip(start_gtus, stop_gtus)]
+        counts = np.fromiter((len(entries) for entries in range_entries), dtype=np.intp,
+                             count=len(range_entries))
+        entries = np.concatenate([np.empty(0, dtype=np.int32)] + range_entries)
+        self._current_tevent_entry = -1
+        gtus, frames = read_tevent_photon_count_data(self.t_tevent, self._tevent_photon_count_data,
+                                                     self._tevent_gtu, use_raw_photon_count_data=use_raw_photon_count_data,
+                                                     entries=entries)
+        return gtus, frames, counts
+
+    def read_photon_count_data(self, first_entry=0, num_entries=None, use_raw_photon_count_data=False):
+        """
+        Read photon count data of tevent entries in bulk (see read_tevent_photon_count_data).
+        Returns the gtu numbers of the entries and their photon count data.
+        """
+        self._current_tevent_entry = -1
+        return read_tevent_photon_count_data(self.t_tevent, self._tevent_photon_count_data, self._tevent_gtu,
+                                             first_entry, num_entries, use_raw_photon_count_data)
+
 
 class EventFilterOptions(object):
     class Cond(Enum):
@@ -0,0 +1,334 @@
+import datetime
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+import numpy as np
+import numpy.testing as nptest
+
+import libs.event_reading as reading
+
+
+# stand-in for a ROOT tree, filling branch addresses on GetEntry
+class StandInTree:
+
+    class Branch:
+
+        def __init__(self, name):
+            self.name = name
+            self.address = None
+
+        def GetName(self):
+            return self.name
+
+        def SetAddress(self, address):
+            self.address = address
+
+        def GetLeaf(self, name):
+            return StandInTree.Branch(name)
+
+    def __init__(self, **entries):
+        self.entries = entries
+        self.num_entries = len(next(iter(entries.values())))
+        self.branches = {name: self.Branch(name) for name in self.entries}
+        self.branch_status = {name: 1 for name in self.entries}
+        self.num_reads = 0
+
+    def GetName(self):
+        return 'tree'
+
+    def GetBranch(self, name):
+        # branches without entries are never filled
+        return self.branches.setdefault(name, self.Branch(name))
+
+    def GetListOfBranches(self):
+        return [self.branches[name] for name in self.entries]
+
+    def GetBranchStatus(self, name):
+        return self.branch_status[name]
+
+    def GetEntries(self):
+        return self.num_entries
+
+    def SetBranchStatus(self, name, status):
+        names = self.branch_status.keys() if name == '*' else (name, )
+        for branch_name in names:
+            self.branch_status[branch_name] = status
+
+    def GetEntry(self, entry):
+        self.num_reads += 1
+        for name, values in self.entries.items():
+            if self.branch_status.get(name, 1):
+                self.branches[name].address[...] = values[entry]
+
+
+class TestGtuPdmData(unittest.TestCase):
+
+    def _create(self, photon_count_data, **kwargs):
+        args = dict(gtu=np.array([7], dtype=np.int32),
+                    gtu_time=np.array([1.5e9], dtype=np.double),
+                    trg_box_per_gtu=None, trg_pmt_per_gtu=None,
+                    trg_ec_per_gtu=None, n_persist=None, gtu_in_persist=None,
+                    sum_l1_pdm=None, sum_l1_ec=None, sum_l1_pmt=None)
+        args.update(kwargs)
+        return reading.GtuPdmData(photon_count_data, **args)
+
+    def test_photon_count_data_orientation(self):
+        photon_count_data = np.arange(2 * 3 * 4 * 4, dtype=np.ubyte).reshape(
+            2, 3, 4, 4)
+        gtu_pdm_data = self._create(photon_count_data)
+        exp_data = [[np.transpose(np.fliplr(pdm)) for pdm in ccb]
+                    for ccb in photon_count_data]
+        nptest.assert_array_equal(gtu_pdm_data.photon_count_data, exp_data)
+        raw_data = self._create(photon_count_data,
+                                use_raw_photon_count_data=True)
+        nptest.assert_array_equal(raw_data.photon_count_data,
+                                  photon_count_data)
+
+    def test_scalar_fields(self):
+        gtu = np.array([7], dtype=np.int32)
+        gtu_pdm_data = self._create(np.zeros((1, 1, 2, 2)), gtu=gtu,
+                                    gps_date=np.array([10119.],
+                                                      dtype=np.float32),
+                                    gps_time=np.array([123456.],
+                                                      dtype=np.float32))
+        # values are copied from the (reused) branch buffers, so they must
+        # not change once the next entry is read into them
+        gtu[0] = 8
+        self.assertEqual(gtu_pdm_data.gtu, 7)
+        self.assertIsInstance(gtu_pdm_data.gtu, int)
+        self.assertEqual(gtu_pdm_data.gps_datetime,
+                         datetime.datetime(2019, 1, 1, 12, 34, 56))
+        self.assertEqual(gtu_pdm_data.gtu_datetime,
+                         datetime.datetime.utcfromtimestamp(1.5e9))
+        self.assertFalse(hasattr(gtu_pdm_data, '__dict__'))
+
+
+class TestGtuEntryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.gtu_global = np.array([-1], dtype=np.int32)
+        self.tree = StandInTree(gtuGlobal=[5, 5, 7, 3, 7, 7, 10],
+                                sumL1=range(7))
+        self.tree.GetBranch('gtuGlobal').SetAddress(self.gtu_global)
+        self.index = reading.GtuEntryIndex.from_tree(self.tree,
+                                                     self.gtu_global)
+
+    def test_from_tree(self):
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.tree.num_reads, 7)
+        self.assertEqual((self.index.min_gtu, self.index.max_gtu), (3, 10))
+        self.assertEqual(self.tree.branch_status['sumL1'], 1)
+
+    def test_from_tree_keeps_branch_status(self):
+        self.tree.SetBranchStatus('sumL1', 0)
+        reading.GtuEntryIndex.from_tree(self.tree, self.gtu_global)
+        self.assertDictEqual(self.tree.branch_status,
+                             {'gtuGlobal': 1, 'sumL1': 0})
+
+    def test_sparse_gtus(self):
+        # the size of the index does not depend on the range of gtus
+        index = reading.GtuEntryIndex([2 ** 30, 0, 2 ** 30, -5])
+        nptest.assert_array_equal(index.get_entries(2 ** 30), [0, 2])
+        nptest.assert_array_equal(index.get_entries_range(-5, 1), [3, 1])
+        self.assertEqual(len(index.get_entries(1)), 0)
+
+    def test_get_entries(self):
+        nptest.assert_array_equal(self.index.get_entries(7), [2, 4, 5])
+        nptest.assert_array_equal(self.index.get_entries(3), [3])
+        for gtu in (0, 4, 8, 11):
+            self.assertEqual(len(self.index.get_entries(gtu)), 0)
+
+    def test_get_entries_range(self):
+        nptest.assert_array_equal(self.index.get_entries_range(4, 8),
+                                  [0, 1, 2, 4, 5])
+        nptest.assert_array_equal(self.index.get_entries_range(-5, 100),
+                                  [3, 0, 1, 2, 4, 5, 6])
+        self.assertEqual(len(self.index.get_entries_range(8, 4)), 0)
+
+    def test_from_tree_cached(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            srcfile = os.path.join(tempdir, 'trees.root')
+            cache_file = srcfile + '.gtuidx.npy'
+            open(srcfile, 'w').close()
+            index = reading.GtuEntryIndex.from_tree_cached(
+                self.tree, self.gtu_global, cache_file, srcfile)
+            self.assertEqual(self.tree.num_reads, 14)
+            self.assertTrue(os.path.isfile(cache_file))
+            index = reading.GtuEntryIndex.from_tree_cached(
+                self.tree, self.gtu_global, cache_file, srcfile)
+            self.assertEqual(self.tree.num_reads, 14)
+            nptest.assert_array_equal(index.get_entries(7), [2, 4, 5])
+            # the index is rebuilt once the source file is modified
+            os.utime(srcfile, (os.path.getmtime(cache_file) + 10, ) * 2)
+            reading.GtuEntryIndex.from_tree_cached(
+                self.tree, self.gtu_global, cache_file, srcfile)
+            self.assertEqual(self.tree.num_reads, 21)
+
+    def test_empty_index(self):
+        index = reading.GtuEntryIndex([])
+        self.assertEqual(len(index.get_entries(0)), 0)
+
+
+class TestL1EventReaderSearch(unittest.TestCase):
+
+    def setUp(self):
+        reader = reading.L1EventReader(None)
+        reader.kenji_l1_file = mock.Mock()
+        # l1trg entries are not sorted by gtu
+        gtus = [4, 2, 4, 3]
+        reader._l1trg_gtuGlobal = np.array([-1], dtype=np.int32)
+        reader._l1trg_sumL1 = np.array([-1], dtype=np.int32)
+        reader.t_l1trg = StandInTree(gtuGlobal=gtus, sumL1=[10, 11, 12, 13])
+        reader.t_l1trg.GetBranch('gtuGlobal').SetAddress(
+            reader._l1trg_gtuGlobal)
+        reader.t_l1trg.GetBranch('sumL1').SetAddress(reader._l1trg_sumL1)
+        for name in ('ecID', 'pmtRow', 'pmtCol', 'pixRow', 'pixCol', 'thrL1',
+                     'persistL1', 'packetID', 'gtuInPacket'):
+            setattr(reader, '_l1trg_{}'.format(name), 0)
+        reader._l1trg_index = reading.GtuEntryIndex(gtus)
+        reader._gtusry_gtuGlobal = np.array([-1], dtype=np.int32)
+        reader.t_gtusry = StandInTree(gtuGlobal=[2, 3, 4])
+        reader.t_gtusry.GetBranch('gtuGlobal').SetAddress(
+            reader._gtusry_gtuGlobal)
+        reader.t_gtusry_entries = 3
+        reader._gtusry_index = reading.GtuEntryIndex([2, 3, 4])
+        self.reader = reader
+
+    def test_search_for_l1trg_events_by_gtu(self):
+        events = self.reader._search_for_l1trg_events_by_gtu(
+            np.array([4], dtype=np.int32))
+        self.assertListEqual([event.sum_l1 for event in events], [10, 12])
+        self.assertEqual(self.reader.t_l1trg.num_reads, 2)
+        self.assertListEqual(
+            self.reader._search_for_l1trg_events_by_gtu(5), [])
+
+    def test_search_for_gtusry_by_gtu(self):
+        # random access, regardless of previously read entries
+        self.assertEqual(self.reader._search_for_gtusry_by_gtu(4), 2)
+        self.assertEqual(self.reader._search_for_gtusry_by_gtu(2), 0)
+        self.assertEqual(self.reader._gtusry_gtuGlobal[0], 2)
+        self.assertEqual(self.reader.t_gtusry.num_reads, 2)
+        self.assertEqual(self.reader._search_for_gtusry_by_gtu(5), 3)
+
+    def test_index_built_on_first_use(self):
+        reader = self.reader
+        reader._l1trg_index = None
+        self.assertEqual(reader.t_l1trg.num_reads, 0)
+        events = reader._search_for_l1trg_events_by_gtu(4)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(reader.t_l1trg.num_reads, 4 + 2)
+        reader._search_for_l1trg_events_by_gtu(3)
+        self.assertEqual(reader.t_l1trg.num_reads, 4 + 2 + 1)
+
+
+class TestAcqL1EventReaderRandomAccess(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.acqfile = os.path.join(self.tempdir.name, 'acq.root')
+        open(self.acqfile, 'w').close()
+        self.frames = np.zeros((6, 1, 1, 48, 48), dtype=np.ubyte)
+        self.frames[:, 0, 0, 0, 0] = range(6)
+        self.gtus = np.arange(6, dtype=np.int32)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _create_reader(self, **kwargs):
+        self.tree = StandInTree(photon_count_data=self.frames, gtu=self.gtus)
+        acquisition = (mock.Mock(), None, self.tree)
+        exp_tree = mock.Mock(ccbCount=1, pdmCount=1, pmtCountX=6,
+                             pmtCountY=6, pixelCountX=8, pixelCountY=8)
+        with mock.patch.object(reading.AcqL1EventReader, 'open_acquisition',
+                               return_value=acquisition), \
+                mock.patch.object(reading, 'ExpTree', return_value=exp_tree):
+            return reading.AcqL1EventReader(self.acqfile, None, **kwargs)
+
+    def test_read_gtu_range(self):
+        reader = self._create_reader()
+        gtus, frames, events = reader.read_gtu_range(
+            2, 4, use_raw_photon_count_data=True)
+        nptest.assert_array_equal(gtus, [2, 3])
+        nptest.assert_array_equal(frames, self.frames[2:4])
+        self.assertIsNone(events)
+        # the tevent index is built once and cached next to the file
+        self.assertEqual(self.tree.num_reads, 6 + 2)
+        self.assertTrue(os.path.isfile(
+            self.acqfile + reading.AcqL1EventReader.TEVENT_INDEX_SUFFIX))
+        reader = self._create_reader()
+        gtus, frames, events = reader.read_gtu_range(4, 10)
+        nptest.assert_array_equal(gtus, [4, 5])
+        self.assertEqual(self.tree.num_reads, 2)
+        self.assertRaises(Exception, reader.read_gtu_range, 0, 1,
+                          read_l1trg_events=True)
+
+    def test_read_gtu_windows(self):
+        reader = self._create_reader()
+        gtus, frames, counts = reader.read_gtu_windows(
+            [3, 0, 5], [5, 2, 7], use_raw_photon_count_data=True)
+        nptest.assert_array_equal(gtus, [3, 4, 0, 1, 5])
+        nptest.assert_array_equal(frames, self.frames[[3, 4, 0, 1, 5]])
+        nptest.assert_array_equal(counts, [2, 2, 1])
+        self.assertEqual(self.tree.num_reads, 6 + 5)
+
+    def test_iterate_from_first_gtu(self):
+        self._create_reader().read_gtu_range(0, 0)
+        reader = self._create_reader(first_gtu=4)
+        self.assertListEqual([frame.gtu for frame in
+                              reader.iter_gtu_pdm_data()], [4, 5])
+        self.assertEqual(self.tree.num_reads, 2)
+
+
+class TestReadTeventPhotonCountData(unittest.TestCase):
+
+    def setUp(self):
+        num_entries, frame_shape = 5, (1, 1, 4, 4)
+        self.frames = np.arange(num_entries * 16, dtype=np.ubyte).reshape(
+            num_entries, *frame_shape)
+        self.gtus = np.arange(10, 10 + num_entries, dtype=np.int32)
+        self.tree = StandInTree(photon_count_data=self.frames,
+                                gtu=self.gtus)
+        self.photon_count_data = np.zeros(frame_shape, dtype=np.ubyte)
+        self.gtu = np.array([-1], dtype=np.int32)
+        self.tree.GetBranch('photon_count_data').SetAddress(
+            self.photon_count_data)
+        self.tree.GetBranch('gtu').SetAddress(self.gtu)
+
+    def _read(self, **kwargs):
+        return reading.read_tevent_photon_count_data(
+            self.tree, self.photon_count_data, self.gtu, **kwargs)
+
+    def test_read_all_entries(self):
+        gtus, frames = self._read()
+        nptest.assert_array_equal(gtus, self.gtus)
+        # same orientation as in GtuPdmData
+        exp_frames = [[[np.transpose(np.fliplr(pdm)) for pdm in ccb]
+                       for ccb in frame] for frame in self.frames]
+        nptest.assert_array_equal(frames, exp_frames)
+        self.assertTrue(frames.flags.c_contiguous)
+        self.assertEqual(self.tree.branch_status['gtu'], 1)
+
+    def test_read_entries_range(self):
+        gtus, frames = self._read(first_entry=1, num_entries=3,
+                                  use_raw_photon_count_data=True)
+        nptest.assert_array_equal(gtus, self.gtus[1:4])
+        nptest.assert_array_equal(frames, self.frames[1:4])
+
+    def test_read_non_square_frames(self):
+        frames = np.arange(2 * 12, dtype=np.ubyte).reshape(2, 1, 1, 3, 4)
+        self.tree = StandInTree(photon_count_data=frames,
+                                gtu=self.gtus[:2])
+        self.photon_count_data = np.zeros((1, 1, 3, 4), dtype=np.ubyte)
+        self.tree.GetBranch('photon_count_data').SetAddress(
+            self.photon_count_data)
+        self.tree.GetBranch('gtu').SetAddress(self.gtu)
+        gtus, read_frames = self._read()
+        self.assertEqual(read_frames.shape, (2, 1, 1, 4, 3))
+        nptest.assert_array_equal(read_frames[1, 0, 0],
+                                  np.transpose(np.fliplr(frames[1, 0, 0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
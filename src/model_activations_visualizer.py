@@ -18,7 +18,8 @@ def main(**settings):
     name, srcdir = settings['name'], settings['srcdir']
     item_types = settings['item_types']
     input_handler = dset_io.DatasetFsPersistencyHandler(load_dir=srcdir)
-    dataset = input_handler.load_dataset(name, item_types=item_types)
+    dataset = input_handler.load_dataset(name, item_types=item_types,
+                                         mmap=True)
     items_slice = settings.get('items_slice', slice(0, None))
     data = dataset.get_data_as_dict(items_slice)
 
@@ -26,7 +26,9 @@ if __name__ == '__main__':
 
     # load input dataset
     input_handler = io_utils.DatasetFsPersistencyHandler(load_dir=srcdir)
-    dataset = input_handler.load_dataset(name, item_types=item_types)
+    items_slice = slice(args.start_item, args.stop_item)
+    dataset = input_handler.load_dataset(name, item_types=item_types,
+                                         mmap=True, items_slice=items_slice)
 
     #load trained network model
     logdir = cutils.get_config_for_module("model_checker")['default']['logdir']
@@ -41,10 +43,11 @@ if __name__ == '__main__':
                                   model_file=model_file, tb_dir=tb_dir)
 
     # check (evaluate) model
+    # only the checked items were loaded, offset their indexes in the report
     log_data = test_utils.evaluate_classification_model(
         model,
         dataset,
-        items_slice=slice(args.start_item, args.stop_item)
+        item_idx_offset=args.start_item
     )
 
     # output results
@@ -4,6 +4,7 @@ import random
 
 import numpy as np
 
+import dataset.dataset_utils as ds
 import dataset.target_utils as targ
 import net.constants as net_cons
 
@@ -128,7 +129,8 @@ class DatasetSplitter:
             ))
         self._frac = frac
 
-    def get_train_test_indices(self, n_data):
+    def _get_train_test_split(self, n_data):
+        # contiguous splits are returned as ranges, random ones as lists
         n_test = self.test_items_count or round(
             self.test_items_fraction * n_data)
         n_train = n_data - n_test
@@ -146,8 +148,27 @@ class DatasetSplitter:
                 all_idx.remove(next_idx)
                 test_idx.append(next_idx)
             train_idx = list(all_idx)
+        return train_idx, test_idx
+
+    def get_train_test_indices(self, n_data):
+        train_idx, test_idx = self._get_train_test_split(n_data)
         return list(train_idx), list(test_idx)
 
+    def get_train_test_views(self, dataset):
+        """
+            Split a dataset into train and test views. Items of the dataset
+            are not copied, the views only hold their indexes (or the slice
+            of them for contiguous splits).
+
+            Parameters
+            ----------
+            :param dataset:     the dataset (or dataset view) to split.
+            :type dataset:      dataset.dataset_utils.NumpyDataset
+        """
+        train_idx, test_idx = self._get_train_test_split(dataset.num_data)
+        return (ds.DatasetView(dataset, train_idx),
+                ds.DatasetView(dataset, test_idx))
+
     def get_data_and_targets(self, train_dset, test_dset=None,
                              dict_format='FLAT'):
         if (not isinstance(dict_format, str) or
@@ -155,15 +176,12 @@ class DatasetSplitter:
             raise ValueError(f"Unknown dict format: {dict_format}, "
                              f"allowed values: {self.ALLOWED_OUTPUT_FORMATS}")
         dict_format = dict_format.upper()
-        train_idx, test_idx = None, None
         if test_dset is None:
-            test_dset = train_dset
-            n_data = train_dset.num_data
-            train_idx, test_idx = self.get_train_test_indices(n_data)
-        train_data = train_dset.get_data_as_dict(train_idx)
-        train_targets = train_dset.get_targets(train_idx)
-        test_data = test_dset.get_data_as_dict(test_idx)
-        test_targets = test_dset.get_targets(test_idx)
+            train_dset, test_dset = self.get_train_test_views(train_dset)
+        train_data = train_dset.get_data_as_dict()
+        train_targets = train_dset.get_targets()
+        test_data = test_dset.get_data_as_dict()
+        test_targets = test_dset.get_targets()
         if dict_format == 'FLAT':
             return {
                 'train_data': train_data, 'train_targets': train_targets,
@@ -1,11 +1,26 @@
 import unittest
 
+import numpy as np
+import numpy.testing as nptest
+
 import test.test_setups as setups
 import net.network_utils as netutils
 
 
 class TestDatasetSplitter(setups.DatasetMixin, unittest.TestCase):
 
+    # helper methods (custom asserts)
+
+    def _assertSplitDictEqual(self, res, exp_res):
+        # dataset items are numpy arrays, so assertDictEqual can't be used
+        self.assertSetEqual(set(res.keys()), set(exp_res.keys()))
+        for key in ('train_targets', 'test_targets'):
+            nptest.assert_array_equal(res[key], exp_res[key])
+        for key in ('train_data', 'test_data'):
+            self.assertSetEqual(set(res[key].keys()), set(exp_res[key].keys()))
+            for itype in exp_res[key].keys():
+                nptest.assert_array_equal(res[key][itype], exp_res[key][itype])
+
     # test setup
 
     @classmethod
@@ -88,7 +103,19 @@ class TestDatasetSplitter(setups.DatasetMixin, unittest.TestCase):
                                             items_fraction=0.6,
                                             num_items=2)
         res = splitter.get_data_and_targets(dset)
-        self.assertDictEqual(res, exp_res)
+        self._assertSplitDictEqual(res, exp_res)
+
+    def test_get_train_test_views(self):
+        dset = self.dset
+        splitter = netutils.DatasetSplitter(split_mode='FROM_END',
+                                            num_items=3)
+        train, test = splitter.get_train_test_views(dset)
+        self.assertEqual(train.num_data, 7)
+        self.assertEqual(test.num_data, 3)
+        self.assertListEqual(test.get_metadata(), dset.get_metadata(
+            slice(7, None)))
+        self.assertTrue(np.shares_memory(
+            train.get_data_as_dict()['yx'], dset.get_data_as_dict()['yx']))
 
     def test_get_data_and_targets_test_dset_overrides_num_and_fraction(self):
         dset = self.dset
@@ -101,7 +128,7 @@ class TestDatasetSplitter(setups.DatasetMixin, unittest.TestCase):
                                             items_fraction=0.3,
                                             num_items=2)
         res = splitter.get_data_and_targets(dset, test_dset=dset)
-        self.assertDictEqual(res, exp_res)
+        self._assertSplitDictEqual(res, exp_res)
 
     def test_invalid_split_mode_raises_error(self):
         self.assertRaises(ValueError, netutils.DatasetSplitter,
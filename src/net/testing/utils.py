@@ -7,25 +7,25 @@ CLASSIFICATION_FIELDS   = ['item_idx', 'output', 'target', 'shower_prob',
                            'noise_prob']
 
 
-def _classification_fields_handler(raw_output, target, item_idx,
-                                   old_dict=None):
-    if old_dict == None:
-        old_dict = {}
-    probs = targ.get_target_probabilities(raw_output)
-    old_dict['shower_prob'] = probs['shower']
-    old_dict['noise_prob']  = probs['noise']
-    rnd_output = np.round(raw_output).astype(np.uint8)
-    old_dict['output'] = targ.get_target_name(rnd_output)
-    old_dict['target'] = targ.get_target_name(target)
-    old_dict['item_idx'] = item_idx
-    return old_dict
+def _classification_fields(predictions, target_names, item_idx):
+    # report fields of a batch of predictions as lists, one item per prediction
+    probs = np.round(predictions, 4)
+    rnd_output = np.round(predictions).astype(np.uint8)
+    return {
+        'shower_prob': list(probs[:, targ.CLASS_NAMES.index('shower')]),
+        'noise_prob': list(probs[:, targ.CLASS_NAMES.index('noise')]),
+        'output': targ.get_target_names(rnd_output).tolist(),
+        'target': list(target_names),
+        'item_idx': list(range(item_idx, item_idx + len(predictions))),
+    }
 
 
 def evaluate_classification_model(model, dataset, items_slice=None,
-                                  batch_size=128):
+                                  batch_size=128, item_idx_offset=0):
     items_slice = items_slice or slice(0, None)
     data = dataset.get_data_as_dict(items_slice)
     targets = dataset.get_targets(items_slice)
+    target_names = targ.get_target_names(targets)
     metadata = dataset.get_metadata(items_slice)
     data, item_getter = netutils.convert_dataset_items_to_model_inputs(
         model, data, create_getter=True)
@@ -38,11 +38,11 @@ def evaluate_classification_model(model, dataset, items_slice=None,
         rel_idx = idx - start
         items_slice = slice(rel_idx, rel_idx + batch_size)
         data_batch = item_getter(data, items_slice)
-        predictions = tf_model.predict(data_batch)
+        predictions = np.asarray(tf_model.predict(data_batch))
+        fields = _classification_fields(
+            predictions, target_names[items_slice], item_idx_offset + idx)
         for pred_idx in range(len(predictions)):
-            prediction = predictions[pred_idx]
-            abs_idx = rel_idx + pred_idx
-            log_item = _classification_fields_handler(
-                prediction, targets[abs_idx], idx + pred_idx,
-                old_dict=metadata[abs_idx].copy())
+            log_item = metadata[rel_idx + pred_idx].copy()
+            for field, values in fields.items():
+                log_item[field] = values[pred_idx]
             yield log_item
@@ -59,7 +59,7 @@ class DatasetTargetsMixin(unittest.TestCase):
         if (num_items < 2):
             raise ValueError('Number of items must be at least 2')
         super(DatasetTargetsMixin, cls).setUpClass()
-        cls.mock_targets = [[0, 0] if idx % 2 == 0 else [0, 1]
+        cls.mock_targets = [[1, 0] if idx % 2 == 0 else [0, 1]
                             for idx in range(num_items)]
 
 
@@ -1,8 +1,59 @@
 import os
 import csv
+import hashlib
+import itertools
+import zipfile
 
+import numpy as np
 
-def load_TSV(filename, selected_columns=None, output_list=None):
+
+def _get_rows_index(rows, num_rows):
+    # convert row indexes (possibly negative) to a sequence of non-negative
+    # indexes, raising an error if any of them is out of bounds
+    idx = np.asarray(rows, dtype=np.intp).reshape(-1)
+    idx = np.where(idx < 0, idx + num_rows, idx)
+    if np.any((idx < 0) | (idx >= num_rows)):
+        raise IndexError('Row index out of bounds for {} rows'.format(
+                         num_rows))
+    return idx
+
+
+def _select_rows(rows, selection):
+    # lazily select parsed rows of an iterable by slice or sequence of indexes
+    if isinstance(selection, slice):
+        start, stop, step = selection.start, selection.stop, selection.step
+        if ((start is None or start >= 0) and (stop is None or stop >= 0)
+                and (step is None or step > 0)):
+            return itertools.islice(rows, start, stop, step)
+        return list(rows)[selection]
+    idx = np.asarray(selection, dtype=np.intp).reshape(-1)
+    if len(idx) == 0:
+        return []
+    if np.any(idx < 0):
+        rows = list(rows)
+        idx = _get_rows_index(idx, len(rows))
+        return [rows[i] for i in idx]
+    wanted, selected = set(idx.tolist()), {}
+    last, row_idx = int(idx.max()), -1
+    for row_idx, row in enumerate(rows):
+        if row_idx in wanted:
+            selected[row_idx] = row
+        if row_idx == last:
+            break
+    if len(selected) != len(wanted):
+        raise IndexError('Row index out of bounds for {} rows'.format(
+                         row_idx + 1))
+    return [selected[i] for i in idx.tolist()]
+
+
+def load_TSV(filename, selected_columns=None, output_list=None, rows=None):
+    """
+        Load rows of a TSV file as a list of dicts.
+
+        Optionally only the given rows (a slice or sequence of indexes not
+        counting the header) are kept. Rows are selected after parsing, so
+        quoted fields spanning multiple lines are handled correctly.
+    """
     output_list = output_list or []
     if selected_columns is not None:
         process_row = lambda row, cols: {col:row[col] for col in cols}
@@ -10,6 +61,8 @@ def load_TSV(filename, selected_columns=None, output_list=None):
         process_row = lambda row, cols: row
     with open(filename, 'r', encoding='UTF-8') as infile:
         reader = csv.DictReader(infile, delimiter='\t')
+        if rows is not None:
+            reader = _select_rows(reader, rows)
         for row in reader:
             output_list.append(process_row(row, selected_columns))
     return output_list
@@ -23,3 +76,49 @@ def save_TSV(filename, rows, column_order, file_exists_overwrite=False):
         writer = csv.DictWriter(outfile, column_order, delimiter='\t')
         writer.writeheader()
         writer.writerows(rows)
+
+
+def load_NPY(filename, rows=None):
+    """
+        Load an array stored in an npy file or only the given rows (a slice
+        or sequence of indexes along the first axis) of it.
+
+        When rows are given, the file is memory-mapped, so that only the pages
+        containing the requested rows are read from the file.
+    """
+    if rows is None:
+        return np.load(filename)
+    try:
+        data = np.load(filename, mmap_mode='r')
+    except ValueError:
+        # arrays of objects can not be memory-mapped
+        return np.load(filename)[rows]
+    return np.array(data[rows])
+
+
+def save_NPZ(filename, arrays):
+    """
+        Save arrays into an uncompressed npz file like numpy.savez, but with
+        fixed timestamps of the archived files, so that saving the same
+        arrays always creates the same file contents.
+    """
+    with zipfile.ZipFile(filename, mode='w', compression=zipfile.ZIP_STORED,
+                         allowZip64=True) as npzfile:
+        for key, array in arrays.items():
+            info = zipfile.ZipInfo('{}.npy'.format(key),
+                                   date_time=(1980, 1, 1, 0, 0, 0))
+            with npzfile.open(info, 'w', force_zip64=True) as arrayfile:
+                np.lib.format.write_array(arrayfile, np.asanyarray(array),
+                                          allow_pickle=False)
+
+
+def get_file_checksum(filename, algorithm='sha256', block_size=2**20):
+    """
+        Compute the hex digest of a file's contents, reading the file in
+        blocks of block_size bytes so that it is never loaded whole.
+    """
+    digest = hashlib.new(algorithm)
+    with open(filename, 'rb') as infile:
+        for block in iter(lambda: infile.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -1,7 +1,13 @@
+import hashlib
 import io
+import os
+import tempfile
 import unittest
 import unittest.mock as mock
 
+import numpy as np
+import numpy.testing as nptest
+
 import test.test_setups as testset
 import utils.io_utils as io_utils
 
@@ -54,6 +60,111 @@ class TestModuleFunctions(unittest.TestCase):
         self.assertEqual(rows, self.m_rows)
         m_open.assert_called_with(self.filename, 'r', encoding='UTF-8')
 
+    @mock.patch('builtins.open', new_callable=mock.mock_open())
+    def test_Load_TSV_rows(self, m_open, m_isfile, m_exists):
+        m_exists.return_value = m_isfile.return_value = True
+        contents = 'key\r\n' + ''.join('{}\r\n'.format(idx)
+                                        for idx in range(10))
+        exp_rows = [{'key': str(idx)} for idx in range(10)]
+        for rows in (slice(2, 5), slice(1, None, 3), slice(-3, None),
+                     [7, 2, 3], [-1, 0]):
+            m_open.return_value = io.StringIO(contents)
+            loaded = io_utils.load_TSV(self.filename, rows=rows)
+            if isinstance(rows, slice):
+                self.assertEqual(loaded, exp_rows[rows])
+            else:
+                self.assertEqual(loaded, [exp_rows[idx] for idx in rows])
+        m_open.return_value = io.StringIO(contents)
+        self.assertRaises(IndexError, io_utils.load_TSV, self.filename,
+                          rows=[3, 10])
+
+    @mock.patch('builtins.open', new_callable=mock.mock_open())
+    def test_Load_TSV_rows_multiline_fields(self, m_open, m_isfile,
+                                            m_exists):
+        m_exists.return_value = m_isfile.return_value = True
+        contents = 'key\tval\r\n0\t"a\nb"\r\n1\tc\r\n2\t"d\ne\nf"\r\n3\tg\r\n'
+        exp_rows = [{'key': '0', 'val': 'a\nb'}, {'key': '1', 'val': 'c'},
+                    {'key': '2', 'val': 'd\ne\nf'}, {'key': '3', 'val': 'g'}]
+        for rows in (slice(1, 3), slice(-2, None), [3, 0], [-2]):
+            m_open.return_value = io.StringIO(contents)
+            loaded = io_utils.load_TSV(self.filename, rows=rows)
+            if isinstance(rows, slice):
+                self.assertEqual(loaded, exp_rows[rows])
+            else:
+                self.assertEqual(loaded, [exp_rows[idx] for idx in rows])
+
+
+class TestLoadNPY(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, 'test.npy')
+        self.items = np.arange(10 * 3 * 4, dtype=np.uint16).reshape(10, 3, 4)
+        np.save(self.filename, self.items)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_all_rows(self):
+        nptest.assert_array_equal(io_utils.load_NPY(self.filename),
+                                  self.items)
+
+    def test_load_rows_slice(self):
+        for rows in (slice(2, 5), slice(0, 0), slice(-4, None),
+                     slice(1, None, 3), slice(None, None, -2)):
+            loaded = io_utils.load_NPY(self.filename, rows=rows)
+            self.assertEqual(loaded.dtype, self.items.dtype)
+            nptest.assert_array_equal(loaded, self.items[rows])
+
+    def test_load_rows_indexes(self):
+        for rows in ([7, 2, 3], [-1], []):
+            loaded = io_utils.load_NPY(self.filename, rows=rows)
+            nptest.assert_array_equal(loaded, self.items[rows])
+        self.assertRaises(IndexError, io_utils.load_NPY, self.filename,
+                          rows=[10])
+
+    def test_load_rows_fortran_order(self):
+        np.save(self.filename, np.asfortranarray(self.items))
+        loaded = io_utils.load_NPY(self.filename, rows=slice(3, 6))
+        nptest.assert_array_equal(loaded, self.items[3:6])
+
+    def test_load_rows_format_version_3(self):
+        with open(self.filename, 'wb') as outfile:
+            np.lib.format.write_array(outfile, self.items, version=(3, 0))
+        loaded = io_utils.load_NPY(self.filename, rows=[4, 1])
+        nptest.assert_array_equal(loaded, self.items[[4, 1]])
+
+
+class TestGetFileChecksum(unittest.TestCase):
+
+    def test_get_file_checksum(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, 'test.bin')
+            with open(filename, 'wb') as outfile:
+                outfile.write(b'abc' * 1000)
+            exp_digest = hashlib.sha256(b'abc' * 1000).hexdigest()
+            digest = io_utils.get_file_checksum(filename, block_size=7)
+            self.assertEqual(digest, exp_digest)
+
+
+class TestSaveNPZ(unittest.TestCase):
+
+    def test_save_NPZ(self):
+        arrays = {'a': np.arange(5), 'b': np.array(['x', 'yz'])}
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, 'test.npz')
+            io_utils.save_NPZ(filename, arrays)
+            with np.load(filename) as npzfile:
+                self.assertSetEqual(set(npzfile.keys()), {'a', 'b'})
+                for key, array in arrays.items():
+                    nptest.assert_array_equal(npzfile[key], array)
+            with open(filename, 'rb') as npzfile:
+                contents = npzfile.read()
+            # the same arrays are always saved as the same file
+            io_utils.save_NPZ(filename, arrays)
+            with open(filename, 'rb') as npzfile:
+                self.assertEqual(npzfile.read(), contents)
+
 
 if __name__ == '__main__':
     unittest.main()